@@ -153,6 +153,68 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory by default so no Redis is needed. LocMemCache is private to
+# each process: the catalog version lives in it, so with several workers a
+# catalog change only reaches the worker that made it and the others keep
+# serving old pages. Multi-worker deployments must use a shared backend, e.g.
+# point CACHE_LOCATION at a directory shared by the workers on one host.
+
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+
+CACHES = {
+    'default': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache' if CACHE_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': CACHE_LOCATION or 'blinkit-default',
+    }
+}
+
+# Seconds a cached catalog response lives; entries are also dropped on every catalog version bump
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Precompressed catalog snapshot served at /products/snapshot/
+CATALOG_SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+# Seconds of catalog inactivity before the snapshot is rebuilt in the background (None disables)
+CATALOG_SNAPSHOT_REBUILD_DELAY = 10
+# Seconds an outdated snapshot is served while a background rebuild catches up, before a request rebuilds it
+CATALOG_SNAPSHOT_MAX_STALENESS = 60
+
+# Processes generating resized image variants after uploads (0 generates them inline)
+IMAGE_VARIANT_WORKERS = 2
+
+# Search results below which typo-tolerant trigram matches are appended
+SEARCH_FUZZY_MIN_RESULTS = 5
+# In-process LRU of search result pages
+SEARCH_CACHE_SIZE = 1000
+SEARCH_CACHE_TTL = 60 * 5
+# Most frequent logged queries kept warm, and how often (seconds) they are re-warmed (None disables)
+SEARCH_PREWARM_QUERIES = 200
+SEARCH_PREWARM_INTERVAL = 60
+# Logged queries kept, most frequent first; the rest are pruned on every flush
+SEARCH_LOG_MAX_QUERIES = 10000
+
+# Order-driven product rankings served at /products/trending/
+RANKING_SIZE = 100
+# Seconds before a ranking is refreshed in the background (None disables refreshing)
+RANKING_REFRESH_INTERVAL = 60
+
+# Related products kept per product in the "frequently bought together" table
+BOUGHT_TOGETHER_SIZE = 20
+
+# Memory-mapped TF-IDF matrix behind /products/<pk>/similar/, rebuilt by build_similarity_index
+SIMILARITY_INDEX_DIR = BASE_DIR / 'similarity'
+
+# Flash-sale units a worker leases from a capped deal at a time; larger means fewer writes to the deal row
+FLASH_SALE_LEASE_SIZE = 20
+
+# Leaves out wall-clock benchmarks unless run with --tag benchmark
+TEST_RUNNER = 'blinkit_backend.test_runner.TestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,14 @@
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Skips tests tagged 'benchmark' unless tags are asked for explicitly:
+    their wall-clock budgets depend on the machine, so they run on demand
+    with `python manage.py test --tag benchmark`.
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if not tags:
+            exclude_tags = {*(exclude_tags or ()), 'benchmark'}
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
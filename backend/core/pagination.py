@@ -0,0 +1,40 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a stable ordering (e.g. `id` or `-created_at, -id`).
+
+    Pages are fetched with `WHERE key > cursor LIMIT n` instead of an
+    OFFSET, so the query cost stays the same on every page.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self, ordering=None, page_size=None):
+        if ordering is not None:
+            self.ordering = ordering
+        if page_size is not None:
+            self.page_size = page_size
+
+    def get_pagination_context(self):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+
+
+class KeysetPaginationMixin:
+    """
+    Adds `paginate()` to plain API views so paginated pages can still be
+    returned through `generate_api_response`, with the cursors passed as
+    `extra_context`.
+    """
+    pagination_ordering = ('-created_at', '-id')
+    # Default page size when the client sends no ?page_size= (None keeps the project default)
+    pagination_page_size = None
+
+    def paginate(self, queryset):
+        paginator = KeysetPagination(ordering=self.pagination_ordering, page_size=self.pagination_page_size)
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        return page, paginator.get_pagination_context()
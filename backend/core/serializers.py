@@ -0,0 +1,57 @@
+from rest_framework import serializers
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations it reads so views can load them
+    up front instead of issuing one query per row.
+
+    Set `select_related` / `prefetch_related` on the serializer class. Plans
+    of nested serializers are picked up automatically and prefixed with
+    the nested field's source, so `DealOfTheDaySerializer` nesting
+    `ProductSerializer` under `product` also prefetches `product__images`.
+    """
+    select_related = ()
+    prefetch_related = ()
+
+    @classmethod
+    def get_eager_loading_plan(cls):
+        """Return the (select_related, prefetch_related) lookups for this serializer"""
+        plan = cls.__dict__.get('_eager_loading_plan')
+        if plan is not None:
+            return plan
+
+        select = list(cls.select_related)
+        prefetch = list(cls.prefetch_related)
+
+        for field in cls().fields.values():
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, EagerLoadingMixin) or field.source == '*':
+                continue
+            nested_select, nested_prefetch = nested.get_eager_loading_plan()
+            source = field.source.replace('.', '__')
+            if many:
+                # Everything below a to-many relation has to be prefetched
+                if source not in prefetch:
+                    prefetch.append(source)
+                prefetch.extend(f'{source}__{lookup}' for lookup in nested_select + nested_prefetch)
+            else:
+                if source not in select:
+                    select.append(source)
+                select.extend(f'{source}__{lookup}' for lookup in nested_select)
+                prefetch.extend(f'{source}__{lookup}' for lookup in nested_prefetch)
+
+        plan = (select, prefetch)
+        cls._eager_loading_plan = plan
+        return plan
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Apply this serializer's select_related/prefetch_related plan to `queryset`"""
+        select, prefetch = cls.get_eager_loading_plan()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
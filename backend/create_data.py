@@ -4,7 +4,7 @@ import django
 import random
 
 # Set up Django environment
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blinkit_backend.settings')
 django.setup()
 
 from products.models import Category, Product
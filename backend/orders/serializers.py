@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from core.serializers import EagerLoadingMixin
 from .models import Order, OrderItem
+from products import inventory
+from products.flash_sale import flash_sales
 from products.models import Product
+from products.pricing import price_resolver
 
 class OrderItemCreateSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
@@ -12,53 +16,65 @@ class OrderCreateSerializer(serializers.Serializer):
     payment_method = serializers.CharField(required=True)
     shipping_address = serializers.CharField(required=False, allow_blank=True)
 
+    # Flash-sale allowance taken by the saved order; see release_claims
+    flash_sale_claims = {}
+
     def create(self, validated_data):
         user = self.context['request'].user
         order_items_data = validated_data.pop('orderItem')
         shipping_address = validated_data.pop('shipping_address', None)
         payment_method = validated_data.pop('payment_method', 'COD')
+        lines = [(item['product_id'], item['quantity']) for item in order_items_data]
+        self.flash_sale_claims = {}
+        return self._create_order(user, lines, shipping_address)
 
-        # Create order with zero total initially
-        order = Order.objects.create(
-            user=user,
-            total_price=0,
-            status='PENDING',
-            shipping_address=shipping_address
-        )
+    def _create_order(self, user, lines, shipping_address):
+        # Every product of the basket in one query
+        products = Product.objects.in_bulk({product_id for product_id, _ in lines})
+        for product_id, _ in lines:
+            if product_id not in products:
+                raise serializers.ValidationError(f"Product with ID {product_id} does not exist")
 
-        total_price = 0
+        # Current prices and running deals come from the database for security
+        prices = price_resolver.resolve_checkout(products.values())
+        # Capped deals the basket is charged at are checked in memory before anything is written
+        claimed = flash_sales.claim_lines(lines, prices)
+        try:
+            # Take the units out of stock first; raises InsufficientStock and writes nothing if any line is short
+            inventory.reserve(lines)
 
-        # Process each order item
-        for item_data in order_items_data:
-            product_id = item_data['product_id']
-            quantity = item_data['quantity']
+            items = [
+                OrderItem(product=products[product_id], quantity=quantity,
+                          price=prices[product_id].effective_price)
+                for product_id, quantity in lines
+            ]
 
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(f"Product with ID {product_id} does not exist")
-            
-            # Get the current price from database for security
-            price = product.price
-            item_total = price * quantity
-            total_price += item_total
-            
-            # Create the order item
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price
+            # The total is known up front, so the order is written once
+            order = Order.objects.create(
+                user=user,
+                total_price=sum((item.get_cost() for item in items), 0),
+                status='PENDING',
+                shipping_address=shipping_address
             )
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+        except BaseException:
+            flash_sales.release_lines(claimed)
+            raise
 
-        # Update the order with the calculated total
-        order.total_price = total_price
-        order.save()
-        
+        self.flash_sale_claims = claimed
         return order
 
+    def release_claims(self):
+        """Give the flash-sale allowance back when the order is rolled back after `save()` returned"""
+        flash_sales.release_lines(self.flash_sale_claims)
+        self.flash_sale_claims = {}
+
+
+class OrderItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related = ('product',)
 
-class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     
     class Meta:
@@ -67,7 +83,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['price']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related = ('orderitem_set',)
+
     items = OrderItemSerializer(source='orderitem_set', many=True, read_only=True)
     
     # Add more descriptive fields
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from products.recommendations import bought_together
+from .models import Order
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if previous == instance.status:
+        return
+    order_id = instance.pk
+    if instance.status == 'DELIVERED':
+        transaction.on_commit(lambda: bought_together.order_delivered(order_id))
+    elif previous == 'DELIVERED':
+        transaction.on_commit(lambda: bought_together.order_undelivered(order_id))
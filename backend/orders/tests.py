@@ -1,3 +1,376 @@
-from django.test import TestCase
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError, connection, models, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CUser
+from products import inventory
+from products.deals import deal_scheduler
+from products.flash_sale import flash_sales
+from products.models import Category, Product, DealOfTheDay, Stock
+from .models import Order, OrderItem
+from .serializers import OrderCreateSerializer
+
+
+class OrderQueryBudgetTestCase(TestCase):
+    """Order endpoints must run a fixed number of queries however many orders and items exist"""
+
+    # CoreAPIView wraps each request in a savepoint (SAVEPOINT + RELEASE)
+    SAVEPOINT_QUERIES = 2
+
+    def setUp(self):
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Dairy')
+        self.products = [
+            Product.objects.create(name=f'Milk {i}', description='Milk', price=10, category=category)
+            for i in range(3)
+        ]
+
+    def create_orders(self, count):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(user=self.user, total_price=30)
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=10)
+            orders.append(order)
+        return orders
+
+    def assertBudget(self, budget, url):
+        with self.assertNumQueries(budget + self.SAVEPOINT_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_my_orders_budget(self):
+        self.create_orders(6)
+        # orders + items prefetch + products prefetch
+        self.assertBudget(3, reverse('orders:my-orders'))
+
+    def test_order_list_budget(self):
+        self.create_orders(6)
+        self.assertBudget(3, reverse('orders:order-list'))
+
+    def test_order_detail_budget(self):
+        order = self.create_orders(1)[0]
+        self.assertBudget(3, reverse('orders:order-detail', args=[order.pk]))
+
+
+class OrderPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.orders = [Order.objects.create(user=self.user, total_price=10) for _ in range(12)]
+
+    def test_my_orders_pages_newest_first(self):
+        body = self.client.get(reverse('orders:my-orders')).json()
+        expected = [order.pk for order in reversed(self.orders)]
+        self.assertEqual([order['id'] for order in body['data']], expected[:10])
+        self.assertIsNone(body['extra_context']['previous'])
+
+        body = self.client.get(body['extra_context']['next']).json()
+        self.assertEqual([order['id'] for order in body['data']], expected[10:])
+        self.assertIsNone(body['extra_context']['next'])
+
+
+class OrderCreateQueryBudgetTestCase(TestCase):
+    """Placing an order runs the same queries for a basket of 1, 10 or 100 lines"""
+
+    # SAVEPOINT + RELEASE for CoreAPIView, the view's atomic block and inventory.reserve
+    SAVEPOINT_QUERIES = 6
+
+    def setUp(self):
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Pantry')
+        self.products = Product.objects.bulk_create([
+            Product(name=f'Item {i}', description='-', price=10 + i, category=category) for i in range(100)
+        ])
+        # Reload the in-memory deal schedule now so it does not count against the first basket
+        deal_scheduler.invalidate()
+        deal_scheduler.active_deals()
+
+    def place_orders(self, budget):
+        for size in (1, 10, 100):
+            with self.subTest(size=size), self.assertNumQueries(budget + self.SAVEPOINT_QUERIES):
+                response = self.client.post(reverse('orders:create-order'), {
+                    'orderItem': [{'product_id': product.pk, 'quantity': 2} for product in self.products[:size]],
+                    'payment_method': 'COD',
+                }, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.json()['data']['items']), size)
+            self.assertEqual(
+                Order.objects.get(pk=response.json()['data']['id']).total_price,
+                sum(2 * product.price for product in self.products[:size]),
+            )
+
+    def test_constant_queries(self):
+        # products, stock rows, running deals, order insert, items insert, items + products for the response
+        self.place_orders(7)
+
+    def test_constant_queries_for_tracked_stock(self):
+        Stock.objects.bulk_create([Stock(product=product, quantity=10) for product in self.products])
+        # as above, plus the one UPDATE that takes every line out of stock
+        self.place_orders(8)
+        self.assertEqual(Stock.objects.get(product=self.products[0]).quantity, 4)
+        self.assertEqual(Stock.objects.get(product=self.products[99]).quantity, 8)
+
+
+class OrderPricingTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(name='Milk', description='Milk', price=60, category=category)
+        self.eggs = Product.objects.create(name='Eggs', description='Eggs', price=90, category=category)
+
+    def test_running_deal_price_is_charged(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            DealOfTheDay.objects.create(
+                product=self.milk, deal_price=45,
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        response = self.client.post(reverse('orders:create-order'), {
+            'orderItem': [
+                {'product_id': self.milk.pk, 'quantity': 2},
+                {'product_id': self.eggs.pk, 'quantity': 1},
+            ],
+            'payment_method': 'COD',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, 2 * 45 + 90)
+        self.assertEqual(
+            sorted(order.orderitem_set.values_list('product_id', 'price')),
+            [(self.milk.pk, 45), (self.eggs.pk, 90)],
+        )
+
+    def test_deal_ended_elsewhere_is_not_charged(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            deal = DealOfTheDay.objects.create(
+                product=self.milk, deal_price=45,
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        self.assertEqual(deal_scheduler.deal_for(self.milk.pk).id, deal.pk)
+        # Another process deactivates the deal; this one still has it in memory
+        DealOfTheDay.objects.filter(pk=deal.pk).update(is_active=False)
+        response = self.client.post(reverse('orders:create-order'), {
+            'orderItem': [{'product_id': self.milk.pk, 'quantity': 1}],
+            'payment_method': 'COD',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().total_price, 60)
+
+
+class StockReservationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(name='Milk', description='Milk', price=60, category=category)
+        self.eggs = Product.objects.create(name='Eggs', description='Eggs', price=90, category=category)
+        self.bread = Product.objects.create(name='Bread', description='Bread', price=40, category=category)
+        Stock.objects.create(product=self.milk, quantity=5)
+        Stock.objects.create(product=self.eggs, quantity=2)
+
+    def order(self, *lines):
+        return self.client.post(reverse('orders:create-order'), {
+            'orderItem': [{'product_id': product.pk, 'quantity': quantity} for product, quantity in lines],
+            'payment_method': 'COD',
+        }, format='json')
+
+    def stock(self, product):
+        return Stock.objects.get(product=product).quantity
+
+    def test_checkout_reserves_and_cancel_releases(self):
+        # Bread is not stock-tracked and sells in any quantity
+        response = self.order((self.milk, 2), (self.eggs, 1), (self.milk, 1), (self.bread, 50))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((self.stock(self.milk), self.stock(self.eggs)), (2, 1))
+
+        order = Order.objects.get()
+        response = self.client.post(reverse('orders:order-detail', args=[order.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((self.stock(self.milk), self.stock(self.eggs)), (5, 2))
+
+        # A second cancellation is refused and releases nothing
+        response = self.client.post(reverse('orders:order-detail', args=[order.pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], {'status': 'CANCELLED'})
+        self.assertEqual(self.stock(self.milk), 5)
+
+    def test_admin_adjusts_stock_relative_to_reservations(self):
+        admin = CUser.objects.create_superuser(username='ops', email='ops@example.com', password='pass')
+        self.client.force_login(admin)
+        url = reverse('admin:products_stock_change', args=[self.milk.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # A checkout reserves between the admin opening the form and saving it
+        self.assertEqual(self.order((self.milk, 2)).status_code, 201)
+
+        response = self.client.post(url, {'adjustment': 10})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock(self.milk), 13)
+
+        self.client.post(url, {'adjustment': -20})
+        self.assertEqual(self.stock(self.milk), 13)
+
+    def test_short_line_rejects_the_whole_order(self):
+        response = self.order((self.milk, 2), (self.eggs, 3))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errors'], {'product_id': self.eggs.pk, 'requested': 3, 'available': 2})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual((self.stock(self.milk), self.stock(self.eggs)), (5, 2))
+
+
+@override_settings(CATALOG_SNAPSHOT_REBUILD_DELAY=None)
+class FlashSaleCheckoutTestCase(TestCase):
+
+    def setUp(self):
+        flash_sales.clear()
+        self.addCleanup(flash_sales.clear)
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Electronics')
+        self.phone = Product.objects.create(name='Phone', description='-', price=10000, category=category)
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deal = DealOfTheDay.objects.create(
+                product=self.phone, deal_price=7999, quantity_limit=3,
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+
+    def order(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('orders:create-order'), {
+                'orderItem': [{'product_id': self.phone.pk, 'quantity': quantity}],
+                'payment_method': 'COD',
+            }, format='json')
+
+    def test_orders_over_the_cap_are_rejected(self):
+        self.assertEqual(self.order(2).status_code, 201)
+        response = self.order(2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errors'], {'deal_id': self.deal.pk, 'product_id': self.phone.pk})
+        self.assertEqual(self.order(1).status_code, 201)
+        self.assertEqual(self.order(1).status_code, 409)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(sum(OrderItem.objects.values_list('quantity', flat=True)), 3)
+
+    def test_failed_order_gives_its_allowance_back(self):
+        Stock.objects.create(product=self.phone, quantity=1)
+        self.assertEqual(self.order(2).status_code, 409)
+        Stock.objects.filter(product=self.phone).update(quantity=10)
+        self.assertEqual(self.order(3).status_code, 201)
+
+    def test_failed_payment_gives_its_allowance_back(self):
+        # Leases the whole cap; two units stay in this process for the next orders
+        self.assertEqual(self.order(1).status_code, 201)
+        with mock.patch('orders.views.razorpay.Client', side_effect=RuntimeError('gateway down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('orders:create-order'), {
+                    'orderItem': [{'product_id': self.phone.pk, 'quantity': 2}],
+                    'payment_method': 'ONLINE',
+                }, format='json')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.order(2).status_code, 201)
+
+    def test_deal_above_the_price_claims_nothing(self):
+        DealOfTheDay.objects.filter(pk=self.deal.pk).update(deal_price=12000)
+        self.assertEqual(self.order(3).status_code, 201)
+        self.assertEqual(OrderItem.objects.get().price, 10000)
+        self.assertEqual(DealOfTheDay.objects.get(pk=self.deal.pk).quantity_claimed, 0)
+
+
+class ParallelCheckouts:
+    """Hundreds of parallel checkouts competing for a few units"""
+
+    CHECKOUTS = 300
+    WORKERS = 8
+    UNITS = 40
+
+    def setUp(self):
+        self.user = CUser.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        category = Category.objects.create(name='Flash')
+        self.products = [
+            Product.objects.create(name=f'Console {i}', description='-', price=100, category=category)
+            for i in range(3)
+        ]
+        for product in self.products:
+            Stock.objects.create(product=product, quantity=self.UNITS)
+
+    def checkout(self, number):
+        # Every basket holds two of the products, listed in varying order
+        first, second = self.products[number % 3], self.products[(number + 1) % 3]
+        lines = [{'product_id': first.pk, 'quantity': 1 + number % 2}, {'product_id': second.pk, 'quantity': 1}]
+        if number % 2:
+            lines.reverse()
+        serializer = OrderCreateSerializer(
+            data={'orderItem': lines, 'payment_method': 'COD'},
+            context={'request': SimpleNamespace(user=self.user)},
+        )
+        serializer.is_valid(raise_exception=True)
+        delay = 0.001
+        try:
+            while True:
+                try:
+                    with transaction.atomic():
+                        serializer.save()
+                    return True
+                except inventory.InsufficientStock:
+                    return False
+                except OperationalError:
+                    # SQLite reports a busy table instead of waiting on it; the transaction
+                    # rolled back entirely, so retry it like a serialization failure
+                    time.sleep(random.uniform(0, delay))
+                    delay = min(delay * 2, 0.05)
+        finally:
+            connection.close()
+
+    def run_checkouts(self):
+        with ThreadPoolExecutor(self.WORKERS) as executor:
+            return list(executor.map(self.checkout, range(self.CHECKOUTS)))
+
+
+class StockReservationConcurrencyTestCase(ParallelCheckouts, TransactionTestCase):
+    """Parallel checkouts never oversell"""
+
+    def test_no_oversell(self):
+        results = self.run_checkouts()
+
+        sold = dict(OrderItem.objects.values_list('product_id').annotate(total=models.Sum('quantity')))
+        for product in self.products:
+            stock = Stock.objects.get(product=product).quantity
+            self.assertGreaterEqual(stock, 0)
+            self.assertEqual(stock + sold.get(product.pk, 0), self.UNITS)
+        self.assertEqual(Order.objects.count(), results.count(True))
+        # Demand far exceeds the units, so checkouts stop only once stock runs out
+        self.assertGreater(results.count(False), 0)
+
+
+@tag('benchmark')
+class StockReservationBenchmarkTestCase(ParallelCheckouts, TransactionTestCase):
+    """Wall-clock budget of the parallel checkouts"""
+
+    BUDGET_SECONDS = 30
+
+    def test_checkouts_within_budget(self):
+        started = time.perf_counter()
+        self.run_checkouts()
+        self.assertLess(time.perf_counter() - started, self.BUDGET_SECONDS)
@@ -5,13 +5,16 @@ from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
 from django.conf import settings
 from rest_framework.generics import ListAPIView, RetrieveAPIView
-from django.db.models import Q
+from django.db.models import Q, prefetch_related_objects
 from rest_framework import filters
 
 from constants import RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET
+from products import inventory
+from products.flash_sale import FlashSaleSoldOut
 from .models import Order, OrderItem
 from .serializers import OrderSerializer, OrderCreateSerializer
 from core.views import CoreAPIView
+from core.pagination import KeysetPaginationMixin
 from utils.response import generate_api_response
 from core.success_codes import SuccessCodes as SC
 from core.error_codes import ErrorCodes as EC
@@ -34,6 +37,8 @@ class OrderCreateAPIView(CoreAPIView):
                     
                     # Create order in database but within a transaction
                     order = serializer.save()
+                    # Items and their products for the response, two queries for any basket size
+                    prefetch_related_objects([order], *OrderSerializer.get_eager_loading_plan()[1])
                     
                     if payment_method == 'ONLINE':
                         # Calculate amount for Razorpay (in paise)
@@ -52,7 +57,7 @@ class OrderCreateAPIView(CoreAPIView):
                         
                         # Update order with Razorpay order ID
                         order.razorpay_order_id = razorpay_order['id']
-                        order.save()
+                        order.save(update_fields=['razorpay_order_id', 'updated_at'])
                         
                         # Return order details with Razorpay info
                         response_serializer = OrderSerializer(order)
@@ -70,10 +75,7 @@ class OrderCreateAPIView(CoreAPIView):
                             status_code=status.HTTP_201_CREATED
                         )
                     else:
-                        # For COD orders
-                        order.status = 'PENDING'
-                        order.save()
-                        
+                        # COD orders stay PENDING as created
                         response_serializer = OrderSerializer(order)
                         return generate_api_response(
                             success=True,
@@ -83,8 +85,32 @@ class OrderCreateAPIView(CoreAPIView):
                             status_code=status.HTTP_201_CREATED
                         )
                         
+            except inventory.InsufficientStock as e:
+                # Nothing was reserved or written; the client can retry with less
+                return generate_api_response(
+                    success=False,
+                    message=str(e),
+                    code=EC.RES_CONFLICT.value,
+                    errors={
+                        'product_id': e.product_id,
+                        'requested': e.requested,
+                        'available': e.available,
+                    },
+                    status_code=status.HTTP_409_CONFLICT
+                )
+            except FlashSaleSoldOut as e:
+                # Rejected from the in-memory allowance, nothing was written
+                return generate_api_response(
+                    success=False,
+                    message=str(e),
+                    code=EC.RES_CONFLICT.value,
+                    errors={'deal_id': e.deal_id, 'product_id': e.product_id},
+                    status_code=status.HTTP_409_CONFLICT
+                )
             except Exception as e:
-                # If any error occurs, the transaction will be rolled back
+                # If any error occurs, the transaction will be rolled back, the order's
+                # flash-sale allowance with it (e.g. Razorpay failed after the order was saved)
+                serializer.release_claims()
                 return generate_api_response(
                     success=False,
                     message=f"Failed to create order: {str(e)}",
@@ -162,15 +188,18 @@ class VerifyPaymentView(CoreAPIView):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class OrderListAPIView(CoreAPIView):
+class OrderListAPIView(KeysetPaginationMixin, CoreAPIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         # Get all orders (this might need to be restricted based on user role)
-        orders = Order.objects.all().order_by('-created_at')
-        
+        orders = OrderSerializer.setup_eager_loading(Order.objects.all())
+
+        # Keyset-paginate on (created_at, id), most recent first
+        page, pagination = self.paginate(orders)
+
         # Serialize the orders
-        serializer = OrderSerializer(orders, many=True)
+        serializer = OrderSerializer(page, many=True)
         
         # Use generate_api_response for consistent API response
         return generate_api_response(
@@ -178,6 +207,7 @@ class OrderListAPIView(CoreAPIView):
             message="Orders retrieved successfully",
             code=SC.REQ_DATA_RETRIEVED.value,
             data=serializer.data,
+            extra_context=pagination,
             status_code=status.HTTP_200_OK
         )
 
@@ -187,7 +217,7 @@ class OrderDetailAPIView(CoreAPIView):
     def get(self, request, order_id):
         try:
             # Get the specific order
-            order = Order.objects.get(id=order_id)
+            order = OrderSerializer.setup_eager_loading(Order.objects.all()).get(id=order_id)
             
             # Serialize the order
             serializer = OrderSerializer(order)
@@ -211,8 +241,8 @@ class OrderDetailAPIView(CoreAPIView):
 
     def post(self, request, order_id):
         try:
-            # Get the specific order
-            order = Order.objects.get(id=order_id, user=request.user)
+            # Lock the order so two concurrent cancellations cannot both release its stock
+            order = Order.objects.select_for_update().get(id=order_id, user=request.user)
             
             # Check if order can be cancelled
             if order.status not in ['PENDING', 'PROCESSING']:
@@ -220,6 +250,7 @@ class OrderDetailAPIView(CoreAPIView):
                     success=False,
                     message="Order cannot be cancelled at this stage.",
                     code=EC.RES_CONFLICT.value,
+                    errors={'status': order.status},
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
             
@@ -248,9 +279,10 @@ class OrderDetailAPIView(CoreAPIView):
                     # Log the refund error but continue with order cancellation
                     print(f"Refund Error: {refund_error}")
             
-            # Update order status to CANCELLED
+            # Update order status to CANCELLED and put its units back into stock
             order.status = 'CANCELLED'
             order.save()
+            inventory.release(order.orderitem_set.values_list('product_id', 'quantity'))
             
             # Serialize the updated order
             serializer = OrderSerializer(order)
@@ -282,15 +314,18 @@ class OrderDetailAPIView(CoreAPIView):
                 status_code=status.HTTP_404_NOT_FOUND
             )
 
-class MyOrdersListAPIView(CoreAPIView):
+class MyOrdersListAPIView(KeysetPaginationMixin, CoreAPIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         # Get orders for the current authenticated user, ordered by most recent first
-        orders = Order.objects.filter(user=request.user).order_by('-created_at')
-        
+        orders = OrderSerializer.setup_eager_loading(Order.objects.filter(user=request.user))
+
+        # Keyset-paginate on (created_at, id), most recent first
+        page, pagination = self.paginate(orders)
+
         # Serialize the orders
-        serializer = OrderSerializer(orders, many=True)
+        serializer = OrderSerializer(page, many=True)
         
         # Use generate_api_response for consistent API response
         return generate_api_response(
@@ -298,5 +333,6 @@ class MyOrdersListAPIView(CoreAPIView):
             message="User orders retrieved successfully",
             code=SC.REQ_DATA_RETRIEVED.value,
             data=serializer.data,
+            extra_context=pagination,
             status_code=status.HTTP_200_OK
         )
\ No newline at end of file
@@ -1,10 +1,12 @@
-from django.contrib import admin
-from .models import Category, Product, ProductImage, DealOfTheDay
+from django import forms
+from django.contrib import admin, messages
+from .models import Category, Product, ProductImage, DealOfTheDay, ProductRanking, SearchQuery, CategoryStats, Stock
+from . import inventory
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ["name", "description", "is_active"]
+    list_display = ["name", "slug", "description", "is_active"]
     list_filter = ["is_active"]
     search_fields = ("name", "description")
 
@@ -13,7 +15,7 @@ class CategoryAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ["name", "description", "tag", "price", "category","updated_at", "is_active"]
     list_filter = ["category", "is_active"]
-    search_fields = ("name", "description")
+    search_fields = ("name", "sku", "description")
     list_editable = ["price", "is_active"]
 
 
@@ -24,7 +26,72 @@ class ProductImageAdmin(admin.ModelAdmin):
 
 @admin.register(DealOfTheDay)
 class DealOfTheDayAdmin(admin.ModelAdmin):
-    list_display = ['product', 'deal_price', 'start_date', 'end_date', 'is_active']
+    list_display = ['product', 'deal_price', 'start_date', 'end_date', 'quantity_limit', 'quantity_claimed', 'is_active']
     list_filter = ['is_active', 'start_date', 'end_date']
     search_fields = ['product__name']
     raw_id_fields = ['product']
+
+    readonly_fields = ['quantity_claimed']
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # Checkouts lease units concurrently; never write back the claimed count the form loaded
+            obj.save(update_fields=[
+                field.name for field in obj._meta.concrete_fields
+                if not field.primary_key and field.name != 'quantity_claimed'
+            ])
+        else:
+            super().save_model(request, obj, form, change)
+
+
+@admin.register(ProductRanking)
+class ProductRankingAdmin(admin.ModelAdmin):
+    list_display = ['window', 'computed_at']
+    readonly_fields = ['window', 'entries', 'computed_at']
+
+
+@admin.register(SearchQuery)
+class SearchQueryAdmin(admin.ModelAdmin):
+    list_display = ['query', 'count', 'last_searched_at']
+    search_fields = ['query']
+    ordering = ['-count']
+
+
+@admin.register(CategoryStats)
+class CategoryStatsAdmin(admin.ModelAdmin):
+    list_display = ['category', 'product_count', 'min_price', 'max_price', 'updated_at']
+    readonly_fields = ['category', 'product_count', 'min_price', 'max_price', 'thumbnail', 'updated_at']
+
+
+class StockAdminForm(forms.ModelForm):
+    adjustment = forms.IntegerField(
+        initial=0, required=False,
+        help_text="Units to add to the current stock, negative to remove some.")
+
+    class Meta:
+        model = Stock
+        fields = ['product', 'quantity']
+
+
+@admin.register(Stock)
+class StockAdmin(admin.ModelAdmin):
+    form = StockAdminForm
+    list_display = ['product', 'quantity', 'updated_at']
+    search_fields = ['product__name', 'product__sku']
+    raw_id_fields = ['product']
+
+    def get_fields(self, request, obj=None):
+        return ['product', 'quantity', 'adjustment'] if obj else ['product', 'quantity']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Checkouts reserve concurrently, so an existing count is never saved back whole
+        return ['product', 'quantity'] if obj else []
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+        delta = form.cleaned_data.get('adjustment') or 0
+        if delta and not inventory.adjust(obj.pk, delta):
+            self.message_user(request, f"Stock of {obj.product} was not changed: it would drop below zero.",
+                              level=messages.ERROR)
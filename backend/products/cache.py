@@ -0,0 +1,162 @@
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .deals import deal_scheduler
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CACHE_HITS_KEY = 'catalog:cache:hits'
+CACHE_MISSES_KEY = 'catalog:cache:misses'
+
+
+def get_catalog_version():
+    """
+    Current catalog version, moved whenever a product, category, image or
+    deal change commits. Versions are nanosecond timestamps, so one is never
+    handed out twice: an evicted key or a restarted cache starts a new
+    version instead of bringing old entries and ETags back to life.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def get_catalog_last_modified():
+    """
+    Unix timestamp (seconds, rounded up) of the last change to catalog
+    payloads: the current version, or a deal starting or expiring since,
+    which changes effective prices without any row being saved.
+    """
+    last_modified = -(-get_catalog_version() // 1_000_000_000)
+    last_boundary = deal_scheduler.last_boundary()
+    if last_boundary is not None:
+        last_modified = max(last_modified, math.ceil(last_boundary.timestamp()))
+    return last_modified
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response by moving to a new version"""
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_cache_stats():
+    hits = cache.get(CACHE_HITS_KEY, 0)
+    misses = cache.get(CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def _request_digest(request):
+    """Digest of host, path and the sorted query string so `?a=1&b=2` and `?b=2&a=1` match"""
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    raw = '|'.join([request.get_host(), request.path, repr(params)])
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def make_cache_key(request, version):
+    return f'catalog:response:{version}:{_request_digest(request)}'
+
+
+def make_etag(request, version):
+    return f'"{version}-{_request_digest(request)}"'
+
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: GZipMiddleware marks our strong ETags as W/ when compressing
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in candidates)
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Evaluate If-None-Match / If-Modified-Since. As in RFC 9110,
+    If-Modified-Since is ignored when If-None-Match is present.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def get_cache_timeout():
+    """Never keep an entry past the next deal start/expiry, when the payloads may change"""
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    until_boundary = deal_scheduler.seconds_until_next_boundary()
+    if until_boundary is not None:
+        timeout = min(timeout, until_boundary)
+    return timeout
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Let clients keep the payload but revalidate it on every use
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+def cache_catalog_response(view_method):
+    """
+    Cache the payload of a catalog GET handler under the current catalog version.
+
+    Conditional requests are answered with a 304 before the cache or the
+    view are touched. Only 200 responses are stored. A version bump makes
+    every older entry and ETag stale, so nothing has to be deleted explicitly.
+    The set of running deals is part of the version as well, since deals
+    start and expire without any row changing.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version = f'{get_catalog_version()}-{deal_scheduler.active_key()}'
+        etag = make_etag(request, version)
+        last_modified = get_catalog_last_modified()
+        if is_not_modified(request, etag, last_modified):
+            return _set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+        key = make_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            _count(CACHE_HITS_KEY)
+            return _set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
+
+        _count(CACHE_MISSES_KEY)
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, get_cache_timeout())
+            _set_validators(response, etag, last_modified)
+        return response
+
+    return wrapper
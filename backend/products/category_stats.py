@@ -0,0 +1,56 @@
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+
+from .models import Category, CategoryStats, Product
+
+
+def _aggregates(products):
+    """{category id: {product_count, min_price, max_price}} over active products, one GROUP BY query"""
+    rows = products.filter(is_active=True).order_by().values('category_id').annotate(
+        product_count=Count('id'), min_price=Min('price'), max_price=Max('price'))
+    return {row.pop('category_id'): row for row in rows}
+
+
+def _thumbnails(categories):
+    """{category id: thumbnail} using the most recently updated active product that has one"""
+    latest = Product.objects.filter(category=OuterRef('pk'), is_active=True).exclude(thumbnail='').exclude(
+        thumbnail=None).order_by('-updated_at', '-id').values('thumbnail')[:1]
+    rows = categories.annotate(latest_thumbnail=Subquery(latest)).values_list('id', 'latest_thumbnail')
+    return {category_id: thumbnail for category_id, thumbnail in rows if thumbnail}
+
+
+def _stats(category_ids, aggregates, thumbnails):
+    return [
+        CategoryStats(
+            category_id=category_id,
+            product_count=aggregates.get(category_id, {}).get('product_count', 0),
+            min_price=aggregates.get(category_id, {}).get('min_price'),
+            max_price=aggregates.get(category_id, {}).get('max_price'),
+            thumbnail=thumbnails.get(category_id, ''),
+        )
+        for category_id in category_ids
+    ]
+
+
+def _save(stats):
+    CategoryStats.objects.bulk_create(
+        stats, update_conflicts=True, unique_fields=['category'],
+        update_fields=['product_count', 'min_price', 'max_price', 'thumbnail', 'updated_at'],
+    )
+
+
+def refresh_categories(category_ids):
+    """Recompute the stats of a few categories after their products changed"""
+    category_ids = [category_id for category_id in set(category_ids) if category_id is not None]
+    if not category_ids:
+        return
+    existing = list(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+    if not existing:
+        return
+    products = Product.objects.filter(category_id__in=existing)
+    _save(_stats(existing, _aggregates(products), _thumbnails(Category.objects.filter(id__in=existing))))
+
+
+def rebuild_all():
+    """Recompute every category's stats, e.g. after a bulk import"""
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    _save(_stats(category_ids, _aggregates(Product.objects.all()), _thumbnails(Category.objects.all())))
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+from .models import DealOfTheDay
+
+
+ScheduledDeal = namedtuple(
+    'ScheduledDeal', ['id', 'product_id', 'deal_price', 'start_date', 'end_date', 'quantity_limit'])
+
+# end_date is inclusive, so a deal drops out just after it
+EXPIRY_STEP = timedelta(microseconds=1)
+
+
+class DealScheduler:
+    """
+    Keeps the set of currently running deals in memory.
+
+    All deals that have not ended yet (plus the one that ended last, for
+    `last_boundary`) are loaded once; the active set is then recomputed in
+    memory only when the clock passes the next `start_date`/`end_date`
+    boundary. A `DealOfTheDay` change (see `products.signals`) drops the
+    loaded rows once it commits, so the next read reloads them with one
+    indexed query. Edits made by other processes send no signal here, so
+    the rows are also reloaded every RELOAD_INTERVAL seconds.
+    """
+
+    # How often (seconds) the loaded deals are refreshed from the database
+    RELOAD_INTERVAL = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deals = None
+        self._active = ()
+        self._active_key = ''
+        self._deal_prices = {}
+        self._next_boundary = None
+        self._last_boundary = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._deals = None
+            self._last_boundary = None
+
+    def _recompute(self, now):
+        if self._deals is None:
+            last_ended = DealOfTheDay.objects.filter(is_active=True, end_date__lt=now).order_by(
+                '-end_date').values('end_date')[:1]
+            rows = DealOfTheDay.objects.filter(
+                Q(end_date__gte=now) | Q(end_date=Subquery(last_ended)), is_active=True,
+            ).order_by().values_list('id', 'product_id', 'deal_price', 'start_date', 'end_date', 'quantity_limit')
+            self._deals = [ScheduledDeal(*row) for row in rows]
+            self._loaded_at = time.monotonic()
+
+        passed = [deal.end_date + EXPIRY_STEP for deal in self._deals if deal.end_date < now]
+        self._deals = [deal for deal in self._deals if deal.end_date >= now]
+        active = tuple(sorted(
+            (deal for deal in self._deals if deal.start_date <= now),
+            key=lambda deal: deal.id,
+        ))
+        passed.extend(deal.start_date for deal in active)
+        if self._last_boundary is not None:
+            passed.append(self._last_boundary)
+        self._last_boundary = max(passed, default=None)
+        boundaries = [deal.start_date for deal in self._deals if deal.start_date > now]
+        boundaries.extend(deal.end_date + EXPIRY_STEP for deal in active)
+
+        # Lowest running deal per product
+        deal_prices = {}
+        for deal in active:
+            current = deal_prices.get(deal.product_id)
+            if current is None or deal.deal_price < current.deal_price:
+                deal_prices[deal.product_id] = deal
+
+        self._active = active
+        self._deal_prices = deal_prices
+        self._active_key = hashlib.md5(
+            ','.join(str(deal.id) for deal in active).encode('utf-8')
+        ).hexdigest()[:12]
+        self._next_boundary = min(boundaries, default=None)
+
+    def _stale(self, now):
+        return (
+            self._deals is None
+            or (self._next_boundary is not None and now >= self._next_boundary)
+            or time.monotonic() - self._loaded_at >= self.RELOAD_INTERVAL
+        )
+
+    def _current(self):
+        now = timezone.now()
+        if self._stale(now):
+            with self._lock:
+                if self._stale(now):
+                    if time.monotonic() - self._loaded_at >= self.RELOAD_INTERVAL:
+                        self._deals = None
+                        self._last_boundary = None
+                    self._recompute(now)
+        return now
+
+    def active_deals(self):
+        """Deals running right now, ordered by id"""
+        self._current()
+        return self._active
+
+    def deal_for(self, product_id):
+        """The cheapest deal running for `product_id`, or None"""
+        self._current()
+        return self._deal_prices.get(product_id)
+
+    def active_key(self):
+        """Short digest of the active deal ids; changes exactly when the active set does"""
+        self._current()
+        return self._active_key
+
+    def next_boundary(self):
+        """When the active set changes next (a start or an expiry), or None"""
+        self._current()
+        return self._next_boundary
+
+    def last_boundary(self):
+        """When a deal last started or expired, or None; deal payloads have not changed since"""
+        self._current()
+        return self._last_boundary
+
+    def seconds_until_next_boundary(self):
+        now = self._current()
+        if self._next_boundary is None:
+            return None
+        return max(1, int((self._next_boundary - now).total_seconds()) + 1)
+
+
+deal_scheduler = DealScheduler()
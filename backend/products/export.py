@@ -0,0 +1,103 @@
+import csv
+import json
+import zlib
+from io import StringIO
+
+from django.core.files.storage import default_storage
+
+from .models import Product
+from .pricing import price_resolver
+
+
+# Same column names import_catalog reads, so an export can be imported back
+EXPORT_FIELDS = [
+    'id', 'sku', 'name', 'category', 'category_slug', 'price', 'effective_price', 'deal_id',
+    'tag', 'is_active', 'description', 'thumbnail', 'updated_at',
+]
+
+FORMATS = {
+    # format -> (content type, file extension)
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+# Rows encoded together into one chunk of output
+ROWS_PER_WRITE = 500
+
+
+def iter_rows(queryset=None, chunk_size=2000):
+    """
+    Yield one flat dict per product. Rows come from a plain `values()`
+    query read `chunk_size` at a time, so no model instances or
+    serializers are built and memory does not grow with the catalog.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    rows = queryset.order_by('id').values_list(
+        'id', 'sku', 'name', 'category__name', 'category__slug', 'price', 'tag', 'is_active',
+        'description', 'thumbnail', 'updated_at',
+    )
+    for (pk, sku, name, category, slug, price, tag, is_active,
+         description, thumbnail, updated_at) in rows.iterator(chunk_size=chunk_size):
+        resolved = price_resolver.price_for(pk, price)
+        yield {
+            'id': pk,
+            'sku': sku,
+            'name': name,
+            'category': category,
+            'category_slug': slug,
+            'price': str(price),
+            'effective_price': str(resolved.effective_price),
+            'deal_id': resolved.deal_id,
+            'tag': tag,
+            'is_active': is_active,
+            'description': description,
+            'thumbnail': default_storage.url(thumbnail) if thumbnail else None,
+            'updated_at': updated_at.isoformat(),
+        }
+
+
+def _batched(rows, size=ROWS_PER_WRITE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_ndjson(rows):
+    for batch in _batched(rows):
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in batch).encode('utf-8')
+
+
+def iter_csv(rows):
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for batch in _batched(rows):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16 + 15: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(fmt, queryset=None, gzip=False, chunk_size=2000):
+    """Byte chunks of the catalog in `fmt` ("ndjson" or "csv"), optionally gzipped"""
+    encode = iter_ndjson if fmt == 'ndjson' else iter_csv
+    chunks = encode(iter_rows(queryset, chunk_size=chunk_size))
+    return iter_gzip(chunks) if gzip else chunks
@@ -0,0 +1,137 @@
+import threading
+from collections import Counter
+from decimal import Decimal
+
+from .models import Product
+
+
+TAG_CHOICES = dict(Product._meta.get_field('tag').choices)
+
+# (key, lower bound inclusive, upper bound exclusive or None)
+PRICE_BUCKETS = (
+    ('0-50', Decimal('0'), Decimal('50')),
+    ('50-100', Decimal('50'), Decimal('100')),
+    ('100-200', Decimal('100'), Decimal('200')),
+    ('200-500', Decimal('200'), Decimal('500')),
+    ('500+', Decimal('500'), None),
+)
+
+
+def price_bucket(price):
+    price = Decimal(price)
+    for key, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return key
+    return PRICE_BUCKETS[0][0]
+
+
+def _bucket_overlaps(key, min_price, max_price):
+    _, low, high = next(bucket for bucket in PRICE_BUCKETS if bucket[0] == key)
+    if min_price is not None and high is not None and high <= min_price:
+        return False
+    if max_price is not None and low > max_price:
+        return False
+    return True
+
+
+class FacetIndex:
+    """
+    Product counts per (is_active, category, tag, price bucket) cell.
+
+    The cube is small (2 x categories x 3 tags x 5 buckets), so facet counts
+    for any filter combination are a sum over matching cells instead of a
+    `COUNT ... GROUP BY` per request. Cells are adjusted one product at a
+    time from the `products.signals` handlers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._cells = Counter()
+        self._cell_of = {}   # product id -> cell key
+
+    def build(self):
+        with self._lock:
+            self._cells = Counter()
+            self._cell_of = {}
+            rows = Product.objects.values_list('id', 'is_active', 'category_id', 'tag', 'price')
+            for product_id, is_active, category_id, tag, price in rows.iterator(chunk_size=2000):
+                self._add(product_id, (is_active, category_id, tag, price_bucket(price)))
+            self._built = True
+
+    def ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+
+    def _add(self, product_id, cell):
+        self._cell_of[product_id] = cell
+        self._cells[cell] += 1
+
+    def _remove(self, product_id):
+        cell = self._cell_of.pop(product_id, None)
+        if cell is not None:
+            self._cells[cell] -= 1
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def update_product(self, product):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(product.pk)
+            self._add(product.pk, (product.is_active, product.category_id, product.tag, price_bucket(product.price)))
+
+    def remove_product(self, product_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(product_id)
+
+    def counts(self, is_active=None, category_id=None, tag=None, min_price=None, max_price=None):
+        """
+        Facet counts where each facet applies every filter except its own, so
+        the UI can show how many products picking another value would give.
+        Price filters are applied at bucket granularity.
+        """
+        self.ensure_built()
+        tags, categories, prices = Counter(), Counter(), Counter()
+        with self._lock:
+            cells = list(self._cells.items())
+
+        for (cell_active, cell_category, cell_tag, cell_bucket), count in cells:
+            if is_active is not None and cell_active != is_active:
+                continue
+            matches_category = category_id is None or cell_category == category_id
+            matches_tag = tag is None or cell_tag == tag
+            matches_price = (min_price is None and max_price is None) or _bucket_overlaps(
+                cell_bucket, min_price, max_price)
+
+            if matches_category and matches_price:
+                tags[cell_tag] += count
+            if matches_tag and matches_price:
+                categories[cell_category] += count
+            if matches_category and matches_tag:
+                prices[cell_bucket] += count
+
+        return {
+            'tag': [
+                {'value': value, 'label': label, 'count': tags.get(value, 0)}
+                for value, label in TAG_CHOICES.items()
+            ],
+            'category': [
+                {'value': value, 'count': count}
+                for value, count in sorted(categories.items())
+            ],
+            'price': [
+                {'value': key, 'min': str(low), 'max': str(high) if high is not None else None,
+                 'count': prices.get(key, 0)}
+                for key, low, high in PRICE_BUCKETS
+            ],
+        }
+
+
+facet_index = FacetIndex()
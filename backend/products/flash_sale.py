@@ -0,0 +1,128 @@
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DealOfTheDay
+
+
+class FlashSaleSoldOut(Exception):
+    def __init__(self, deal_id, product_id):
+        self.deal_id = deal_id
+        self.product_id = product_id
+        super().__init__(f"The deal on product {product_id} is sold out")
+
+
+class FlashSaleAllowance:
+    """
+    In-memory purchase allowance for capped (flash-sale) deals.
+
+    Each process keeps a small bucket of units per deal and hands them out
+    under a lock, without touching the database. When a bucket runs dry
+    the process leases the next FLASH_SALE_LEASE_SIZE units from the deal
+    row with one compare-and-set UPDATE of `quantity_claimed`, so the cap
+    holds across processes while the row is written once per lease rather
+    than once per order. Once the row has nothing left the deal is marked
+    sold out here and further claims are refused in memory. A lease is
+    written in the caller's transaction, so its spare units only reach the
+    bucket when that commits; a rolled back lease leaves nothing behind.
+
+    Units leased by a process that exits unused are not returned, so a
+    deal may undersell slightly; it never oversells.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = Counter()    # deal id -> units leased but not handed out yet
+        self._sold_out = set()       # deal ids with nothing left to lease
+
+    def _lease(self, deal_id, wanted):
+        """Move up to `wanted` units from the deal row into this process. Returns how many were granted."""
+        while True:
+            row = DealOfTheDay.objects.filter(pk=deal_id).values_list('quantity_limit', 'quantity_claimed').first()
+            if row is None or row[0] is None:
+                return 0
+            limit, claimed = row
+            granted = min(wanted, limit - claimed)
+            if granted <= 0:
+                return 0
+            # Only succeeds if no other process leased in between; otherwise read again
+            if DealOfTheDay.objects.filter(pk=deal_id, quantity_claimed=claimed).update(
+                    quantity_claimed=claimed + granted):
+                return granted
+
+    def claim(self, deal_id, quantity):
+        """
+        Take `quantity` units of a deal's allowance. Returns how many of them
+        came out of the bucket, which is what `release` may give back if the
+        order fails (units leased for it vanish with its transaction), or
+        None when the deal cannot cover them.
+        """
+        with self._lock:
+            if deal_id in self._sold_out:
+                return None
+            available = self._buckets[deal_id]
+            if quantity <= available:
+                self._buckets[deal_id] -= quantity
+                return quantity
+            missing = quantity - available
+            granted = self._lease(deal_id, max(missing, settings.FLASH_SALE_LEASE_SIZE))
+            if granted < missing:
+                if not available and not granted:
+                    self._sold_out.add(deal_id)
+                # What was leased stays for smaller orders
+                surplus = granted
+            else:
+                self._buckets[deal_id] = 0
+                surplus = granted - missing
+        # The lease is part of the caller's transaction: its units only exist once it commits
+        if surplus:
+            transaction.on_commit(lambda: self.release(deal_id, surplus))
+        return available if granted >= missing else None
+
+    def release(self, deal_id, quantity):
+        with self._lock:
+            self._buckets[deal_id] += quantity
+
+    def claim_lines(self, lines, prices):
+        """
+        Claim the allowance for (product id, quantity) lines whose price in
+        `prices` (product id -> EffectivePrice, see `products.pricing`) is a
+        capped deal, all or nothing; lines charged the regular price claim
+        nothing. Returns what to pass to `release_lines` if the order fails
+        later; raises FlashSaleSoldOut when a deal cannot cover its lines.
+        """
+        wanted = Counter()
+        products = {}
+        for product_id, quantity in lines:
+            price = prices[product_id]
+            if price.deal_id is not None and price.quantity_limit is not None:
+                wanted[price.deal_id] += quantity
+                products[price.deal_id] = product_id
+        claimed = {}
+        for deal_id, quantity in wanted.items():
+            from_bucket = self.claim(deal_id, quantity)
+            if from_bucket is None:
+                self.release_lines(claimed)
+                raise FlashSaleSoldOut(deal_id, products[deal_id])
+            claimed[deal_id] = from_bucket
+        return claimed
+
+    def release_lines(self, claimed):
+        for deal_id, quantity in claimed.items():
+            if quantity:
+                self.release(deal_id, quantity)
+
+    def invalidate(self):
+        """A deal changed (e.g. its limit was raised); let sold-out deals lease again"""
+        with self._lock:
+            self._sold_out.clear()
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._sold_out.clear()
+
+
+flash_sales = FlashSaleAllowance()
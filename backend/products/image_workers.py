@@ -0,0 +1,31 @@
+"""
+Entry points of the image variant process pool.
+
+Pool workers are spawned, so they import this module before Django is set
+up: nothing from Django or from the app may be imported at module level
+here. `init_worker` sets Django up first and the rest is imported lazily.
+"""
+import logging
+
+import django
+
+
+def init_worker(overrides):
+    """Set Django up in a fresh worker, then apply the parent's storage settings (e.g. a test MEDIA_ROOT)"""
+    django.setup()
+    from django.conf import settings
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+
+def generate(name):
+    """Write the variants of `name`. Returns the names written, or [] when the image cannot be read."""
+    from PIL import UnidentifiedImageError
+
+    from .images import generate_variants
+
+    try:
+        return generate_variants(name)
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as exc:
+        logging.getLogger('django').error("Could not generate image variants for %s: %s", name, exc)
+        return []
@@ -0,0 +1,181 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from . import image_workers
+from .cache import bump_catalog_version
+
+
+logger = logging.getLogger('django')
+
+VARIANT_SIZES = (128, 256, 512)
+
+# srcset format -> (file extension, Pillow format, save options)
+VARIANT_FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+RASTER_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff'}
+
+# Settings a pool worker takes over from the process that started it
+WORKER_SETTINGS = ('MEDIA_ROOT', 'MEDIA_URL', 'STORAGES')
+
+# Seconds an image found without variants is not looked up in storage again
+MISSING_VARIANTS_TTL = 60
+
+_executor_lock = threading.Lock()
+_executor = None
+
+# Originals whose variants are known to be written; variants are never removed, so hits are kept for good
+_ready = set()
+# Originals found without variants -> when to look again; variants written here drop them at once
+_missing = {}
+
+
+def is_raster(name):
+    return bool(name) and os.path.splitext(name)[1].lower() in RASTER_EXTENSIONS
+
+
+def variant_name(name, size, fmt):
+    """Storage name of a variant, next to the original: `products/a.png` -> `products/a_256.webp`"""
+    stem = os.path.splitext(name)[0]
+    return f'{stem}_{size}.{VARIANT_FORMATS[fmt][0]}'
+
+
+def get_srcset(name):
+    """
+    `{'webp': 'url 128w, ...', 'jpeg': ...}` for an uploaded image, or None
+    for SVGs, empty fields and images whose variants are not written yet
+    (a fresh upload, or one from before `generate_image_variants` ran).
+    """
+    if not is_raster(name) or not has_variants(name):
+        return None
+    return {
+        fmt: ', '.join(f'{default_storage.url(variant_name(name, size, fmt))} {size}w' for size in VARIANT_SIZES)
+        for fmt in VARIANT_FORMATS
+    }
+
+
+def has_variants(name):
+    """Whether every variant of `name` is written; the one `generate_variants` writes last is checked"""
+    if name in _ready:
+        return True
+    if _missing.get(name, 0) > time.monotonic():
+        return False
+    if default_storage.exists(variant_name(name, VARIANT_SIZES[-1], list(VARIANT_FORMATS)[-1])):
+        _ready.add(name)
+        _missing.pop(name, None)
+        return True
+    # Written by another process meanwhile at the latest after the TTL
+    _missing[name] = time.monotonic() + MISSING_VARIANTS_TTL
+    return False
+
+
+def generate_variants(name):
+    """
+    Write every size/format variant of the stored image `name`. Images are
+    only ever scaled down. Returns the names written.
+    """
+    with default_storage.open(name, 'rb') as original_file:
+        original = Image.open(original_file)
+        original.load()
+
+    written = []
+    for size in VARIANT_SIZES:
+        resized = original.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt, (_, pil_format, options) in VARIANT_FORMATS.items():
+            image = resized
+            if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                # JPEG has no alpha channel, flatten onto white
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.split()[-1])
+                image = background
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **options)
+            target = variant_name(name, size, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            written.append(default_storage.save(target, ContentFile(buffer.getvalue())))
+    return written
+
+
+def _variants_written(names):
+    """`names` had their variants written: expose their srcsets from now on"""
+    for name in names:
+        _ready.add(name)
+        _missing.pop(name, None)
+    if names:
+        # Cached catalog responses were built without these srcsets
+        bump_catalog_version()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the web process is multi-threaded
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=image_workers.init_worker,
+                initargs=({key: getattr(settings, key) for key in WORKER_SETTINGS if hasattr(settings, key)},),
+            )
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the worker pool; the next job starts a new one with the settings then in effect"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def generate_many(names, force=False):
+    """Generate variants for many images across the worker pool. Returns how many images were processed."""
+    names = [name for name in names if is_raster(name) and (force or not has_variants(name))]
+    if not settings.IMAGE_VARIANT_WORKERS:
+        results = map(image_workers.generate, names)
+    else:
+        results = _get_executor().map(image_workers.generate, names)
+    processed = [name for name, written in zip(names, results) if written]
+    _variants_written(processed)
+    return len(processed)
+
+
+def _scheduled_done(name, future):
+    try:
+        written = future.result()
+    except Exception:
+        logger.exception("Image variant worker failed for %s", name)
+        return
+    if written:
+        _variants_written([name])
+
+
+def schedule_variants(name):
+    """
+    Generate the variants of `name` off the request path. With
+    IMAGE_VARIANT_WORKERS = 0 they are generated inline instead.
+    """
+    if not is_raster(name) or has_variants(name):
+        return
+    if not settings.IMAGE_VARIANT_WORKERS:
+        if image_workers.generate(name):
+            _variants_written([name])
+        return
+    future = _get_executor().submit(image_workers.generate, name)
+    future.add_done_callback(lambda done: _scheduled_done(name, done))
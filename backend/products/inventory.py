@@ -0,0 +1,84 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .models import Stock
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Only {available} unit(s) of product {product_id} left, {requested} requested")
+
+
+def _totals(lines):
+    """{product id: quantity} summed over (product id, quantity) lines"""
+    totals = Counter()
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+    return totals
+
+
+def _per_product(totals):
+    """Expression picking each row's quantity out of {product id: quantity}, for one UPDATE over many rows"""
+    return Case(
+        *(When(product_id=product_id, then=Value(quantity)) for product_id, quantity in totals.items()),
+        default=Value(0), output_field=PositiveIntegerField(),
+    )
+
+
+def reserve(lines):
+    """
+    Take `lines` ((product id, quantity) pairs) out of stock, all or nothing,
+    in two queries however many lines are tracked.
+
+    The tracked rows are locked with one `SELECT ... FOR UPDATE` in product
+    id order, so two checkouts sharing products wait on each other instead
+    of deadlocking, and checked against the basket. Every decrement is then
+    applied by a single `UPDATE ... SET quantity = quantity - CASE ... END`
+    that also requires each row to still hold its quantity, so a row can
+    never go below zero even where the database ignores the row locks.
+    When a row lacks the quantity, InsufficientStock is raised and nothing
+    is written.
+    """
+    totals = _totals(lines)
+    with transaction.atomic():
+        available = dict(Stock.objects.select_for_update().filter(product_id__in=totals).order_by(
+            'product_id').values_list('product_id', 'quantity'))
+        for product_id in sorted(available):
+            if available[product_id] < totals[product_id]:
+                raise InsufficientStock(product_id, totals[product_id], available[product_id])
+        if not available:
+            return
+        wanted = {product_id: totals[product_id] for product_id in available}
+        needed = _per_product(wanted)
+        updated = Stock.objects.filter(product_id__in=wanted, quantity__gte=needed).update(
+            quantity=F('quantity') - needed, updated_at=timezone.now())
+        if updated != len(wanted):
+            # Another checkout got in between the read and the write; report the row it emptied
+            current = dict(Stock.objects.filter(product_id__in=wanted).values_list('product_id', 'quantity'))
+            product_id = min(pk for pk in wanted if current.get(pk, 0) < wanted[pk])
+            raise InsufficientStock(product_id, wanted[product_id], current.get(product_id, 0))
+
+
+def release(lines):
+    """Put `lines` back into stock, e.g. when their order is cancelled. Untracked products are skipped."""
+    totals = _totals(lines)
+    if not totals:
+        return
+    Stock.objects.filter(product_id__in=totals).update(
+        quantity=F('quantity') + _per_product(totals), updated_at=timezone.now())
+
+
+def adjust(product_id, delta):
+    """
+    Add `delta` (possibly negative) units to a product's stock relative to
+    whatever it holds now, so a restock never overwrites reservations made
+    meanwhile. Returns False, changing nothing, when it would go below zero.
+    """
+    return bool(Stock.objects.filter(product_id=product_id, quantity__gte=max(-delta, 0)).update(
+        quantity=F('quantity') + delta, updated_at=timezone.now()))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.snapshot import build_snapshot, get_snapshot_dir
+
+
+class Command(BaseCommand):
+    help = "Build the precompressed catalog snapshot served at /products/snapshot/"
+
+    def handle(self, *args, **options):
+        manifest = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Catalog snapshot v{manifest['version']} ({manifest['size']} bytes, "
+            f"{', '.join(manifest['files'])}) written to {get_snapshot_dir()}"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.similarity import build_index, get_index_dir
+
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped TF-IDF matrix behind /products/<pk>/similar/"
+
+    def handle(self, *args, **options):
+        meta = build_index()
+        products, terms = meta['shape']
+        self.stdout.write(self.style.SUCCESS(
+            f"Similarity index {meta['build']} ({products} products x {terms} terms) written to {get_index_dir()}"
+        ))
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.export import FORMATS, iter_export
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog to a file or stdout as NDJSON or CSV, optionally gzipped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file (default: stdout)")
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output")
+        parser.add_argument('--active-only', action='store_true', help="Skip inactive products")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per database round trip")
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['active_only']:
+            products = products.filter(is_active=True)
+
+        path = options['path']
+        started = time.perf_counter()
+        try:
+            output = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+        written = 0
+        try:
+            for chunk in iter_export(options['format'], products, gzip=options['gzip'],
+                                     chunk_size=options['chunk_size']):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if path != '-':
+                output.close()
+
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {written} bytes to {path} in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_many
+from products.models import Category, Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for every uploaded product, category and gallery image"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        names = set()
+        names.update(Product.objects.exclude(thumbnail='').exclude(thumbnail=None).values_list('thumbnail', flat=True))
+        names.update(Category.objects.exclude(thumbnail='').exclude(thumbnail=None).values_list('thumbnail', flat=True))
+        names.update(ProductImage.objects.exclude(image='').values_list('image', flat=True))
+        processed = generate_many(sorted(names), force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {processed} of {len(names)} images"))
@@ -0,0 +1,240 @@
+import csv
+import gzip
+import hashlib
+import json
+import sys
+import time
+from functools import lru_cache
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from products.facets import TAG_CHOICES
+from products.models import Category, Product, category_slug
+from products.signals import catalog_bulk_changed
+from products.snapshot import build_snapshot, get_snapshot_manifest
+
+
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+# Columns an existing product takes over from the import
+PRODUCT_UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'tag', 'is_active', 'updated_at']
+
+# Product.sku max_length; generated SKUs are shortened to fit, supplied ones are rejected
+SKU_MAX_LENGTH = 64
+
+# Line errors printed before the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# A catalog has few distinct category names; do not slugify each one per row
+cached_category_slug = lru_cache(maxsize=4096)(category_slug)
+
+
+def parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"invalid boolean {value!r}")
+
+
+def default_sku(slug, name):
+    """`<category slug>-<name slug>`, or when that is too long its prefix plus a short hash of it"""
+    sku = f'{slug}-{slugify(name)}'
+    if len(sku) <= SKU_MAX_LENGTH:
+        return sku
+    digest = hashlib.sha1(sku.encode('utf-8')).hexdigest()[:8]
+    return f"{sku[:SKU_MAX_LENGTH - len(digest) - 1].rstrip('-')}-{digest}"
+
+
+def parse_row(row):
+    """Validate one input record. Returns (category slug, category name, product fields) or raises ValueError."""
+    name = (row.get('name') or '').strip()
+    category = (row.get('category') or '').strip()
+    if not name:
+        raise ValueError("missing name")
+    slug = cached_category_slug(category)
+    if not slug:
+        raise ValueError("missing category")
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise ValueError(f"invalid price {row.get('price')!r}")
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"invalid price {row.get('price')!r}")
+    tag = (row.get('tag') or 'new_arrivals').strip()
+    if tag not in TAG_CHOICES:
+        raise ValueError(f"invalid tag {tag!r}")
+    sku = (row.get('sku') or '').strip() or default_sku(slug, name)
+    if len(sku) > SKU_MAX_LENGTH:
+        raise ValueError(f"sku longer than {SKU_MAX_LENGTH} characters")
+    return slug, category, {
+        'sku': sku,
+        'name': name,
+        'description': (row.get('description') or '').strip(),
+        'price': price.quantize(Decimal('0.01')),
+        'tag': tag,
+        'is_active': parse_bool(row.get('is_active')),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or JSONL catalog (columns: sku, name, category, price, description, tag, is_active) "
+        "and upsert categories and products in chunks. Products are matched on sku, which defaults to "
+        "<category slug>-<name slug>, shortened with a hash when longer than 64 characters."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, optionally .gz compressed, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows written per transaction")
+
+    def _detect_format(self, path, fmt):
+        if fmt:
+            return fmt
+        name = path[:-3] if path.endswith('.gz') else path
+        for candidate in FORMATS:
+            if name.endswith(f'.{candidate}') or (candidate == 'jsonl' and name.endswith('.ndjson')):
+                return candidate
+        raise CommandError("Cannot tell the input format from the file name, pass --format")
+
+    def _open(self, path):
+        if path == '-':
+            return sys.stdin
+        try:
+            if path.endswith('.gz'):
+                return gzip.open(path, 'rt', encoding='utf-8', newline='')
+            return open(path, encoding='utf-8', newline='')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+    def _records(self, handle, fmt):
+        """Yield (line number, record dict) without reading the whole input"""
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_no, exc
+                continue
+            yield line_no, record if isinstance(record, dict) else ValueError("not a JSON object")
+
+    def _adopt_unkeyed(self, chunk):
+        """
+        Give products saved without a sku (seed data, the admin) the sku
+        this import generates for them, so their rows update them instead
+        of inserting copies. The oldest product wins a contested sku.
+        """
+        names = {fields['name'] for _, _, fields in chunk.values()}
+        rows = Product.objects.filter(Q(sku=None) | Q(sku=''), name__in=names).order_by('id').values_list(
+            'id', 'name', 'category__name')
+        adopted = {}
+        for product_id, name, category_name in rows:
+            sku = default_sku(cached_category_slug(category_name), name)
+            if sku in chunk:
+                adopted.setdefault(sku, product_id)
+        if not adopted:
+            return
+        taken = set(Product.objects.filter(sku__in=adopted).values_list('sku', flat=True))
+        Product.objects.bulk_update(
+            [Product(id=product_id, sku=sku) for sku, product_id in adopted.items() if sku not in taken], ['sku'])
+
+    def _write_chunk(self, chunk, category_ids):
+        """Upsert the categories first seen in this chunk, then its products"""
+        new_categories = {}
+        for slug, category_name, _ in chunk.values():
+            if slug not in category_ids:
+                new_categories.setdefault(slug, category_name)
+
+        now = timezone.now()
+        with transaction.atomic():
+            if self.unkeyed:
+                self._adopt_unkeyed(chunk)
+            if new_categories:
+                Category.objects.bulk_create(
+                    [Category(name=name, slug=slug) for slug, name in new_categories.items()],
+                    update_conflicts=True, unique_fields=['slug'], update_fields=['name'],
+                )
+                category_ids.update(
+                    Category.objects.filter(slug__in=new_categories).values_list('slug', 'id'))
+            Product.objects.bulk_create(
+                [
+                    Product(category_id=category_ids[slug], created_at=now, updated_at=now, **fields)
+                    for slug, _, fields in chunk.values()
+                ],
+                update_conflicts=True, unique_fields=['sku'], update_fields=PRODUCT_UPDATE_FIELDS,
+            )
+
+    def handle(self, *args, **options):
+        fmt = self._detect_format(options['path'], options['format'])
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        # Categories already written during this run; each is upserted once
+        category_ids = {}
+        # Products without a sku are matched by their generated one; none left means nothing to look up per chunk
+        self.unkeyed = Product.objects.filter(Q(sku=None) | Q(sku='')).exists()
+        chunk = {}  # sku -> (category slug, category name, fields); a repeated sku keeps its last row
+        imported = errors = 0
+        started = time.perf_counter()
+
+        handle = self._open(options['path'])
+        try:
+            for line_no, record in self._records(handle, fmt):
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    slug, category_name, fields = parse_row(record)
+                except ValueError as exc:
+                    errors += 1
+                    if errors <= MAX_REPORTED_ERRORS:
+                        self.stderr.write(f"Line {line_no}: {exc}")
+                    continue
+
+                chunk[fields['sku']] = (slug, category_name, fields)
+                if len(chunk) >= chunk_size:
+                    self._write_chunk(chunk, category_ids)
+                    imported += len(chunk)
+                    chunk = {}
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f"{imported} rows, {imported / (time.perf_counter() - started):.0f} rows/sec")
+            if chunk:
+                self._write_chunk(chunk, category_ids)
+                imported += len(chunk)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+            if imported:
+                # bulk_create sends no model signals; refresh the catalog once
+                catalog_bulk_changed()
+
+        elapsed = time.perf_counter() - started
+        if imported and get_snapshot_manifest(build_missing=False) is not None:
+            # The debounced rebuild would die with this process
+            build_snapshot()
+        if errors > MAX_REPORTED_ERRORS:
+            self.stderr.write(f"... {errors - MAX_REPORTED_ERRORS} more invalid rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} products into {len(category_ids)} categories in {elapsed:.1f}s "
+            f"({imported / elapsed if elapsed else 0:.0f} rows/sec), skipped {errors} invalid rows"
+        ))
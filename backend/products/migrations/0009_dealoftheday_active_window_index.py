@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-16 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_category_slug"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dealoftheday",
+            index=models.Index(
+                fields=["is_active", "end_date", "start_date"],
+                name="deal_active_window_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_product_sku"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRanking",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("window", models.CharField(max_length=10, unique=True)),
+                ("entries", models.JSONField(default=list)),
+                ("computed_at", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.15 on 2026-10-16 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_productranking"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoughtTogether",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bought_together",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["product", "-score"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "related"),
+                        name="unique_bought_together_pair",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_boughttogether"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("query", models.CharField(max_length=100, unique=True)),
+                ("count", models.PositiveBigIntegerField(default=0)),
+                ("last_searched_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name_plural": "Search queries",
+                "indexes": [
+                    models.Index(fields=["-count"], name="search_query_count_idx")
+                ],
+            },
+        ),
+    ]
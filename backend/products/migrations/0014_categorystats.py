@@ -0,0 +1,83 @@
+# Generated by Django 5.1.15 on 2026-10-16 20:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def populate_stats(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    CategoryStats = apps.get_model("products", "CategoryStats")
+    Product = apps.get_model("products", "Product")
+    active = Product.objects.filter(is_active=True)
+    aggregates = {
+        row.pop("category_id"): row
+        for row in active.order_by()
+        .values("category_id")
+        .annotate(
+            product_count=Count("id"), min_price=Min("price"), max_price=Max("price")
+        )
+    }
+    thumbnails = {}
+    for category_id, thumbnail in (
+        active.exclude(thumbnail="")
+        .exclude(thumbnail=None)
+        .order_by("category_id", "-updated_at", "-id")
+        .values_list("category_id", "thumbnail")
+    ):
+        thumbnails.setdefault(category_id, thumbnail)
+    CategoryStats.objects.bulk_create(
+        [
+            CategoryStats(
+                category_id=category_id,
+                thumbnail=thumbnails.get(category_id, ""),
+                **aggregates.get(category_id, {}),
+            )
+            for category_id in Category.objects.values_list("id", flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0013_searchquery"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="products.category",
+                    ),
+                ),
+                ("product_count", models.PositiveIntegerField(default=0)),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("thumbnail", models.CharField(blank=True, max_length=255)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Category stats",
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-16 20:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0014_categorystats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Stock",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stock",
+                        serialize=False,
+                        to="products.product",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
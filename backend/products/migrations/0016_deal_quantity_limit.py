@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-16 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0015_stock"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dealoftheday",
+            name="quantity_claimed",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="dealoftheday",
+            name="quantity_limit",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.15 on 2026-10-16 22:10
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_counts(apps, schema_editor):
+    """Count the pairs of every order delivered so far; later deliveries increment them"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    BoughtTogetherCount = apps.get_model('products', 'BoughtTogetherCount')
+    baskets = defaultdict(set)
+    rows = OrderItem.objects.filter(order__status='DELIVERED').values_list('order_id', 'product_id')
+    for order_id, product_id in rows.iterator(chunk_size=10000):
+        baskets[order_id].add(product_id)
+    counts = Counter()
+    for basket in baskets.values():
+        for product_id in basket:
+            for related_id in basket:
+                counts[product_id, related_id] += 1
+    BoughtTogetherCount.objects.bulk_create(
+        (BoughtTogetherCount(product_id=product_id, related_id=related_id, count=count)
+         for (product_id, related_id), count in counts.items()),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_order_razorpay_order_id"),
+        ("products", "0016_deal_quantity_limit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoughtTogetherCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "related"),
+                        name="unique_bought_together_count",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_counts, migrations.RunPython.noop),
+    ]
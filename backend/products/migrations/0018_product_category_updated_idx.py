@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0017_boughttogethercount"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-updated_at"],
+                name="product_category_updated_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-17 09:12
+
+import hashlib
+
+from django.db import migrations
+from django.utils.text import slugify
+
+SKU_MAX_LENGTH = 64
+
+
+def default_sku(slug, name):
+    # Same rule as import_catalog.default_sku, frozen here
+    sku = f"{slug}-{slugify(name)}"
+    if len(sku) <= SKU_MAX_LENGTH:
+        return sku
+    digest = hashlib.sha1(sku.encode("utf-8")).hexdigest()[:8]
+    return f"{sku[:SKU_MAX_LENGTH - len(digest) - 1].rstrip('-')}-{digest}"
+
+
+def backfill_skus(apps, schema_editor):
+    """Give products created before skus the sku an import generates for them, so imports update them"""
+    Product = apps.get_model("products", "Product")
+    used = set(Product.objects.exclude(sku=None).exclude(sku="").values_list("sku", flat=True))
+    products = Product.objects.filter(sku=None) | Product.objects.filter(sku="")
+    updated = []
+    for product in products.select_related("category").order_by("id"):
+        category_slug = slugify(product.category.name.replace("&", " and "))
+        base = default_sku(category_slug, product.name)
+        # The oldest product keeps the import's sku; later ones with the same name get a numbered one
+        sku, suffix = base, 2
+        while sku in used:
+            sku = default_sku(category_slug, f"{product.name} {suffix}")
+            suffix += 1
+        used.add(sku)
+        product.sku = sku
+        updated.append(product)
+    Product.objects.bulk_update(updated, ["sku"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0018_product_category_updated_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_skus, migrations.RunPython.noop),
+    ]
@@ -2,18 +2,37 @@ from django.db import models
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from django.utils.text import slugify
+
+
+def category_slug(name):
+    """URL slug for a category name, matching the frontend ("Fruits & Vegetables" -> "fruits-and-vegetables")"""
+    return slugify(name.replace('&', ' and '))
+
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255, unique=True, blank=True)
     thumbnail = models.FileField(upload_to='thumbnails/', blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            base = category_slug(self.name) or 'category'
+            slug, suffix = base, 2
+            while Category.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+                slug = f'{base}-{suffix}'
+                suffix += 1
+            self.slug = slug
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)  # Stable key used by catalog imports
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
@@ -26,6 +45,19 @@ class Product(models.Model):
                                                                   ('top_rated', 'Top Rated')])
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Category stats: each category's most recently updated product
+            models.Index(fields=['category', '-updated_at'], name='product_category_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Category as loaded, so the category stats of a product moved elsewhere are refreshed too
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -48,14 +80,114 @@ class DealOfTheDay(models.Model):
     start_date = models.DateTimeField(default=timezone.now)
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
+    # Flash sale: units sellable at the deal price, empty for an uncapped deal
+    quantity_limit = models.PositiveIntegerField(blank=True, null=True)
+    # Units handed out to the workers' in-memory allowances so far, see `products.flash_sale`
+    quantity_claimed = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Cold path of the deal scheduler: active deals that have not ended yet
+            models.Index(fields=['is_active', 'end_date', 'start_date'], name='deal_active_window_idx'),
+        ]
         verbose_name = 'Deal of the Day'
         verbose_name_plural = 'Deals of the Day'
 
     def __str__(self):
         return f"Deal: {self.product.name} - {self.deal_price}"
 
+
+
+class ProductRanking(models.Model):
+    """Latest order-driven ranking for one window, written by `products.rankings`"""
+    window = models.CharField(max_length=10, unique=True)
+    entries = models.JSONField(default=list)  # [[product id, score], ...], best first
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Ranking {self.window} ({len(self.entries)} products)"
+
+
+class BoughtTogether(models.Model):
+    """Top-K products bought in the same delivered orders as `product`, written by `products.recommendations`"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bought_together')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField()  # Delivered orders containing both
+    score = models.FloatField()            # count / sqrt(orders with product * orders with related)
+
+    class Meta:
+        ordering = ['product', '-score']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_bought_together_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class BoughtTogetherCount(models.Model):
+    """
+    Delivered orders containing both `product` and `related`, for every pair
+    ever bought together; the diagonal (`related == product`) counts the
+    orders containing the product. Incremented in place by `products.recommendations`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_bought_together_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id}: {self.count}"
+
+
+class SearchQuery(models.Model):
+    """How often a normalized search query was run; the search cache pre-warms the most frequent ones"""
+    query = models.CharField(max_length=100, unique=True)
+    count = models.PositiveBigIntegerField(default=0)
+    last_searched_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-count'], name='search_query_count_idx'),
+        ]
+        verbose_name_plural = 'Search queries'
+
+    def __str__(self):
+        return f"{self.query} ({self.count})"
+
+
+class CategoryStats(models.Model):
+    """Aggregates over a category's active products, kept up to date by `products.category_stats`"""
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    product_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    thumbnail = models.CharField(max_length=255, blank=True)  # Storage name of a representative product thumbnail
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Category stats'
+
+    def __str__(self):
+        return f"{self.category} ({self.product_count} products)"
+
+
+class Stock(models.Model):
+    """
+    Units of a product available for sale. Products without a row are not
+    stock-tracked and can be ordered in any quantity. Only change `quantity`
+    through `products.inventory`, which does it with conditional UPDATEs.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stock')
+    quantity = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product} ({self.quantity} in stock)"
@@ -0,0 +1,53 @@
+from collections import namedtuple
+
+from django.utils import timezone
+
+from .deals import deal_scheduler
+from .models import DealOfTheDay
+
+
+# quantity_limit is the flash-sale cap of the deal applied, None when uncapped or no deal applies
+EffectivePrice = namedtuple(
+    'EffectivePrice', ['product_id', 'price', 'effective_price', 'deal_id', 'quantity_limit'])
+
+
+class PriceResolver:
+    """
+    Single place that decides what a product costs right now.
+
+    Running deals come from the in-memory `deal_scheduler`, so pricing
+    products that are already loaded costs no query. What an order is
+    charged comes from `resolve_checkout` instead, which reads the deals
+    from the database.
+    """
+
+    def _apply(self, product_id, base_price, deal):
+        if deal is not None and deal.deal_price < base_price:
+            return EffectivePrice(product_id, base_price, deal.deal_price, deal.id, deal.quantity_limit)
+        return EffectivePrice(product_id, base_price, base_price, None, None)
+
+    def price_for(self, product_id, base_price):
+        return self._apply(product_id, base_price, deal_scheduler.deal_for(product_id))
+
+    def resolve_checkout(self, products):
+        """
+        Map product id -> EffectivePrice for already loaded products, with the
+        running deals read in one query. The in-memory schedule may lag
+        behind deal edits made by other processes, which is fine for a
+        listing but not for what an order is charged.
+        """
+        now = timezone.now()
+        running = DealOfTheDay.objects.filter(
+            product_id__in=[product.pk for product in products],
+            is_active=True, start_date__lte=now, end_date__gte=now,
+        ).order_by().only('id', 'product_id', 'deal_price', 'quantity_limit')
+        # Lowest running deal per product
+        deals = {}
+        for deal in running:
+            current = deals.get(deal.product_id)
+            if current is None or deal.deal_price < current.deal_price:
+                deals[deal.product_id] = deal
+        return {product.pk: self._apply(product.pk, product.price, deals.get(product.pk)) for product in products}
+
+
+price_resolver = PriceResolver()
@@ -0,0 +1,235 @@
+import heapq
+import logging
+import math
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import Product, ProductRanking
+
+
+logger = logging.getLogger('django')
+
+# Window -> decay time constant in seconds
+WINDOWS = {
+    '1h': 60 * 60,
+    '24h': 24 * 60 * 60,
+    '7d': 7 * 24 * 60 * 60,
+}
+
+# Orders older than this contribute less than e^-3 (5%) even to the 7d window
+HORIZON = timedelta(seconds=3 * max(WINDOWS.values()))
+
+# How long an order may stay uncommitted after it was created: the checkout transaction spans the
+# payment gateway call. Items this recent are re-read on every run, so an order committing after a
+# higher item id was already ingested is still counted.
+LATE_COMMIT_GRACE = timedelta(minutes=10)
+
+# Rebase the scores before exp() gets anywhere near overflowing
+MAX_EXPONENT = 50.0
+MIN_SCORE = 1e-6
+
+
+class RankingTracker:
+    """
+    Exponentially decayed order volume per product over several windows.
+
+    A unit ordered at time t is worth exp(-(now - t) / tau) in a window with
+    time constant tau. Scores are kept as exp((t - anchor) / tau) sums, which
+    never have to be decayed as time passes; only new order items are added
+    (read from the `OrderItem` id watermark onwards, plus the orders of the
+    last LATE_COMMIT_GRACE, whose ids may commit out of order) and items of
+    orders cancelled since the last run are subtracted. The ranked lists are
+    rebuilt from the scores on every refresh and stored in `ProductRanking`,
+    while `ranked()` only slices the lists already in memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._scores = None          # window -> {product id: scaled score}
+        self._anchor = None
+        self._watermark = 0          # highest OrderItem id ingested
+        self._recent = {}            # item id -> order created_at, counted items still inside LATE_COMMIT_GRACE
+        self._cancelled = {}         # cancelled order id -> created_at, already excluded
+        self._cancel_checked_at = None
+        self._lists = {}             # window -> [[product id, score], ...]
+        self._computed_at = None
+        self._refreshing = False
+
+    def _weight(self, window, created_at):
+        return math.exp((created_at - self._anchor).total_seconds() / WINDOWS[window])
+
+    def _add(self, product_id, quantity, created_at, sign=1):
+        for window, scores in self._scores.items():
+            score = scores.get(product_id, 0.0) + sign * quantity * self._weight(window, created_at)
+            if score > MIN_SCORE:
+                scores[product_id] = score
+            else:
+                scores.pop(product_id, None)
+
+    def _rebase(self, now):
+        """Move the anchor to `now`, rescaling (and pruning) every score"""
+        if self._anchor is not None:
+            for window, scores in self._scores.items():
+                factor = math.exp(-(now - self._anchor).total_seconds() / WINDOWS[window])
+                self._scores[window] = {
+                    product_id: score * factor
+                    for product_id, score in scores.items() if score * factor > MIN_SCORE
+                }
+        self._anchor = now
+
+    def _build(self, now):
+        self._scores = {window: {} for window in WINDOWS}
+        self._anchor = now
+        since = now - HORIZON
+        # Orders cancelled from here on are caught by the next `_ingest`
+        self._cancel_checked_at = now
+        self._cancelled = dict(Order.objects.filter(
+            status='CANCELLED', created_at__gte=since).values_list('id', 'created_at'))
+        items = OrderItem.objects.filter(order__created_at__gte=since).exclude(
+            order__status='CANCELLED').values_list('id', 'product_id', 'quantity', 'order__created_at')
+        self._recent = {}
+        recent_since = now - LATE_COMMIT_GRACE
+        watermark = 0
+        for item_id, product_id, quantity, created_at in items.iterator(chunk_size=5000):
+            self._add(product_id, quantity, created_at)
+            if created_at >= recent_since:
+                self._recent[item_id] = created_at
+            watermark = max(watermark, item_id)
+        # Only what the scan saw: later commits have higher ids or are recent, and are read next time
+        self._watermark = watermark
+
+    def _ingest(self, now):
+        """Fold in order items committed and orders cancelled since the last run"""
+        recent_since = now - LATE_COMMIT_GRACE
+        new_items = OrderItem.objects.filter(
+            Q(id__gt=self._watermark) | Q(order__created_at__gte=recent_since)).values_list(
+            'id', 'product_id', 'quantity', 'order__created_at', 'order__status')
+        watermark = self._watermark
+        for item_id, product_id, quantity, created_at, order_status in new_items.iterator(chunk_size=5000):
+            watermark = max(watermark, item_id)
+            if item_id in self._recent or order_status == 'CANCELLED':
+                continue
+            if item_id <= self._watermark and created_at < recent_since:
+                # Counted by an earlier run before it left the grace period
+                continue
+            self._add(product_id, quantity, created_at)
+            self._recent[item_id] = created_at
+
+        # `updated_at` moves when the status does; an order already excluded is skipped
+        cancelled = Order.objects.filter(
+            status='CANCELLED', updated_at__gte=self._cancel_checked_at).values_list('id', 'created_at')
+        newly_cancelled = {pk: created_at for pk, created_at in cancelled if pk not in self._cancelled}
+        if newly_cancelled:
+            # Take back only what was counted: recent items are tracked one by one, older ones were
+            # counted if the watermark had passed them
+            items = OrderItem.objects.filter(order_id__in=newly_cancelled).values_list(
+                'id', 'product_id', 'quantity', 'order__created_at')
+            for item_id, product_id, quantity, created_at in items:
+                if self._recent.pop(item_id, None) is not None or (
+                        item_id <= self._watermark and created_at < recent_since):
+                    self._add(product_id, quantity, created_at, sign=-1)
+            self._cancelled.update(newly_cancelled)
+
+        self._watermark = watermark
+        self._recent = {item_id: created_at for item_id, created_at in self._recent.items()
+                        if created_at >= recent_since}
+        self._cancel_checked_at = now
+        since = now - HORIZON
+        self._cancelled = {pk: created_at for pk, created_at in self._cancelled.items() if created_at >= since}
+
+    def _rank(self, now):
+        size = settings.RANKING_SIZE
+        candidates = {
+            window: heapq.nlargest(size * 2, scores.items(), key=lambda entry: entry[1])
+            for window, scores in self._scores.items()
+        }
+        candidate_ids = {product_id for entries in candidates.values() for product_id, _ in entries}
+        active = set(Product.objects.filter(id__in=candidate_ids, is_active=True).values_list('id', flat=True))
+        lists = {}
+        for window, entries in candidates.items():
+            # Scores relative to the anchor, brought to "decayed units as of now"
+            factor = math.exp(-(now - self._anchor).total_seconds() / WINDOWS[window])
+            lists[window] = [
+                [product_id, round(score * factor, 4)]
+                for product_id, score in entries if product_id in active
+            ][:size]
+        return lists
+
+    def refresh(self):
+        """Ingest new orders, re-rank and persist the lists. Returns the lists."""
+        with self._refresh_lock:
+            now = timezone.now()
+            if self._scores is None:
+                self._build(now)
+            else:
+                if max((now - self._anchor).total_seconds() / tau for tau in WINDOWS.values()) > MAX_EXPONENT:
+                    self._rebase(now)
+                self._ingest(now)
+            lists = self._rank(now)
+            for window, entries in lists.items():
+                ProductRanking.objects.update_or_create(
+                    window=window, defaults={'entries': entries, 'computed_at': now})
+            with self._lock:
+                self._lists = lists
+                self._computed_at = now
+            return lists
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Product ranking refresh failed")
+        finally:
+            with self._lock:
+                self._refreshing = False
+            # The thread owns its own connection; do not leak it
+            connection.close()
+
+    def _load_persisted(self):
+        rows = ProductRanking.objects.filter(window__in=WINDOWS).values_list('window', 'entries', 'computed_at')
+        with self._lock:
+            for window, entries, computed_at in rows:
+                self._lists[window] = entries
+                if self._computed_at is None or computed_at < self._computed_at:
+                    self._computed_at = computed_at
+
+    def _schedule_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def ranked(self, window):
+        """
+        The current list for `window` and when it was computed. Stale lists
+        are refreshed in a background thread while the current ones are served.
+        """
+        if self._computed_at is None:
+            self._load_persisted()
+        interval = settings.RANKING_REFRESH_INTERVAL
+        if interval is not None and (
+                self._computed_at is None
+                or (timezone.now() - self._computed_at).total_seconds() >= interval):
+            self._schedule_refresh()
+        return self._lists.get(window, []), self._computed_at
+
+    def reset(self):
+        with self._refresh_lock, self._lock:
+            self._scores = None
+            self._anchor = None
+            self._watermark = 0
+            self._recent = {}
+            self._cancelled = {}
+            self._lists = {}
+            self._computed_at = None
+
+
+ranking_tracker = RankingTracker()
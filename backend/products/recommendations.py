@@ -0,0 +1,135 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from scipy import sparse
+
+from orders.models import OrderItem
+from .models import BoughtTogether, BoughtTogetherCount
+
+
+class BoughtTogetherIndex:
+    """
+    Basket co-occurrence counts over delivered orders.
+
+    Counts are kept in `BoughtTogetherCount`, one row per pair of products
+    ever delivered together, plus a diagonal row per product holding how
+    many delivered orders contain it. `build()` recomputes all of them with
+    one sparse product: with B the order x product incidence matrix,
+    `B.T @ B` holds the number of orders containing both products.
+
+    A newly delivered (or returned) order only touches the pairs inside its
+    basket: they are incremented in place with `F()`, so concurrent updates
+    from any process add up, and the top-K `BoughtTogether` rows are
+    rewritten from the stored counts for the products of that order. Scores
+    of rows pointing at one of those products from outside the basket are
+    refreshed by the next full `build_bought_together` run.
+    """
+
+    @staticmethod
+    def _incidence(order_ids, product_ids):
+        """Order x product id matrix with a 1 where the order contains the product"""
+        # Repeated lines of one product in an order count once
+        pairs = np.unique(np.stack([order_ids, product_ids], axis=1), axis=0)
+        _, order_index = np.unique(pairs[:, 0], return_inverse=True)
+        return sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (order_index.ravel(), pairs[:, 1])),
+            shape=(int(order_index.max()) + 1, int(pairs[:, 1].max()) + 1),
+        )
+
+    @staticmethod
+    def _top(product_id, related, frequency, size):
+        """Best `size` rows for one product from {related id: count} and {product id: orders containing it}"""
+        related = {related_id: count for related_id, count in related.items() if related_id != product_id}
+        if not related or frequency.get(product_id, 0) <= 0:
+            return []
+        related_ids = np.fromiter(related.keys(), dtype=np.int64, count=len(related))
+        counts = np.fromiter(related.values(), dtype=np.int64, count=len(related))
+        related_frequency = np.fromiter(
+            (frequency.get(related_id, 0) for related_id in related), dtype=np.int64, count=len(related))
+        scores = counts / np.sqrt(frequency[product_id] * np.maximum(related_frequency, 1))
+        if len(scores) > size:
+            best = np.argpartition(-scores, size - 1)[:size]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.lexsort((related_ids[best], -scores[best]))]
+        return [
+            BoughtTogether(product_id=product_id, related_id=int(related_ids[i]),
+                           count=int(counts[i]), score=float(scores[i]))
+            for i in best
+        ]
+
+    def build(self):
+        """Recount every delivered order and rewrite both tables. Returns the number of `BoughtTogether` rows written."""
+        rows = OrderItem.objects.filter(order__status='DELIVERED').values_list('order_id', 'product_id')
+        order_ids, product_ids = [], []
+        for order_id, product_id in rows.iterator(chunk_size=10000):
+            order_ids.append(order_id)
+            product_ids.append(product_id)
+
+        related = defaultdict(dict)
+        if product_ids:
+            basket = self._incidence(np.asarray(order_ids, dtype=np.int64), np.asarray(product_ids, dtype=np.int64))
+            counts = (basket.T @ basket).tocoo()
+            for product_id, related_id, count in zip(counts.row.tolist(), counts.col.tolist(), counts.data.tolist()):
+                related[product_id][related_id] = count
+        frequency = {product_id: pairs[product_id] for product_id, pairs in related.items()}
+
+        size = settings.BOUGHT_TOGETHER_SIZE
+        top = [row for product_id, pairs in related.items() for row in self._top(product_id, pairs, frequency, size)]
+        with transaction.atomic():
+            BoughtTogetherCount.objects.all().delete()
+            BoughtTogetherCount.objects.bulk_create(
+                (BoughtTogetherCount(product_id=product_id, related_id=related_id, count=count)
+                 for product_id, pairs in related.items() for related_id, count in pairs.items()),
+                batch_size=2000,
+            )
+            BoughtTogether.objects.all().delete()
+            BoughtTogether.objects.bulk_create(top, batch_size=2000)
+        return len(top)
+
+    def _write(self, product_ids):
+        """Rewrite the top-K rows of `product_ids` from the stored counts"""
+        related = defaultdict(dict)
+        pairs = BoughtTogetherCount.objects.filter(product_id__in=product_ids, count__gt=0)
+        for product_id, related_id, count in pairs.values_list('product_id', 'related_id', 'count'):
+            related[product_id][related_id] = count
+        related_ids = {related_id for pairs in related.values() for related_id in pairs}
+        frequency = dict(BoughtTogetherCount.objects.filter(
+            product_id__in=related_ids, related_id=F('product_id')).values_list('product_id', 'count'))
+
+        size = settings.BOUGHT_TOGETHER_SIZE
+        rows = [row for product_id in product_ids for row in self._top(product_id, related[product_id], frequency, size)]
+        BoughtTogether.objects.filter(product_id__in=product_ids).delete()
+        BoughtTogether.objects.bulk_create(rows, batch_size=2000)
+
+    def _apply_order(self, order_id, sign):
+        product_ids = sorted(set(OrderItem.objects.filter(order_id=order_id).values_list('product_id', flat=True)))
+        if not product_ids:
+            return
+        with transaction.atomic():
+            pairs = BoughtTogetherCount.objects.filter(product_id__in=product_ids, related_id__in=product_ids)
+            if sign > 0:
+                BoughtTogetherCount.objects.bulk_create(
+                    [BoughtTogetherCount(product_id=product_id, related_id=related_id)
+                     for product_id in product_ids for related_id in product_ids],
+                    ignore_conflicts=True,
+                )
+            else:
+                pairs = pairs.filter(count__gt=0)
+            # Lock in a fixed order, so two overlapping baskets wait for each other instead of deadlocking
+            locked = list(pairs.select_for_update().order_by('pk').values_list('pk', flat=True))
+            BoughtTogetherCount.objects.filter(pk__in=locked).update(count=F('count') + sign)
+            self._write(product_ids)
+
+    def order_delivered(self, order_id):
+        self._apply_order(order_id, 1)
+
+    def order_undelivered(self, order_id):
+        """An order moved away from DELIVERED (e.g. returned); take its basket back out"""
+        self._apply_order(order_id, -1)
+
+
+bought_together = BoughtTogetherIndex()
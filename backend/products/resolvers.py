@@ -0,0 +1,94 @@
+import threading
+
+from django.utils.text import slugify
+
+from .models import Category, category_slug
+
+
+class CategorySlugResolver:
+    """
+    Maps `?category=` slugs to category ids without hitting the database.
+
+    Besides the stored `Category.slug`, the plain `slugify(name)` form
+    ("fruits-vegetables") is registered as an alias since some frontend
+    links drop the "and". Incoming values are normalized the same ways, so
+    a link built from the raw name ("atta,-rice-dal") still resolves. The
+    map is built once and refreshed by the `products.signals` handlers; an
+    unknown slug costs a single lookup on the unique `slug` index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._slugs = {}       # slug or alias -> category id
+        self._by_id = {}       # category id -> keys registered for it
+
+    @staticmethod
+    def _keys_for(slug, name):
+        return {key for key in (slug, slugify(name)) if key}
+
+    def _register(self, pk, slug, name):
+        keys = self._keys_for(slug, name)
+        self._by_id[pk] = keys
+        for key in keys:
+            self._slugs.setdefault(key, pk)
+        # The canonical slug always wins over another category's alias
+        if slug:
+            self._slugs[slug] = pk
+
+    def _unregister(self, pk):
+        for key in self._by_id.pop(pk, ()):
+            if self._slugs.get(key) == pk:
+                del self._slugs[key]
+
+    def build(self):
+        with self._lock:
+            self._slugs = {}
+            self._by_id = {}
+            for pk, slug, name in Category.objects.values_list('id', 'slug', 'name'):
+                self._register(pk, slug, name)
+            self._built = True
+
+    def update(self, category):
+        if not self._built:
+            return
+        with self._lock:
+            self._unregister(category.pk)
+            self._register(category.pk, category.slug, category.name)
+
+    def remove(self, pk):
+        if not self._built:
+            return
+        with self._lock:
+            self._unregister(pk)
+
+    @staticmethod
+    def _candidates(value):
+        """The value as given, then as the alias and canonical slug forms"""
+        value = (value or '').strip().lower()
+        candidates = []
+        for candidate in (value, slugify(value), category_slug(value)):
+            if candidate and candidate not in candidates:
+                candidates.append(candidate)
+        return candidates
+
+    def resolve(self, slug):
+        """Return the category id for `slug`, or None if no category matches"""
+        if not self._built:
+            self.build()
+        candidates = self._candidates(slug)
+        if not candidates:
+            return None
+        for candidate in candidates:
+            pk = self._slugs.get(candidate)
+            if pk is not None:
+                return pk
+        pk = Category.objects.filter(slug__in=candidates).values_list('id', flat=True).first()
+        if pk is not None:
+            with self._lock:
+                self._slugs[candidates[0]] = pk
+                self._by_id.setdefault(pk, set()).add(candidates[0])
+        return pk
+
+
+category_slugs = CategorySlugResolver()
@@ -0,0 +1,239 @@
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from .models import Category, Product
+
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Field weights used when folding name/category/description into one
+# weighted term frequency (a simplified BM25F)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'description': 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Upper bound on how many vocabulary terms a single prefix may expand to
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split text into alphanumeric tokens"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text))
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    return TOKEN_RE.findall(text)
+
+
+class ProductSearchIndex:
+    """
+    In-process inverted index over active products with BM25 ranking.
+
+    The index is built lazily from the database on first use and then kept
+    in sync by the `Product`/`Category` signal handlers in `products.signals`,
+    so a query only touches the postings of its own terms instead of
+    scanning the product table.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)   # term -> {product_id: weighted tf}
+        self._doc_terms = {}                 # product_id -> set of terms
+        self._doc_lengths = {}               # product_id -> weighted length
+        self._doc_categories = {}            # product_id -> category_id
+        self._category_names = {}            # category_id -> name
+        self._total_length = 0.0
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+
+    # Building
+
+    def build(self):
+        """(Re)build the whole index from the database"""
+        with self._lock:
+            self._reset()
+            self._category_names = dict(Category.objects.values_list('id', 'name'))
+            products = Product.objects.filter(is_active=True).values_list(
+                'id', 'name', 'description', 'category_id')
+            for product_id, name, description, category_id in products.iterator(chunk_size=2000):
+                self._add(product_id, name, description, category_id)
+            self._built = True
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on the next query"""
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    # Incremental maintenance
+
+    def _add(self, product_id, name, description, category_id):
+        weights = defaultdict(float)
+        fields = (
+            ('name', name),
+            ('category', self._category_names.get(category_id, '')),
+            ('description', description),
+        )
+        for field, text in fields:
+            for token in tokenize(text):
+                weights[token] += FIELD_WEIGHTS[field]
+
+        for term, weight in weights.items():
+            postings = self._postings[term]
+            if not postings:
+                self._vocabulary_dirty = True
+            postings[product_id] = weight
+
+        length = sum(weights.values())
+        self._doc_terms[product_id] = set(weights)
+        self._doc_lengths[product_id] = length
+        self._doc_categories[product_id] = category_id
+        self._total_length += length
+
+    def _remove(self, product_id):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+        self._doc_categories.pop(product_id, None)
+
+    def update_product(self, product):
+        if not self._built:
+            return
+        with self._lock:
+            if product.category_id not in self._category_names:
+                self._category_names[product.category_id] = (
+                    Category.objects.filter(pk=product.category_id)
+                    .values_list('name', flat=True).first() or ''
+                )
+            self._remove(product.pk)
+            # A deactivated product drops out of search results
+            if product.is_active:
+                self._add(product.pk, product.name, product.description, product.category_id)
+
+    def remove_product(self, product_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(product_id)
+
+    def update_category(self, category):
+        """Re-index the products of a category whose name may have changed"""
+        if not self._built:
+            return
+        with self._lock:
+            if self._category_names.get(category.pk) == category.name:
+                return
+            self._category_names[category.pk] = category.name
+            products = Product.objects.filter(category_id=category.pk, is_active=True).values_list(
+                'id', 'name', 'description', 'category_id')
+            for product_id, name, description, category_id in products:
+                self._remove(product_id)
+                self._add(product_id, name, description, category_id)
+
+    def remove_category(self, category_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._category_names.pop(category_id, None)
+
+    # Querying
+
+    def _expand_prefix(self, prefix):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        vocabulary = self._vocabulary
+        terms = []
+        index = bisect_left(vocabulary, prefix)
+        while index < len(vocabulary) and vocabulary[index].startswith(prefix):
+            terms.append(vocabulary[index])
+            if len(terms) >= MAX_PREFIX_EXPANSIONS:
+                break
+            index += 1
+        return terms
+
+    def _term_scores(self, term, doc_count, avg_length):
+        postings = self._postings.get(term)
+        if not postings:
+            return {}
+        df = len(postings)
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        scores = {}
+        for product_id, tf in postings.items():
+            norm = 1 - BM25_B + BM25_B * self._doc_lengths[product_id] / avg_length
+            scores[product_id] = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return scores
+
+    def search(self, query, prefix=True):
+        """
+        Return product ids matching every token of `query`, best first.
+
+        When `prefix` is set the last token also matches any indexed term
+        starting with it, so partially typed words still find results.
+        """
+        self.ensure_built()
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = (self._total_length / doc_count) or 1.0
+
+            totals = None
+            for position, token in enumerate(tokens):
+                is_last = position == len(tokens) - 1
+                terms = self._expand_prefix(token) if prefix and is_last else [token]
+
+                # Each query token contributes its best matching expansion
+                token_scores = {}
+                for term in terms:
+                    for product_id, score in self._term_scores(term, doc_count, avg_length).items():
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+
+                if totals is None:
+                    totals = token_scores
+                else:
+                    totals = {
+                        product_id: score + token_scores[product_id]
+                        for product_id, score in totals.items()
+                        if product_id in token_scores
+                    }
+                if not totals:
+                    return []
+
+        return sorted(totals, key=lambda product_id: (-totals[product_id], product_id))
+
+
+search_index = ProductSearchIndex()
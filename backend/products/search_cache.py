@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import get_catalog_version
+from .deals import deal_scheduler
+from .models import Product, SearchQuery
+from .search import search_index
+from .serializers import ProductSerializer
+from .trigram import trigram_index
+
+
+logger = logging.getLogger('django')
+
+# Page pre-warmed for popular queries: what the search box asks for first
+PREWARM_PAGE = (1, 10)
+
+_timer_lock = threading.Lock()
+_prewarm_timer = None
+
+
+def normalize_query(query):
+    """Case-folded with whitespace collapsed, so "Milk " and "milk" share a cache entry"""
+    return ' '.join(query.casefold().split())
+
+
+def search_page(query, page, page_size, fields=None):
+    """Run a search and serialize one page. Returns (data, extra_context)."""
+    # Ranked ids come from the in-memory index, only the page is loaded
+    ranked_ids = search_index.search(query)
+    # Too few exact hits: the query is probably misspelled, append close spellings
+    fuzzy = len(ranked_ids) < settings.SEARCH_FUZZY_MIN_RESULTS
+    if fuzzy:
+        exact = set(ranked_ids)
+        ranked_ids = ranked_ids + [
+            product_id for product_id in trigram_index.search(query) if product_id not in exact]
+    page_ids = ranked_ids[(page - 1) * page_size:page * page_size]
+    products_by_id = ProductSerializer.setup_eager_loading(
+        Product.objects.all(), fields=fields).in_bulk(page_ids)
+    products = [products_by_id[pk] for pk in page_ids if pk in products_by_id]
+
+    data = ProductSerializer(products, many=True, fields=fields).data
+    return data, {
+        'page': page,
+        'page_size': page_size,
+        'total': len(ranked_ids),
+        'has_next': page * page_size < len(ranked_ids),
+        'fuzzy': fuzzy,
+    }
+
+
+class SearchResultCache:
+    """
+    Bounded LRU of serialized search pages, with a TTL per entry.
+
+    Keys carry the catalog version and the running deal set, so a catalog
+    change or a deal boundary makes every older entry unreachable; those
+    simply age out of the LRU.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires at, payload)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query, page, page_size, fields=None):
+        version = f'{get_catalog_version()}-{deal_scheduler.active_key()}'
+        return (version, normalize_query(query), page, page_size, tuple(fields) if fields is not None else None)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, payload):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + settings.SEARCH_CACHE_TTL, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.SEARCH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SearchLog:
+    """
+    Counts searches in memory; `flush()` adds them to the `SearchQuery`
+    table with in-place increments, so flushes from several processes add
+    up, and keeps only the SEARCH_LOG_MAX_QUERIES most frequent queries
+    (search-as-you-type logs every prefix).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, query):
+        query = normalize_query(query)[:SearchQuery._meta.get_field('query').max_length]
+        with self._lock:
+            self._counts[query] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counts = Counter()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        now = timezone.now()
+        # One UPDATE per distinct increment; most queries were searched once since the last flush
+        by_increment = defaultdict(list)
+        for query, count in counts.items():
+            by_increment[count].append(query)
+        with transaction.atomic():
+            SearchQuery.objects.bulk_create(
+                [SearchQuery(query=query, last_searched_at=now) for query in counts], ignore_conflicts=True)
+            for increment, queries in by_increment.items():
+                SearchQuery.objects.filter(query__in=queries).update(
+                    count=F('count') + increment, last_searched_at=now)
+        self.prune()
+        return len(counts)
+
+    def prune(self):
+        """Delete the queries ranked below SEARCH_LOG_MAX_QUERIES. Returns how many were deleted."""
+        ranked = SearchQuery.objects.order_by('-count', '-last_searched_at', '-pk')
+        cutoff = ranked.values_list('count', 'last_searched_at', 'pk')[settings.SEARCH_LOG_MAX_QUERIES:][:1]
+        if not cutoff:
+            return 0
+        # The first row past the limit and everything ranked after it
+        count, last_searched_at, pk = cutoff[0]
+        deleted, _ = SearchQuery.objects.filter(
+            Q(count__lt=count)
+            | Q(count=count, last_searched_at__lt=last_searched_at)
+            | Q(count=count, last_searched_at=last_searched_at, pk__lte=pk)
+        ).delete()
+        return deleted
+
+
+search_cache = SearchResultCache()
+search_log = SearchLog()
+
+
+def prewarm():
+    """
+    Flush the search log, then search and cache the first page of the most
+    frequent queries that are not cached for the current catalog yet.
+    Returns how many pages were computed.
+    """
+    search_log.flush()
+    page, page_size = PREWARM_PAGE
+    popular = SearchQuery.objects.order_by('-count').values_list('query', flat=True)[
+        :settings.SEARCH_PREWARM_QUERIES]
+    warmed = 0
+    for query in popular:
+        key = search_cache.make_key(query, page, page_size)
+        if key not in search_cache:
+            search_cache.set(key, search_page(query, page, page_size))
+            warmed += 1
+    return warmed
+
+
+def _prewarm_in_background():
+    global _prewarm_timer
+    with _timer_lock:
+        _prewarm_timer = None
+    try:
+        warmed = prewarm()
+        if warmed:
+            logger.info("Pre-warmed %d popular search queries", warmed)
+    except Exception:
+        logger.exception("Search cache pre-warm failed")
+    finally:
+        # The timer thread owns its own connection; do not leak it
+        connection.close()
+
+
+def schedule_prewarm():
+    """
+    Make sure a pre-warm run is pending. Called on every search, so a busy
+    process re-warms every SEARCH_PREWARM_INTERVAL seconds and an idle one
+    does nothing. Set the interval to None to disable pre-warming.
+    """
+    global _prewarm_timer
+    interval = settings.SEARCH_PREWARM_INTERVAL
+    if interval is None:
+        return
+    with _timer_lock:
+        if _prewarm_timer is not None:
+            return
+        _prewarm_timer = threading.Timer(interval, _prewarm_in_background)
+        _prewarm_timer.daemon = True
+        _prewarm_timer.start()
@@ -1,29 +1,166 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from core.serializers import EagerLoadingMixin
+from .images import get_srcset
 from .models import Product, Category, ProductImage, DealOfTheDay
+from .pricing import price_resolver
+
+# Renders computed prices exactly like the model's `price` column
+price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    thumbnail_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'description', 'thumbnail', 'thumbnail_srcset']
+        read_only_fields = ['slug']
+
+    def get_thumbnail_srcset(self, obj):
+        return get_srcset(obj.thumbnail.name)
+
+class CategoryTreeSerializer(serializers.ModelSerializer):
+    """Sidebar entry: a category with the precomputed stats of its active products"""
+    product_count = serializers.SerializerMethodField()
+    min_price = serializers.SerializerMethodField()
+    max_price = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
-class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'thumbnail']
+        fields = ['id', 'name', 'slug', 'product_count', 'min_price', 'max_price', 'thumbnail', 'thumbnail_srcset']
+
+    @staticmethod
+    def _stats(obj):
+        # No stats row yet (category created after the last refresh) means no active products
+        return getattr(obj, 'stats', None)
+
+    def get_product_count(self, obj):
+        stats = self._stats(obj)
+        return stats.product_count if stats else 0
+
+    def get_min_price(self, obj):
+        stats = self._stats(obj)
+        return price_field.to_representation(stats.min_price) if stats and stats.min_price is not None else None
+
+    def get_max_price(self, obj):
+        stats = self._stats(obj)
+        return price_field.to_representation(stats.max_price) if stats and stats.max_price is not None else None
+
+    def _thumbnail_name(self, obj):
+        """The category's own thumbnail, else the one of a recently updated product in it"""
+        if obj.thumbnail:
+            return obj.thumbnail.name
+        stats = self._stats(obj)
+        return stats.thumbnail if stats else ''
+
+    def get_thumbnail(self, obj):
+        name = self._thumbnail_name(obj)
+        return default_storage.url(name) if name else None
+
+    def get_thumbnail_srcset(self, obj):
+        return get_srcset(self._thumbnail_name(obj))
+
+class ProductImageSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
 
-class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text']
+        fields = ['id', 'image', 'srcset', 'alt_text']
+
+    def get_srcset(self, obj):
+        return get_srcset(obj.image.name)
+
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    Pass `fields=[...]` to serialize only some columns (sparse fieldsets).
+    `VIEWS` holds named presets such as the compact `card` representation.
+    """
+    prefetch_related = ('images',)
+
+    VIEWS = {
+        'card': ['id', 'name', 'price', 'effective_price', 'deal_id', 'thumbnail', 'thumbnail_srcset'],
+    }
+
+    # Model columns each serialized field reads, used to narrow the SELECT
+    FIELD_COLUMNS = {
+        'effective_price': ['price'],
+        # A deal only applies below the product's own price
+        'deal_id': ['price'],
+        'thumbnail_srcset': ['thumbnail'],
+        'images': [],
+    }
 
-class ProductSerializer(serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
     thumbnail = serializers.ImageField(required=False, allow_null=True)
+    thumbnail_srcset = serializers.SerializerMethodField()
     images = ProductImageSerializer(many=True, read_only=True)
+    effective_price = serializers.SerializerMethodField()
+    deal_id = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'category', 'thumbnail', 'images', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'price', 'effective_price', 'deal_id', 'category',
+                  'thumbnail', 'thumbnail_srcset', 'images', 'created_at', 'updated_at']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """
+        Read `?view=` / `?fields=` from the request. Returns (fields, errors);
+        fields is None when the full representation is wanted.
+        """
+        view = request.query_params.get('view')
+        fields_param = request.query_params.get('fields')
+        if view:
+            if view not in cls.VIEWS:
+                return None, {'view': [f"Must be one of: {', '.join(cls.VIEWS)}"]}
+            return list(cls.VIEWS[view]), {}
+        if fields_param:
+            fields = [name.strip() for name in fields_param.split(',') if name.strip()]
+            unknown = [name for name in fields if name not in cls.Meta.fields]
+            if unknown:
+                return None, {'fields': [f"Unknown fields: {', '.join(unknown)}"]}
+            return fields, {}
+        return None, {}
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Like EagerLoadingMixin, but only loads the columns and relations `fields` needs"""
+        if fields is None:
+            return super().setup_eager_loading(queryset)
+        columns = {'id'}
+        for name in fields:
+            columns.update(cls.FIELD_COLUMNS.get(name, [name]))
+        queryset = queryset.only(*columns)
+        if 'images' in fields:
+            queryset = queryset.prefetch_related('images')
+        return queryset
+
+    def _get_price(self, obj):
+        return price_resolver.price_for(obj.pk, obj.price)
+
+    def get_effective_price(self, obj):
+        return price_field.to_representation(self._get_price(obj).effective_price)
+
+    def get_deal_id(self, obj):
+        return self._get_price(obj).deal_id
+
+    def get_thumbnail_srcset(self, obj):
+        return get_srcset(obj.thumbnail.name)
+
+
+class DealOfTheDaySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related = ('product',)
 
-class DealOfTheDaySerializer(serializers.ModelSerializer):
     product = ProductSerializer()
-    
+
     class Meta:
         model = DealOfTheDay
         fields = [
@@ -32,6 +169,7 @@ class DealOfTheDaySerializer(serializers.ModelSerializer):
             'deal_price', 
             'start_date',
             'end_date',
+            'quantity_limit',
             'is_active'
         ]
 
@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import category_stats
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductImage, DealOfTheDay
+from .deals import deal_scheduler
+from .facets import facet_index
+from .flash_sale import flash_sales
+from .images import schedule_variants
+from .resolvers import category_slugs
+from .search import search_index
+from .snapshot import schedule_snapshot_rebuild
+from .suggest import suggest_index
+from .trigram import trigram_index
+
+
+def refresh_category_stats(category_ids):
+    category_stats.refresh_categories(category_ids)
+    # The save already bumped the version, but a response cached before this refresh would show old stats
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    search_index.update_product(instance)
+    trigram_index.update_product(instance)
+    suggest_index.update('product', instance)
+    facet_index.update_product(instance)
+    # A product moved to another category changes the stats of both
+    category_ids = {instance.category_id, getattr(instance, '_loaded_category_id', None)}
+    instance._loaded_category_id = instance.category_id
+    transaction.on_commit(lambda: refresh_category_stats(category_ids))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    search_index.remove_product(instance.pk)
+    trigram_index.remove_product(instance.pk)
+    suggest_index.remove('product', instance.pk)
+    facet_index.remove_product(instance.pk)
+    # After commit: when the whole category was deleted there is nothing left to refresh
+    category_id = instance.category_id
+    transaction.on_commit(lambda: refresh_category_stats({category_id}))
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    search_index.update_category(instance)
+    trigram_index.update_category(instance)
+    suggest_index.update('category', instance)
+    category_slugs.update(instance)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    search_index.remove_category(instance.pk)
+    trigram_index.remove_category(instance.pk)
+    suggest_index.remove('category', instance.pk)
+    category_slugs.remove(instance.pk)
+
+
+# Model -> its uploaded image field
+IMAGE_FIELDS = {
+    Product: 'thumbnail',
+    Category: 'thumbnail',
+    ProductImage: 'image',
+}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ProductImage)
+def image_saved(sender, instance, **kwargs):
+    name = getattr(instance, IMAGE_FIELDS[sender]).name
+    if name:
+        transaction.on_commit(lambda: schedule_variants(name))
+
+
+@receiver(post_save, sender=DealOfTheDay)
+@receiver(post_delete, sender=DealOfTheDay)
+def deal_changed(sender, instance, **kwargs):
+    # After commit: a read in between would reload the old rows and keep them until the next edit
+    transaction.on_commit(deal_scheduler.invalidate)
+    transaction.on_commit(flash_sales.invalidate)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=DealOfTheDay)
+@receiver(post_delete, sender=DealOfTheDay)
+@receiver(m2m_changed, sender=Product.images.through)
+def catalog_changed(sender, **kwargs):
+    # After commit, so a request running meanwhile cannot cache uncommitted rows under the new version
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(schedule_snapshot_rebuild)
+
+
+def catalog_bulk_changed():
+    """
+    Call after writes that bypass model signals (bulk_create, queryset
+    update): drops the in-memory indexes so they are rebuilt on next use and
+    bumps the catalog version once for the whole batch.
+    """
+    search_index.invalidate()
+    trigram_index.invalidate()
+    suggest_index.invalidate()
+    facet_index.invalidate()
+    category_slugs.build()
+    category_stats.rebuild_all()
+    catalog_changed(sender=None)
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Product
+from .search import FIELD_WEIGHTS, tokenize
+
+
+logger = logging.getLogger('django')
+
+CURRENT_NAME = 'CURRENT'
+ARRAYS = ('data', 'indices', 'indptr', 'product_ids')
+
+# Builds kept on disk; workers may still have the previous one mapped
+KEEP_BUILDS = 2
+
+
+def get_index_dir():
+    return Path(settings.SIMILARITY_INDEX_DIR)
+
+
+def _documents():
+    products = Product.objects.order_by('id').values_list('id', 'name', 'description', 'category__name')
+    for product_id, name, description, category in products.iterator(chunk_size=2000):
+        terms = Counter()
+        for field, text in (('name', name), ('category', category), ('description', description)):
+            for token in tokenize(text):
+                terms[token] += FIELD_WEIGHTS[field]
+        yield product_id, terms
+
+
+def build_matrix():
+    """
+    L2-normalised TF-IDF rows, one per product (ordered by id), with
+    sublinear term frequencies weighted like the search index fields.
+    Returns (csr matrix, product ids).
+    """
+    vocabulary = {}
+    product_ids, indptr, indices, frequencies = [], [0], [], []
+    for product_id, terms in _documents():
+        product_ids.append(product_id)
+        for term, frequency in terms.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            frequencies.append(frequency)
+        indptr.append(len(indices))
+
+    indices = np.asarray(indices, dtype=np.int32)
+    data = 1.0 + np.log(np.asarray(frequencies, dtype=np.float32))
+    document_frequency = np.bincount(indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(product_ids)) / (1 + document_frequency)) + 1.0
+    data = (data * idf[indices]).astype(np.float32)
+
+    matrix = sparse.csr_matrix(
+        (data, indices, np.asarray(indptr, dtype=np.int32)),
+        shape=(len(product_ids), len(vocabulary)),
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.diags(1.0 / norms).dot(matrix).tocsr().astype(np.float32)
+    return matrix, np.asarray(product_ids, dtype=np.int64)
+
+
+def build_index():
+    """
+    Write a new build as .npy files under its own directory, then point
+    CURRENT at it. Returns the build's metadata.
+    """
+    started = time.perf_counter()
+    matrix, product_ids = build_matrix()
+    directory = get_index_dir()
+    build_name = f'build-{time.time_ns()}'
+    build_dir = directory / build_name
+    build_dir.mkdir(parents=True)
+    # scipy wants one dtype for indices and indptr; a mismatch would copy the mapped arrays
+    index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+    arrays = {
+        'data': matrix.data, 'indices': matrix.indices.astype(index_dtype),
+        'indptr': matrix.indptr.astype(index_dtype), 'product_ids': product_ids,
+    }
+    for name, array in arrays.items():
+        np.save(build_dir / f'{name}.npy', array)
+    meta = {
+        'build': build_name,
+        'shape': list(matrix.shape),
+        'built_at': timezone.now().isoformat(),
+    }
+    (build_dir / 'meta.json').write_text(json.dumps(meta))
+
+    # Swap the pointer atomically, then drop builds nobody should still be reading
+    tmp_pointer = directory / f'.{CURRENT_NAME}.{build_name}'
+    tmp_pointer.write_text(build_name)
+    os.replace(tmp_pointer, directory / CURRENT_NAME)
+    builds = sorted(path for path in directory.glob('build-*') if path.is_dir())
+    for old in builds[:-KEEP_BUILDS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    logger.info(
+        "Built similarity index %s (%d products x %d terms) in %.2fs",
+        build_name, matrix.shape[0], matrix.shape[1], time.perf_counter() - started,
+    )
+    return meta
+
+
+class SimilarityIndex:
+    """
+    Read side of the TF-IDF index. The arrays are memory-mapped on first
+    use, so every worker shares the same pages from the OS cache, and are
+    remapped when CURRENT points at a newer build. Until the first build
+    exists every lookup returns no results.
+    """
+
+    # How often (seconds) a worker checks CURRENT for a newer build
+    RELOAD_CHECK_INTERVAL = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build = None
+        self._matrix = None
+        self._product_ids = None     # sorted, row i is product_ids[i]
+        self._meta = None
+        self._checked_at = None
+
+    def _current_build(self):
+        try:
+            return (get_index_dir() / CURRENT_NAME).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self, build_name):
+        build_dir = get_index_dir() / build_name
+        arrays = {name: np.load(build_dir / f'{name}.npy', mmap_mode='r') for name in ARRAYS}
+        meta = json.loads((build_dir / 'meta.json').read_text())
+        self._matrix = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(meta['shape']), copy=False)
+        self._product_ids = arrays['product_ids']
+        self._meta = meta
+        self._build = build_name
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.RELOAD_CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            build_name = self._current_build()
+            if build_name is None:
+                # Never built on a request thread; build_similarity_index writes the first build
+                logger.warning("No similarity index under %s, run build_similarity_index", get_index_dir())
+            elif build_name != self._build:
+                self._load(build_name)
+
+    def similar(self, product_id, limit=10):
+        """[(product id, cosine similarity), ...] best first, excluding the product itself"""
+        self._ensure_loaded()
+        if self._build is None:
+            return []
+        row = int(np.searchsorted(self._product_ids, product_id))
+        if row >= len(self._product_ids) or self._product_ids[row] != product_id:
+            return []
+        matrix = self._matrix
+        # One sparse matrix-vector product scores every product
+        scores = (matrix @ matrix[row].T).tocoo()
+        candidates = scores.row[scores.row != row]
+        values = scores.data[scores.row != row]
+        if not len(values):
+            return []
+        size = min(limit, len(values))
+        best = np.argpartition(-values, size - 1)[:size]
+        best = best[np.argsort(-values[best], kind='stable')]
+        return [(int(self._product_ids[candidates[i]]), float(values[i])) for i in best if values[i] > 0]
+
+    @property
+    def built_at(self):
+        return self._meta['built_at'] if self._meta else None
+
+    def invalidate(self):
+        with self._lock:
+            self._build = None
+            self._matrix = None
+            self._product_ids = None
+            self._meta = None
+            self._checked_at = None
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,270 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+from core.success_codes import SuccessCodes as SC
+from .cache import get_catalog_version
+from .deals import deal_scheduler
+from .models import Category, Product, DealOfTheDay
+from .serializers import CategorySerializer, ProductSerializer, DealOfTheDaySerializer
+
+
+logger = logging.getLogger('django')
+
+MANIFEST_NAME = 'catalog.manifest.json'
+
+# Builds kept on disk; a request may still be reading the previous one
+KEEP_BUILDS = 2
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+
+def negotiate_encoding(accept_encoding, available):
+    """
+    The first of ENCODINGS that is in `available` and that the
+    Accept-Encoding header allows with a non-zero q ("gzip;q=0" refuses
+    gzip, "*" covers codings not listed), else 'identity'.
+    """
+    qualities = {}
+    for part in (accept_encoding or '').split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for name, _ in ENCODINGS:
+        if name in available and qualities.get(name, qualities.get('*', 0.0)) > 0:
+            return name
+    return 'identity'
+
+
+_build_lock = threading.RLock()
+_timer_lock = threading.Lock()
+_rebuild_timer = None
+_rebuild_thread = None
+# (build of the manifest found stale, monotonic time it was first found stale)
+_stale_since = (None, 0.0)
+
+
+def get_snapshot_dir():
+    return Path(settings.CATALOG_SNAPSHOT_DIR)
+
+
+def snapshot_name(build):
+    return f'catalog-{build}.json'
+
+
+def _write_atomic(path, content):
+    """Write to a temp file in the same directory and rename it over `path`"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def serialize_catalog():
+    categories = Category.objects.filter(is_active=True).order_by('id')
+    products = ProductSerializer.setup_eager_loading(
+        Product.objects.filter(is_active=True, category__is_active=True)
+    ).order_by('id')
+    deals = DealOfTheDaySerializer.setup_eager_loading(
+        DealOfTheDay.objects.filter(id__in=[deal.id for deal in deal_scheduler.active_deals()])
+    )
+    return {
+        'categories': CategorySerializer(categories, many=True).data,
+        'products': ProductSerializer(products, many=True).data,
+        'deals': DealOfTheDaySerializer(deals, many=True).data,
+    }
+
+
+def build_snapshot():
+    """
+    Serialize the active catalog into one response body and store it
+    uncompressed, gzipped and (when available) brotli-compressed, under
+    file names of their own. The manifest naming them is written last, so
+    a reader always pairs a manifest with the body it describes. Returns
+    the manifest describing the new snapshot.
+    """
+    with _build_lock:
+        started = time.perf_counter()
+        version = get_catalog_version()
+        deals_key = deal_scheduler.active_key()
+        generated_at = timezone.now()
+        body = JSONRenderer().render({
+            'success': True,
+            'message': "",
+            'code': SC.REQ_DATA_RETRIEVED.value,
+            'data': {
+                'version': version,
+                'generated_at': generated_at.isoformat(),
+                **serialize_catalog(),
+            },
+        })
+
+        directory = get_snapshot_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        build = time.time_ns()
+        name = snapshot_name(build)
+        files = {'identity': name}
+        _write_atomic(directory / name, body)
+        _write_atomic(directory / f'{name}.gz', gzip.compress(body, compresslevel=9, mtime=0))
+        files['gzip'] = f'{name}.gz'
+        if brotli is not None:
+            _write_atomic(directory / f'{name}.br', brotli.compress(body))
+            files['br'] = f'{name}.br'
+
+        manifest = {
+            'version': version,
+            'deals_key': deals_key,
+            'build': build,
+            'etag': f'"snapshot-{build}"',
+            'generated_at': int(generated_at.timestamp()),
+            'files': files,
+            'size': len(body),
+        }
+        _write_atomic(directory / MANIFEST_NAME, json.dumps(manifest).encode('utf-8'))
+        _remove_old_builds(directory, build)
+        logger.info(
+            "Built catalog snapshot v%s (%d bytes) in %.2fs",
+            version, len(body), time.perf_counter() - started,
+        )
+        return manifest
+
+
+def _remove_old_builds(directory, current):
+    builds = set()
+    for path in directory.glob('catalog-*.json*'):
+        build = path.name[len('catalog-'):].split('.', 1)[0]
+        if build.isdigit():
+            builds.add(int(build))
+    keep = sorted(builds | {current})[-KEEP_BUILDS:]
+    for build in builds.difference(keep):
+        for path in directory.glob(f'{snapshot_name(build)}*'):
+            path.unlink(missing_ok=True)
+
+
+def get_snapshot_manifest(build_missing=True):
+    """Return the current snapshot manifest, building the snapshot first if there is none"""
+    try:
+        with open(get_snapshot_dir() / MANIFEST_NAME, 'rb') as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        if not build_missing:
+            return None
+        return build_snapshot()
+
+
+def _is_stale(manifest):
+    # Versions are nanosecond timestamps: only a snapshot built under an older one misses changes
+    return (
+        manifest.get('version', 0) < get_catalog_version()
+        or manifest.get('deals_key') != deal_scheduler.active_key()
+    )
+
+
+def get_current_manifest():
+    """
+    The manifest of the snapshot to serve. A snapshot behind the current
+    catalog version or running deals is still served while a background
+    rebuild catches up; only when no newer build has landed within
+    CATALOG_SNAPSHOT_MAX_STALENESS seconds (a failed or very slow rebuild)
+    is it rebuilt on the calling thread. Builds inline only when there is
+    no snapshot at all.
+    """
+    global _stale_since
+    manifest = get_snapshot_manifest(build_missing=False)
+    if manifest is None:
+        with _build_lock:
+            return get_snapshot_manifest()
+    if not _is_stale(manifest):
+        return manifest
+
+    now = time.monotonic()
+    build, since = _stale_since
+    if build != manifest['build']:
+        _stale_since = (manifest['build'], now)
+        since = now
+    if now - since < settings.CATALOG_SNAPSHOT_MAX_STALENESS:
+        start_snapshot_rebuild()
+        return manifest
+    with _build_lock:
+        manifest = get_snapshot_manifest()
+        if _is_stale(manifest):
+            manifest = build_snapshot()
+    return manifest
+
+
+def _rebuild():
+    try:
+        build_snapshot()
+    except Exception:
+        logger.exception("Catalog snapshot rebuild failed")
+    finally:
+        # The background thread owns its own connection; do not leak it
+        connection.close()
+
+
+def _rebuild_in_background():
+    global _rebuild_timer
+    with _timer_lock:
+        _rebuild_timer = None
+    _rebuild()
+
+
+def start_snapshot_rebuild():
+    """Rebuild the snapshot in a background thread now, unless a rebuild is already running"""
+    global _rebuild_thread
+    with _timer_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return
+        _rebuild_thread = threading.Thread(target=_rebuild, daemon=True)
+        _rebuild_thread.start()
+
+
+def schedule_snapshot_rebuild():
+    """
+    Rebuild the snapshot in a background thread once the catalog has been
+    quiet for CATALOG_SNAPSHOT_REBUILD_DELAY seconds, so a burst of admin
+    edits costs one rebuild. Set the delay to None to disable the hook.
+    """
+    global _rebuild_timer
+    delay = settings.CATALOG_SNAPSHOT_REBUILD_DELAY
+    if delay is None:
+        return
+    with _timer_lock:
+        if _rebuild_timer is not None:
+            _rebuild_timer.cancel()
+        _rebuild_timer = threading.Timer(delay, _rebuild_in_background)
+        _rebuild_timer.daemon = True
+        _rebuild_timer.start()
@@ -0,0 +1,170 @@
+import threading
+
+from .models import Category, Product
+from .search import tokenize
+
+
+class _TrieNode:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()
+
+
+class SuggestIndex:
+    """
+    Prefix trie over product and category names for typeahead suggestions.
+
+    Every word of a name is inserted as a key, so "milk" suggests both
+    "Milk" and "Banana Milkshake". Each entry keeps the small payload the
+    navbar needs (id, name, thumbnail) so a lookup never touches the
+    database. Entries are added and removed one at a time from the
+    `products.signals` handlers instead of rebuilding the trie.
+    """
+
+    # How many candidates are collected before ranking and truncating
+    CANDIDATE_POOL = 50
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        self._root = _TrieNode()
+        self._entries = {}   # (type, id) -> payload
+        self._keys = {}      # (type, id) -> tokens of the name
+
+    def build(self):
+        with self._lock:
+            self._reset()
+            categories = Category.objects.filter(is_active=True).only('id', 'name', 'thumbnail')
+            for category in categories.iterator(chunk_size=2000):
+                self._add('category', category)
+            products = Product.objects.filter(is_active=True).only('id', 'name', 'thumbnail')
+            for product in products.iterator(chunk_size=2000):
+                self._add('product', product)
+            self._built = True
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    # Incremental maintenance
+
+    def _add(self, entry_type, obj):
+        key = (entry_type, obj.pk)
+        tokens = tokenize(obj.name)
+        self._entries[key] = {
+            'id': obj.pk,
+            'type': entry_type,
+            'name': obj.name,
+            'thumbnail': obj.thumbnail.url if obj.thumbnail else None,
+        }
+        self._keys[key] = tokens
+        for token in set(tokens):
+            node = self._root
+            for char in token:
+                node = node.children.setdefault(char, _TrieNode())
+            node.entries.add(key)
+
+    def _remove(self, entry_type, pk):
+        key = (entry_type, pk)
+        tokens = self._keys.pop(key, None)
+        self._entries.pop(key, None)
+        if tokens is None:
+            return
+        for token in set(tokens):
+            # Walk down remembering the path so empty branches can be pruned
+            path = [self._root]
+            for char in token:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                path[-1].entries.discard(key)
+                for depth in range(len(token), 0, -1):
+                    node = path[depth]
+                    if node.entries or node.children:
+                        break
+                    del path[depth - 1].children[token[depth - 1]]
+
+    def update(self, entry_type, obj):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(entry_type, obj.pk)
+            if obj.is_active:
+                self._add(entry_type, obj)
+
+    def remove(self, entry_type, pk):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(entry_type, pk)
+
+    # Querying
+
+    def _collect(self, node, limit, accept=None):
+        """Breadth-first walk so shorter completions surface first; only keys passing `accept` count"""
+        found = []
+        seen = set()
+        queue = [node]
+        while queue and len(found) < limit:
+            next_queue = []
+            for current in queue:
+                for key in current.entries:
+                    if key not in seen:
+                        seen.add(key)
+                        if accept is None or accept(key):
+                            found.append(key)
+                next_queue.extend(current.children.values())
+            queue = next_queue
+        return found
+
+    def suggest(self, query, limit=8):
+        self.ensure_built()
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        *leading, last = tokens
+
+        with self._lock:
+            node = self._root
+            for char in last:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+
+            # Earlier words must prefix some word of the name as well; checked during the
+            # walk so a crowded prefix cannot fill the pool with names that fail it
+            accept = (lambda key: all(
+                any(word.startswith(token) for word in self._keys[key]) for token in leading
+            )) if leading else None
+
+            candidates = self._collect(node, self.CANDIDATE_POOL, accept)
+
+            def rank(key):
+                words = self._keys[key]
+                entry = self._entries[key]
+                return (
+                    not (words and words[0].startswith(tokens[0])),
+                    entry['type'] != 'category',
+                    len(entry['name']),
+                    entry['name'],
+                )
+
+            candidates.sort(key=rank)
+            return [dict(self._entries[key]) for key in candidates[:limit]]
+
+
+suggest_index = SuggestIndex()
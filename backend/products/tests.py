@@ -1,3 +1,1159 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from .models import (
+    Category, CategoryStats, Product, ProductImage, DealOfTheDay, BoughtTogether, BoughtTogetherCount, ProductRanking,
+    SearchQuery,
+)
+from .cache import CATALOG_VERSION_KEY, get_cache_stats
+from .deals import deal_scheduler
+from .facets import facet_index
+from .flash_sale import flash_sales
+from . import images as image_variants
+from .images import generate_many, generate_variants, has_variants, schedule_variants, shutdown_executor, variant_name
+from .rankings import ranking_tracker
+from .recommendations import bought_together
+from .resolvers import category_slugs
+from .search import search_index
+from .search_cache import prewarm, search_cache, search_log
+from .similarity import build_index, get_index_dir, similarity_index
+from .suggest import suggest_index
+from .snapshot import build_snapshot, negotiate_encoding
+from .trigram import trigram_index
+
+
+@override_settings(SEARCH_PREWARM_INTERVAL=None)
+class QueryBudgetTestCase(TestCase):
+    """Catalog endpoints must run a fixed number of queries however many rows they return"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.clear()
+        search_index.invalidate()
+        facet_index.invalidate()
+        category_slugs.build()
+        # Load the running deals now so that load does not count against a budget
+        deal_scheduler.invalidate()
+        deal_scheduler.active_deals()
+        self.category = Category.objects.create(name='Fruits & Vegetables')
+
+    def create_products(self, count, images=2):
+        products = []
+        for i in range(count):
+            product = Product.objects.create(
+                name=f'Apple {i}', description='Fresh apple', price=10, category=self.category)
+            for j in range(images):
+                product.images.add(ProductImage.objects.create(
+                    image=f'products/apple-{i}-{j}.jpg', alt_text=f'Apple {i}'))
+            products.append(product)
+        return products
+
+    def assertBudget(self, budget, url, params=None):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_product_list_budget(self):
+        self.create_products(8)
+        facet_index.build()
+        url = reverse('products:product-list')
+        # products + images prefetch
+        self.assertBudget(2, url)
+        self.assertBudget(2, url, {'category': 'fruits-and-vegetables'})
+
+    def test_card_view_skips_images(self):
+        self.create_products(8)
+        facet_index.build()
+        # products only, narrowed to the card columns
+        response = self.assertBudget(1, reverse('products:product-list'), {'view': 'card'})
+        self.assertEqual(
+            set(response.json()['data'][0]),
+            {'id', 'name', 'price', 'effective_price', 'deal_id', 'thumbnail', 'thumbnail_srcset'},
+        )
+        response = self.assertBudget(1, reverse('products:product-list'), {'fields': 'id,name'})
+        self.assertEqual(set(response.json()['data'][0]), {'id', 'name'})
+        # Derived fields load the columns they read along with the page
+        for fields in ('id,deal_id', 'id,effective_price', 'id,thumbnail_srcset'):
+            with self.subTest(fields=fields):
+                response = self.assertBudget(1, reverse('products:product-list'), {'fields': fields})
+                self.assertEqual(set(response.json()['data'][0]), set(fields.split(',')))
+
+    def test_product_detail_budget(self):
+        product = self.create_products(1, images=5)[0]
+        self.assertBudget(2, reverse('products:product-detail', args=[product.pk]))
+
+    def test_product_search_budget(self):
+        self.create_products(8)
+        search_index.build()
+        self.assertBudget(2, reverse('products:product-search'), {'q': 'apple'})
+
+    def test_product_batch_budget(self):
+        ids = [product.pk for product in self.create_products(30)]
+        url = reverse('products:product-batch')
+        response = self.assertBudget(2, url, {'ids': ','.join(map(str, ids + [999999]))})
+        self.assertEqual([p['id'] for p in response.json()['data']['products']], ids)
+        self.assertEqual(response.json()['data']['missing'], [999999])
+
+        with self.assertNumQueries(2):
+            response = self.client.post(url, {'ids': ids[::-1]}, content_type='application/json')
+        self.assertEqual([p['id'] for p in response.json()['data']['products']], ids[::-1])
+
+        response = self.client.post(url, ids, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], {'ids': ['Provide a non-empty list of product ids']})
+
+    def test_deal_of_the_day_budget(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in self.create_products(5):
+                DealOfTheDay.objects.create(
+                    product=product, deal_price=5,
+                    start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+        # The running deal set is loaded once and then served from memory
+        deal_scheduler.active_deals()
+        # deals joined with products + images prefetch
+        self.assertBudget(2, reverse('products:deal-of-the-day'))
+
+    def test_category_list_budget(self):
+        for i in range(5):
+            Category.objects.create(name=f'Category {i}')
+        self.assertBudget(1, reverse('products:category-list'))
+
+
+class CategorySlugResolverTestCase(TestCase):
+
+    def setUp(self):
+        category_slugs.build()
+        self.addCleanup(category_slugs.build)
+        self.staples = Category.objects.create(name='Atta, Rice & Dal')
+
+    def test_frontend_spellings_resolve(self):
+        self.assertEqual(self.staples.slug, 'atta-rice-and-dal')
+        for value in ('atta-rice-and-dal', 'ATTA-RICE-DAL ', 'atta,-rice-dal', 'Atta, Rice & Dal'):
+            with self.subTest(value=value):
+                self.assertEqual(category_slugs.resolve(value), self.staples.pk)
+        self.assertIsNone(category_slugs.resolve('pulses'))
+        self.assertIsNone(category_slugs.resolve(''))
+
+    def test_canonical_slug_wins_over_an_alias(self):
+        # "atta-rice-dal" is the alias of the first category and the slug of this one
+        other = Category.objects.create(name='Other', slug='atta-rice-dal')
+        self.assertEqual(category_slugs.resolve('atta-rice-dal'), other.pk)
+        self.assertEqual(category_slugs.resolve('atta-rice-and-dal'), self.staples.pk)
+
+    def test_map_follows_category_changes(self):
+        self.staples.name = 'Staples'
+        self.staples.slug = 'staples'
+        self.staples.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(category_slugs.resolve('staples'), self.staples.pk)
+        # The old slug is gone; only the database fallback is left, and it finds nothing
+        self.assertIsNone(category_slugs.resolve('atta-rice-and-dal'))
+
+        self.staples.delete()
+        self.assertIsNone(category_slugs.resolve('staples'))
+
+
+class CategorySlugMigrationTestCase(TransactionTestCase):
+    """0008 backfills a unique slug for every existing category"""
+
+    before = [('products', '0007_remove_product_stock')]
+    after = [('products', '0008_category_slug')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldCategory = executor.loader.project_state(self.before).apps.get_model('products', 'Category')
+        for name in ('Fruits & Vegetables', 'Fruits and Vegetables', '!!!'):
+            OldCategory.objects.create(name=name)
+
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        NewCategory = executor.loader.project_state(self.after).apps.get_model('products', 'Category')
+        self.assertEqual(
+            list(NewCategory.objects.order_by('id').values_list('slug', flat=True)),
+            ['fruits-and-vegetables', 'fruits-and-vegetables-2', 'category'],
+        )
+
+
+class ProductSkuMigrationTestCase(TransactionTestCase):
+    """0019 gives products without a sku the one import_catalog generates"""
+
+    before = [('products', '0018_product_category_updated_idx')]
+    after = [('products', '0019_backfill_product_sku')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        dairy = apps.get_model('products', 'Category').objects.create(name='Dairy', slug='dairy')
+        OldProduct = apps.get_model('products', 'Product')
+        for name, sku in (('Milk', None), ('Milk', None), ('Paneer', 'PNR-1')):
+            OldProduct.objects.create(name=name, sku=sku, description='-', price=10, category=dairy)
+
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        NewProduct = executor.loader.project_state(self.after).apps.get_model('products', 'Product')
+        self.assertEqual(
+            list(NewProduct.objects.order_by('id').values_list('sku', flat=True)),
+            ['dairy-milk', 'dairy-milk-2', 'PNR-1'],
+        )
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        facet_index.invalidate()
+        self.category = Category.objects.create(name='Dairy')
+        self.products = [
+            Product.objects.create(name=f'Milk {i}', description='-', price=10, category=self.category)
+            for i in range(5)
+        ]
+
+    def pages(self, url, params):
+        """Follow `next` links from the first page; returns the ids of each page"""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            body = response.json()
+            pages.append([item['id'] for item in body['data']])
+            if not body['extra_context']['next']:
+                return pages, body
+            response = self.client.get(body['extra_context']['next'])
+
+    def test_cursor_links_walk_every_row_once(self):
+        pages, last = self.pages(reverse('products:product-list'), {'page_size': 2})
+        ids = [product.pk for product in self.products]
+        self.assertEqual(pages, [ids[0:2], ids[2:4], ids[4:5]])
+        # The last page links back to the one before it
+        previous = self.client.get(last['extra_context']['previous']).json()
+        self.assertEqual([item['id'] for item in previous['data']], ids[2:4])
+
+    def test_page_size_is_capped(self):
+        Product.objects.bulk_create([
+            Product(name=f'Curd {i}', description='-', price=10, category=self.category) for i in range(120)
+        ])
+        facet_index.invalidate()
+        body = self.client.get(reverse('products:product-list'), {'page_size': 500}).json()
+        self.assertEqual(len(body['data']), 100)
+        self.assertIsNotNone(body['extra_context']['next'])
+
+    def test_category_list_fits_the_navigation_in_one_page(self):
+        for i in range(30):
+            Category.objects.create(name=f'Aisle {i}')
+        body = self.client.get(reverse('products:category-list')).json()
+        self.assertEqual(len(body['data']), 31)
+        self.assertIsNone(body['extra_context']['next'])
+
+
+class CatalogCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category_slugs.build()
+        deal_scheduler.invalidate()
+        deal_scheduler.active_deals()
+        self.category = Category.objects.create(name='Dairy')
+        self.product = Product.objects.create(
+            name='Milk', description='Fresh milk', price=10, category=self.category)
+
+    def test_repeated_request_is_served_from_cache(self):
+        url = reverse('products:product-list')
+        first = self.client.get(url, {'category': 'dairy', 'page_size': 5})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'page_size': 5, 'category': 'dairy'})
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(get_cache_stats()['hits'], 1)
+
+    def test_catalog_change_invalidates_cache(self):
+        url = reverse('products:product-detail', args=[self.product.pk])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 12
+            self.product.save()
+            # Until the change commits the old version, and what it cached, stays current
+            self.assertEqual(self.client.get(url).json()['data']['price'], '10.00')
+        self.assertEqual(self.client.get(url).json()['data']['price'], '12.00')
+
+    def test_deal_start_moves_last_modified(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            DealOfTheDay.objects.create(
+                product=self.product, deal_price=5,
+                start_date=now + timedelta(minutes=5), end_date=now + timedelta(hours=1))
+        url = reverse('products:product-detail', args=[self.product.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+
+        # No row changes when the deal starts, but the effective price does
+        with mock.patch('products.deals.timezone.now', return_value=now + timedelta(minutes=10)):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['effective_price'], '5.00')
+
+    def test_evicted_version_never_repeats(self):
+        url = reverse('products:category-list')
+        etag = self.client.get(url)['ETag']
+        cache.delete(CATALOG_VERSION_KEY)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_get_returns_not_modified(self):
+        url = reverse('products:category-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Bakery')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CatalogSnapshotTestCase(TestCase):
+
+    def setUp(self):
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        self.enterContext(override_settings(CATALOG_SNAPSHOT_DIR=snapshot_dir.name, CATALOG_SNAPSHOT_REBUILD_DELAY=None))
+        category = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(name='Milk', description='Fresh milk', price=10, category=category)
+        Product.objects.create(name='Old milk', description='Gone', price=10, category=category, is_active=False)
+
+    def test_snapshot_is_served_precompressed(self):
+        manifest = build_snapshot()
+        url = reverse('products:catalog-snapshot')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        payload = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual([p['name'] for p in payload['data']['products']], ['Milk'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=manifest['etag'])
+        self.assertEqual(response.status_code, 304)
+
+    def snapshot_names(self):
+        response = self.client.get(reverse('products:catalog-snapshot'), HTTP_ACCEPT_ENCODING='identity')
+        payload = json.loads(b''.join(response.streaming_content))
+        return response['ETag'], [p['name'] for p in payload['data']['products']]
+
+    def test_catalog_change_is_rebuilt_off_the_request(self):
+        first = build_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.name = 'Toned Milk'
+            self.milk.save()
+        # The outdated snapshot is served while the rebuild runs in the background
+        with mock.patch('products.snapshot.start_snapshot_rebuild') as start, self.assertNumQueries(0):
+            self.assertEqual(self.snapshot_names(), (first['etag'], ['Milk']))
+        start.assert_called_once_with()
+
+        # A rebuild that never lands is done by the request once the staleness bound is hit
+        with mock.patch('products.snapshot.start_snapshot_rebuild'), \
+                override_settings(CATALOG_SNAPSHOT_MAX_STALENESS=0):
+            etag, names = self.snapshot_names()
+        self.assertEqual(names, ['Toned Milk'])
+        self.assertNotEqual(etag, first['etag'])
+
+        # Every build has files of its own; only the newest builds stay on disk
+        latest = build_snapshot()
+        names = set(os.listdir(settings.CATALOG_SNAPSHOT_DIR))
+        self.assertTrue(set(latest['files'].values()) <= names)
+        self.assertFalse(set(first['files'].values()) & names)
+
+    def test_encoding_negotiation_honours_q_values(self):
+        available = {'br': 'a.br', 'gzip': 'a.gz', 'identity': 'a'}
+        self.assertEqual(negotiate_encoding('gzip, br', available), 'br')
+        self.assertEqual(negotiate_encoding('gzip;q=0, identity', available), 'identity')
+        self.assertEqual(negotiate_encoding('br;q=0, *', available), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0.5', available), 'gzip')
+        self.assertEqual(negotiate_encoding('', available), 'identity')
+        self.assertEqual(negotiate_encoding('br', {'identity': 'a'}), 'identity')
+
+    def test_length_matches_the_file_being_streamed(self):
+        manifest = build_snapshot()
+        path = os.path.join(settings.CATALOG_SNAPSHOT_DIR, manifest['files']['identity'])
+
+        def open_then_rebuild(name, *args, **kwargs):
+            # A rebuild swaps a different file in right after the view opened the old one
+            f = open(name, *args, **kwargs)
+            with open(path + '.new', 'wb') as replacement:
+                replacement.write(b'{}' * 10000)
+            os.replace(path + '.new', path)
+            return f
+
+        with mock.patch('products.views.open', open_then_rebuild, create=True):
+            response = self.client.get(reverse('products:catalog-snapshot'), HTTP_ACCEPT_ENCODING='identity')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertEqual([p['name'] for p in json.loads(body)['data']['products']], ['Milk'])
+
+
+class DealSchedulerTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        deal_scheduler.invalidate()
+        category = Category.objects.create(name='Dairy')
+        self.product = Product.objects.create(name='Milk', description='Fresh milk', price=10, category=category)
+        self.now = timezone.now()
+
+    def create_deal(self, start, end, **kwargs):
+        return DealOfTheDay.objects.create(
+            product=self.product, deal_price=5,
+            start_date=self.now + start, end_date=self.now + end, **kwargs)
+
+    def test_active_set_follows_time_boundaries_without_queries(self):
+        running = self.create_deal(timedelta(hours=-1), timedelta(hours=1))
+        upcoming = self.create_deal(timedelta(hours=2), timedelta(hours=3))
+        self.create_deal(timedelta(hours=-1), timedelta(hours=1), is_active=False)
+
+        self.assertEqual([deal.id for deal in deal_scheduler.active_deals()], [running.id])
+        self.assertEqual(deal_scheduler.next_boundary(), running.end_date + timedelta(microseconds=1))
+
+        later = self.now + timedelta(hours=2, minutes=30)
+        with mock.patch('products.deals.timezone.now', return_value=later), self.assertNumQueries(0):
+            self.assertEqual([deal.id for deal in deal_scheduler.active_deals()], [upcoming.id])
+
+    def test_deal_change_refreshes_active_set(self):
+        deal = self.create_deal(timedelta(hours=-1), timedelta(hours=1))
+        self.assertEqual(len(deal_scheduler.active_deals()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            deal.is_active = False
+            deal.save()
+            # Not before the edit commits, or a read now would keep the old rows
+            self.assertEqual(len(deal_scheduler.active_deals()), 1)
+        self.assertEqual(deal_scheduler.active_deals(), ())
+
+    def test_edits_from_other_processes_are_picked_up(self):
+        deal = self.create_deal(timedelta(hours=-1), timedelta(hours=1))
+        self.assertEqual(len(deal_scheduler.active_deals()), 1)
+        # No signal reaches this process for a write made elsewhere
+        DealOfTheDay.objects.filter(pk=deal.pk).update(is_active=False)
+        self.assertEqual(len(deal_scheduler.active_deals()), 1)
+        deal_scheduler._loaded_at -= deal_scheduler.RELOAD_INTERVAL
+        self.assertEqual(deal_scheduler.active_deals(), ())
+
+
+class ProductFacetTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        facet_index.invalidate()
+        category_slugs.build()
+        self.dairy = Category.objects.create(name='Dairy')
+        self.bakery = Category.objects.create(name='Bakery')
+        Product.objects.create(name='Milk', description='-', price=60, category=self.dairy, tag='trending')
+        Product.objects.create(name='Cheese', description='-', price=250, category=self.dairy, tag='top_rated')
+        Product.objects.create(name='Bread', description='-', price=45, category=self.bakery, tag='trending')
+
+    def facets(self, response, name):
+        return {facet['value']: facet['count'] for facet in response.json()['extra_context']['facets'][name]}
+
+    def test_filters_and_facet_counts(self):
+        response = self.client.get(reverse('products:product-list'), {'tag': 'trending', 'max_price': '100'})
+        self.assertEqual(sorted(p['name'] for p in response.json()['data']), ['Bread', 'Milk'])
+        # Each facet ignores its own filter
+        self.assertEqual(self.facets(response, 'tag')['top_rated'], 0)
+        self.assertEqual(self.facets(response, 'tag')['trending'], 2)
+        self.assertEqual(self.facets(response, 'category'), {self.dairy.pk: 1, self.bakery.pk: 1})
+        self.assertEqual(self.facets(response, 'price')['200-500'], 0)
+
+    def test_counts_follow_product_changes(self):
+        facet_index.build()
+        Product.objects.filter(name='Cheese').get().delete()
+        Product.objects.create(name='Butter', description='-', price=55, category=self.dairy, tag='trending')
+        response = self.client.get(reverse('products:product-list'), {'category': 'dairy'})
+        self.assertEqual(self.facets(response, 'tag'), {'new_arrivals': 0, 'trending': 2, 'top_rated': 0})
+        self.assertEqual(self.facets(response, 'price')['50-100'], 2)
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse('products:product-list'), {'tag': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SuggestIndexTestCase(TestCase):
+
+    def setUp(self):
+        suggest_index.invalidate()
+        self.addCleanup(suggest_index.invalidate)
+        self.dairy = Category.objects.create(name='Dairy')
+        self.shake = Product.objects.create(
+            name='Banana Milkshake', description='-', price=40, category=self.dairy)
+
+    def names(self, query, limit=8):
+        return [entry['name'] for entry in suggest_index.suggest(query, limit=limit)]
+
+    def test_any_word_of_a_name_is_a_key(self):
+        Product.objects.create(name='Milk', description='-', price=60, category=self.dairy)
+        # Names starting with the typed word come first, then shorter names
+        self.assertEqual(self.names('mil'), ['Milk', 'Banana Milkshake'])
+        self.assertEqual(self.names('dai'), ['Dairy'])
+        self.assertEqual(self.names('xyz'), [])
+
+    def test_leading_words_filter_a_crowded_prefix(self):
+        Product.objects.bulk_create([
+            Product(name=f'Milk {i}', description='-', price=60, category=self.dairy) for i in range(80)
+        ])
+        suggest_index.build()
+        self.assertEqual(self.names('banana mil'), ['Banana Milkshake'])
+
+    def test_entries_follow_catalog_changes(self):
+        suggest_index.build()
+        self.shake.name = 'Mango Lassi'
+        self.shake.save()
+        self.assertEqual(self.names('milk'), [])
+        self.assertEqual(self.names('lass'), ['Mango Lassi'])
+
+        self.shake.is_active = False
+        self.shake.save()
+        self.assertEqual(self.names('mango'), [])
+
+        self.shake.is_active = True
+        self.shake.save()
+        self.shake.delete()
+        self.assertEqual(self.names('mango'), [])
+        # Branches left without entries are pruned from the trie
+        self.assertNotIn('m', suggest_index._root.children)
+        self.assertIn('d', suggest_index._root.children)
+
+
+class ImageVariantTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name, IMAGE_VARIANT_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Every test stores under the same names in a fresh media root
+        image_variants._ready.clear()
+        image_variants._missing.clear()
+
+    def save_image(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 600), (0, 128, 0)).save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_variants_are_scaled_down_next_to_the_original(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (1000, 500), (255, 0, 0, 128)).save(buffer, 'PNG')
+        name = default_storage.save('thumbnails/apple.png', ContentFile(buffer.getvalue()))
+
+        self.assertEqual(len(generate_variants(name)), 6)
+        with default_storage.open(variant_name(name, 256, 'jpeg')) as variant:
+            self.assertEqual(Image.open(variant).size, (256, 128))
+        self.assertEqual(variant_name(name, 512, 'webp'), 'thumbnails/apple_512.webp')
+
+    def test_srcset_is_exposed_once_variants_exist(self):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 600), (0, 128, 0)).save(buffer, 'PNG')
+        name = default_storage.save('thumbnails/pear.png', ContentFile(buffer.getvalue()))
+        category = Category.objects.create(name='Fruits', thumbnail='thumbnails/fruits.svg')
+        product = Product.objects.create(name='Pear', description='-', price=10, category=category, thumbnail=name)
+        url = reverse('products:product-detail', args=[product.pk])
+        # The upload's variants are still being generated
+        self.assertIsNone(self.client.get(url).json()['data']['thumbnail_srcset'])
+
+        schedule_variants(name)
+        data = self.client.get(url).json()['data']
+        self.assertIn('thumbnails/pear_128.webp 128w', data['thumbnail_srcset']['webp'])
+        self.assertIn('thumbnails/pear_512.jpg 512w', data['thumbnail_srcset']['jpeg'])
+        # SVGs are served as they are
+        data = self.client.get(reverse('products:category-detail', args=[category.pk])).json()['data']
+        self.assertIsNone(data['thumbnail_srcset'])
+
+    def test_missing_variants_are_not_looked_up_on_every_read(self):
+        name = self.save_image('thumbnails/plum.png')
+        self.assertFalse(has_variants(name))
+        with mock.patch.object(default_storage, 'exists') as exists:
+            self.assertFalse(has_variants(name))
+        exists.assert_not_called()
+        # Variants written by this process show up at once
+        schedule_variants(name)
+        self.assertTrue(has_variants(name))
+
+    @override_settings(IMAGE_VARIANT_WORKERS=1)
+    def test_worker_pool_generates_variants(self):
+        self.addCleanup(shutdown_executor)
+        names = [self.save_image('thumbnails/kiwi.png'), self.save_image('thumbnails/lime.png')]
+        self.assertEqual(generate_many(names), 2)
+        self.assertTrue(all(has_variants(name) for name in names))
+        self.assertTrue(default_storage.exists(variant_name(names[0], 128, 'webp')))
+
+
+class ImportCatalogTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(CATALOG_SNAPSHOT_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def import_catalog(self, name, content):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as catalog_file:
+            catalog_file.write(content)
+        call_command('import_catalog', path, chunk_size=2, stdout=StringIO(), stderr=StringIO())
+
+    def test_rows_are_upserted(self):
+        self.import_catalog('catalog.csv', (
+            "sku,name,category,price,tag\n"
+            "APL-1,Apple,Fruits & Vegetables,10,trending\n"
+            "BAN-1,Banana,Fruits & Vegetables,5,\n"
+            ",Milk,Dairy,60,top_rated\n"
+            "BAD-1,Broken,Dairy,free,\n"
+            ",Organic Alphonso Mango Premium Export Quality Box,Fruits and Vegetables Fresh,499,\n"
+        ))
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertEqual(Product.objects.get(sku='dairy-milk').category.slug, 'dairy')
+        # A generated SKU too long for the column is shortened the same way on every import
+        mango = Product.objects.get(name__startswith='Organic Alphonso')
+        self.assertLessEqual(len(mango.sku), 64)
+        self.assertTrue(mango.sku.startswith('fruits-and-vegetables-fresh-organic-alphonso'))
+
+        self.import_catalog('catalog.jsonl', (
+            '{"sku": "APL-1", "name": "Red Apple", "category": "Fruits & Vegetables", "price": "12.5"}\n'
+            '{"sku": "EGG-1", "name": "Eggs", "category": "Dairy", "price": 89, "is_active": false}\n'
+        ))
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Category.objects.count(), 3)
+        apple = Product.objects.get(sku='APL-1')
+        self.assertEqual((apple.name, str(apple.price)), ('Red Apple', '12.50'))
+        self.assertFalse(Product.objects.get(sku='EGG-1').is_active)
+
+        # The in-memory indexes were dropped and see the imported rows
+        response = self.client.get(reverse('products:product-search'), {'q': 'red apple'})
+        self.assertEqual([product['id'] for product in response.json()['data']], [apple.pk])
+
+    def test_products_without_sku_are_updated(self):
+        dairy = Category.objects.create(name='Dairy')
+        milk = Product.objects.create(name='Milk', description='-', price=50, category=dairy)
+        self.import_catalog('catalog.csv', (
+            "name,category,price\n"
+            "Milk,Dairy,60\n"
+            "Eggs,Dairy,89\n"
+        ))
+        self.assertEqual(Product.objects.count(), 2)
+        milk.refresh_from_db()
+        self.assertEqual((milk.sku, str(milk.price)), ('dairy-milk', '60.00'))
+
+
+class CatalogExportTestCase(TestCase):
+
+    def setUp(self):
+        dairy = Category.objects.create(name='Dairy')
+        for i in range(5):
+            Product.objects.create(name=f'Milk {i}', description='-', price=60, category=dairy, is_active=i != 0)
+        admin = get_user_model().objects.create_user(
+            username='ops', email='ops@example.com', password='pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def test_streams_ndjson_and_gzipped_csv(self):
+        response = self.client.get(reverse('products:catalog-export'), {'is_active': 'true'})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['name'] for row in rows], [f'Milk {i}' for i in range(1, 5)])
+        self.assertEqual(rows[0]['category_slug'], 'dairy')
+
+        response = self.client.get(reverse('products:catalog-export'), {'output': 'csv', 'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(len(list(csv.DictReader(body.splitlines()))), 5)
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('products:catalog-export')).status_code, 401)
+
+
+@override_settings(RANKING_REFRESH_INTERVAL=None)
+class ProductRankingTestCase(TestCase):
+
+    def setUp(self):
+        ranking_tracker.reset()
+        self.addCleanup(ranking_tracker.reset)
+        category = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(name='Milk', description='-', price=60, category=category)
+        self.eggs = Product.objects.create(name='Eggs', description='-', price=89, category=category)
+        self.user = get_user_model().objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+
+    def order(self, product, quantity, age=timedelta(0)):
+        order = Order.objects.create(user=self.user, total_price=product.price * quantity)
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - age)
+        return order
+
+    def ranked_ids(self, window):
+        response = self.client.get(reverse('products:product-trending'), {'window': window})
+        return [entry['id'] for entry in response.json()['data']]
+
+    def test_windows_decay_and_follow_new_orders(self):
+        self.order(self.milk, 10, age=timedelta(days=2))
+        self.order(self.eggs, 2)
+        ranking_tracker.refresh()
+        self.assertEqual(self.ranked_ids('1h'), [self.eggs.pk])
+        self.assertEqual(self.ranked_ids('7d'), [self.milk.pk, self.eggs.pk])
+
+        # Picked up incrementally, and cancellations are taken back out
+        self.order(self.milk, 5)
+        cancelled = self.order(self.eggs, 20)
+        ranking_tracker.refresh()
+        self.assertEqual(self.ranked_ids('1h'), [self.eggs.pk, self.milk.pk])
+        cancelled.status = 'CANCELLED'
+        cancelled.save()
+        ranking_tracker.refresh()
+        self.assertEqual(self.ranked_ids('1h'), [self.milk.pk, self.eggs.pk])
+
+    def test_items_committed_out_of_order_are_counted(self):
+        late = self.order(self.milk, 5)
+        # The checkout is still open: its item id is taken, but not visible yet
+        item = OrderItem.objects.get(order=late)
+        OrderItem.objects.filter(pk=item.pk).delete()
+        self.order(self.eggs, 1)
+        ranking_tracker.refresh()
+        self.assertEqual(self.ranked_ids('1h'), [self.eggs.pk])
+
+        item.save(force_insert=True)
+        ranking_tracker.refresh()
+        self.assertEqual(self.ranked_ids('1h'), [self.milk.pk, self.eggs.pk])
+        # Counted once however often it is re-read
+        ranking_tracker.refresh()
+        self.assertAlmostEqual(ProductRanking.objects.get(window='1h').entries[0][1], 5, places=2)
+
+    def test_unknown_window_is_rejected(self):
+        response = self.client.get(reverse('products:product-trending'), {'window': '1y'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BoughtTogetherTestCase(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Dairy')
+        self.milk, self.bread, self.eggs, self.jam = (
+            Product.objects.create(name=name, description='-', price=50, category=category)
+            for name in ('Milk', 'Bread', 'Eggs', 'Jam'))
+        self.user = get_user_model().objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+
+    def deliver(self, *products):
+        order = Order.objects.create(user=self.user, total_price=50 * len(products))
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=50)
+        order = Order.objects.get(pk=order.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = 'DELIVERED'
+            order.save()
+        return order
+
+    def table(self):
+        return sorted(BoughtTogether.objects.values_list('product_id', 'related_id', 'count'))
+
+    def counts(self):
+        return sorted(BoughtTogetherCount.objects.filter(count__gt=0).values_list('product_id', 'related_id', 'count'))
+
+    def test_incremental_updates_match_a_full_build(self):
+        self.deliver(self.milk, self.bread)
+        self.deliver(self.milk, self.bread, self.eggs)
+        returned = self.deliver(self.milk, self.jam)
+        self.deliver(self.eggs, self.jam)
+        with self.captureOnCommitCallbacks(execute=True):
+            returned.status = 'CANCELLED'
+            returned.save()
+        incremental = self.table()
+        incremental_counts = self.counts()
+
+        bought_together.build()
+        self.assertEqual(self.table(), incremental)
+        self.assertEqual(self.counts(), incremental_counts)
+        self.assertIn((self.milk.pk, self.milk.pk, 2), incremental_counts)
+        self.assertIn((self.milk.pk, self.bread.pk, 2), incremental)
+        self.assertNotIn(self.jam.pk, [related for product, related, _ in incremental if product == self.milk.pk])
+
+    def test_suggestions_for_a_cart(self):
+        self.deliver(self.milk, self.bread)
+        self.deliver(self.milk, self.bread, self.eggs)
+        response = self.client.get(reverse('products:product-bought-together'), {'ids': f'{self.milk.pk}'})
+        self.assertEqual([product['id'] for product in response.json()['data']], [self.bread.pk, self.eggs.pk])
+        response = self.client.get(
+            reverse('products:product-bought-together'), {'ids': f'{self.milk.pk},{self.bread.pk}'})
+        self.assertEqual([product['id'] for product in response.json()['data']], [self.eggs.pk])
+
+
+class SimilarProductsTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(SIMILARITY_INDEX_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        similarity_index.invalidate()
+        self.addCleanup(similarity_index.invalidate)
+
+        dairy = Category.objects.create(name='Dairy')
+        snacks = Category.objects.create(name='Snacks')
+        self.milk = Product.objects.create(name='Cow Milk', description='Fresh full cream milk', price=60, category=dairy)
+        self.toned = Product.objects.create(name='Toned Milk', description='Fresh toned milk', price=50, category=dairy)
+        self.paneer = Product.objects.create(name='Paneer', description='Fresh cottage cheese', price=90, category=dairy)
+        self.chips = Product.objects.create(name='Chips', description='Salted potato chips', price=20, category=snacks)
+
+    def test_ranks_by_tfidf_cosine(self):
+        build_index()
+        response = self.client.get(reverse('products:product-similar', args=[self.milk.pk]))
+        ids = [product['id'] for product in response.json()['data']]
+        self.assertEqual(ids[:2], [self.toned.pk, self.paneer.pk])
+        self.assertNotIn(self.milk.pk, ids)
+        self.assertNotIn(self.chips.pk, ids)
+
+    def test_missing_index_is_not_built_on_request(self):
+        response = self.client.get(reverse('products:product-similar', args=[self.milk.pk]))
+        self.assertEqual(response.json()['data'], [])
+        self.assertFalse(any(get_index_dir().iterdir()))
+
+    def test_new_build_is_picked_up(self):
+        build_index()
+        self.assertEqual(similarity_index.similar(self.chips.pk), [])
+        crisps = Product.objects.create(
+            name='Potato Crisps', description='Salted potato crisps', price=25, category=self.chips.category)
+        build_index()
+        similarity_index._checked_at = None
+        self.assertEqual(similarity_index.similar(self.chips.pk)[0][0], crisps.pk)
+
+
+@override_settings(SEARCH_PREWARM_INTERVAL=None)
+class ProductSearchTestCase(TestCase):
+
+    def setUp(self):
+        search_cache.clear()
+        search_index.invalidate()
+        trigram_index.invalidate()
+        self.dairy = Category.objects.create(name='Dairy')
+        self.bakery = Category.objects.create(name='Bakery')
+        self.milk = Product.objects.create(name='Milk', description='Fresh toned milk', price=60, category=self.dairy)
+        self.bread = Product.objects.create(
+            name='Milk Bread', description='Soft bread', price=40, category=self.bakery)
+        self.butter = Product.objects.create(
+            name='Butter', description='Made from milk', price=55, category=self.dairy)
+
+    def search(self, query, **params):
+        search_cache.clear()
+        return self.client.get(reverse('products:product-search'), {'q': query, **params}).json()
+
+    def ids(self, query, **params):
+        return [product['id'] for product in self.search(query, **params)['data']]
+
+    def test_bm25_ranks_name_matches_first(self):
+        # Name outweighs description, and a short name is a stronger match than a longer one
+        self.assertEqual(self.ids('milk'), [self.milk.pk, self.bread.pk, self.butter.pk])
+        # Every token must match (exact hits only, the API appends fuzzy ones to short lists)
+        self.assertEqual(search_index.search('milk bread'), [self.bread.pk])
+
+    def test_last_token_matches_as_prefix(self):
+        self.assertEqual(search_index.search('butt'), [self.butter.pk])
+        self.assertEqual(search_index.search('bread mil'), [self.bread.pk])
+        self.assertEqual(self.ids('butt')[0], self.butter.pk)
+        # Earlier tokens must match whole terms
+        self.assertEqual(search_index.search('mil bread'), [])
+
+    def test_pagination(self):
+        body = self.search('milk', page=2, page_size=2)
+        self.assertEqual([product['id'] for product in body['data']], [self.butter.pk])
+        self.assertEqual(
+            {key: body['extra_context'][key] for key in ('page', 'page_size', 'total', 'has_next')},
+            {'page': 2, 'page_size': 2, 'total': 3, 'has_next': False},
+        )
+        self.assertTrue(self.search('milk', page=1, page_size=2)['extra_context']['has_next'])
+        # Out of range sizes are clamped
+        self.assertEqual(self.search('milk', page_size=1000)['extra_context']['page_size'], 50)
+
+    def test_index_follows_product_and_category_changes(self):
+        self.search('milk')
+        self.milk.name = 'Toned Milk'
+        self.milk.save()
+        self.assertEqual(self.ids('toned'), [self.milk.pk])
+
+        self.butter.delete()
+        self.assertNotIn(self.butter.pk, self.ids('milk'))
+
+        self.bakery.name = 'Breakfast'
+        self.bakery.save()
+        self.assertEqual(self.ids('breakfast'), [self.bread.pk])
+
+    def test_inactive_products_are_not_found(self):
+        Product.objects.create(name='Hidden Cheese', description='-', price=10, category=self.dairy, is_active=False)
+        self.assertEqual(self.search('hidden')['data'], [])
+        self.search('milk')
+        self.bread.is_active = False
+        self.bread.save()
+        self.assertEqual(self.ids('milk'), [self.milk.pk, self.butter.pk])
+
+
+@override_settings(SEARCH_PREWARM_INTERVAL=None)
+class TypoTolerantSearchTestCase(TestCase):
+
+    def setUp(self):
+        search_cache.clear()
+        search_index.invalidate()
+        trigram_index.invalidate()
+        fruits = Category.objects.create(name='Fruits')
+        care = Category.objects.create(name='Personal Care')
+        self.banana = Product.objects.create(name='Robusta Banana', description='-', price=40, category=fruits)
+        self.shampoo = Product.objects.create(name='Anti Dandruff Shampoo', description='-', price=199, category=care)
+        Product.objects.create(name='Soap', description='-', price=30, category=care)
+
+    def search(self, query):
+        return self.client.get(reverse('products:product-search'), {'q': query}).json()
+
+    def test_misspellings_fall_back_to_trigrams(self):
+        body = self.search('bananna')
+        self.assertTrue(body['extra_context']['fuzzy'])
+        self.assertEqual(body['data'][0]['id'], self.banana.pk)
+        self.assertEqual(self.search('shampo')['data'][0]['id'], self.shampoo.pk)
+
+    def test_index_follows_catalog_changes(self):
+        self.search('bananna')
+        Product.objects.create(name='Alphonso Mango', description='-', price=120, category=self.banana.category)
+        self.assertEqual(trigram_index.search('mangoo')[0], Product.objects.get(name='Alphonso Mango').pk)
+
+
+@tag('benchmark')
+class TrigramSearchBenchmarkTestCase(TestCase):
+    """Latency budget of the trigram fallback on a catalog of realistic size"""
+
+    PRODUCTS = 20000
+    BUDGET_P95_MS = 25
+
+    WORDS = [
+        'fresh', 'organic', 'apple', 'banana', 'mango', 'milk', 'paneer', 'bread', 'butter', 'cheese',
+        'shampoo', 'soap', 'detergent', 'rice', 'basmati', 'dal', 'atta', 'chips', 'cookies', 'juice',
+        'coffee', 'tea', 'green', 'masala', 'chicken', 'prawns', 'yogurt', 'honey', 'oats', 'almond',
+    ]
+
+    def test_p95_latency(self):
+        rng = random.Random(7)
+        categories = [Category.objects.create(name=f'Aisle {i}') for i in range(20)]
+        Product.objects.bulk_create([
+            Product(name=f"{' '.join(rng.sample(self.WORDS, 3))} {rng.randrange(10 ** 6)}",
+                    description='-', price=10, category=rng.choice(categories))
+            for _ in range(self.PRODUCTS)
+        ], batch_size=2000)
+        trigram_index.build()
+        self.addCleanup(trigram_index.invalidate)
+
+        def misspell(word):
+            position = rng.randrange(len(word))
+            return word[:position] + word[position] + word[position:]
+
+        timings = []
+        for _ in range(200):
+            query = ' '.join(misspell(word) for word in rng.sample(self.WORDS, 2))
+            started = time.perf_counter()
+            trigram_index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.assertLess(timings[int(len(timings) * 0.95)], self.BUDGET_P95_MS)
+
+
+@override_settings(SEARCH_PREWARM_INTERVAL=None)
+class SearchCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        search_cache.clear()
+        search_index.invalidate()
+        search_log.clear()
+        deal_scheduler.invalidate()
+        deal_scheduler.active_deals()
+        self.dairy = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(name='Milk', description='-', price=60, category=self.dairy)
+
+    def search(self, query):
+        return self.client.get(reverse('products:product-search'), {'q': query}).json()
+
+    def test_normalized_repeats_skip_the_database(self):
+        self.search('Milk')
+        with self.assertNumQueries(0):
+            body = self.search('  MILK ')
+        self.assertEqual([product['id'] for product in body['data']], [self.milk.pk])
+
+        # A catalog change moves to a new version
+        with self.captureOnCommitCallbacks(execute=True):
+            toned = Product.objects.create(name='Toned Milk', description='-', price=50, category=self.dairy)
+        self.assertEqual(len(self.search('milk')['data']), 2)
+        self.assertIn(toned.pk, [product['id'] for product in self.search('milk')['data']])
+
+    def test_popular_queries_are_prewarmed(self):
+        for _ in range(3):
+            search_log.record('Milk')
+        search_log.record('bread')
+        self.assertEqual(prewarm(), 2)
+        self.assertEqual(SearchQuery.objects.get(query='milk').count, 3)
+        with self.assertNumQueries(0):
+            self.search('milk')
+
+    def test_flush_adds_to_stored_counts(self):
+        search_log.record('milk')
+        search_log.flush()
+        # Another process flushed in between
+        SearchQuery.objects.filter(query='milk').update(count=5)
+        search_log.record('milk')
+        search_log.flush()
+        self.assertEqual(SearchQuery.objects.get(query='milk').count, 6)
+
+    @override_settings(SEARCH_LOG_MAX_QUERIES=2)
+    def test_rare_queries_are_pruned(self):
+        for query in ('m', 'mi', 'mil', 'milk', 'milk', 'milk', 'bread', 'bread'):
+            search_log.record(query)
+        search_log.flush()
+        self.assertEqual(sorted(SearchQuery.objects.values_list('query', flat=True)), ['bread', 'milk'])
+
+
+class CategoryTreeTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Only the stored name matters here, there is no file to make variants of
+        patcher = mock.patch('products.signals.schedule_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dairy = Category.objects.create(name='Dairy')
+        self.snacks = Category.objects.create(name='Snacks')
+        self.hidden = Category.objects.create(name='Hidden', is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk = Product.objects.create(
+                name='Milk', description='-', price=60, category=self.dairy,
+                thumbnail='products/thumbnails/milk.png')
+            self.paneer = Product.objects.create(name='Paneer', description='-', price=90, category=self.dairy)
+            Product.objects.create(name='Chips', description='-', price=20, category=self.snacks, is_active=False)
+
+    def tree(self):
+        return {category['slug']: category for category in self.client.get(reverse('products:category-tree')).json()['data']}
+
+    def test_lists_active_categories_with_stats(self):
+        deal_scheduler.invalidate()
+        deal_scheduler.active_key()
+        with self.assertNumQueries(1):
+            tree = self.tree()
+        self.assertEqual(set(tree), {'dairy', 'snacks'})
+        self.assertEqual(tree['dairy']['product_count'], 2)
+        self.assertEqual((tree['dairy']['min_price'], tree['dairy']['max_price']), ('60.00', '90.00'))
+        self.assertEqual(tree['dairy']['thumbnail'], default_storage.url('products/thumbnails/milk.png'))
+        self.assertEqual(tree['snacks']['product_count'], 0)
+        self.assertIsNone(tree['snacks']['min_price'])
+        self.assertIsNone(tree['snacks']['thumbnail'])
+
+    def test_stats_follow_product_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paneer.category = self.snacks
+            self.paneer.save()
+            self.milk.is_active = False
+            self.milk.save()
+        tree = self.tree()
+        self.assertEqual(tree['dairy']['product_count'], 0)
+        self.assertEqual(tree['snacks']['product_count'], 1)
+        self.assertEqual(tree['snacks']['max_price'], '90.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paneer.delete()
+        self.assertEqual(self.tree()['snacks']['product_count'], 0)
+
+    def test_category_delete_cascades_cleanly(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dairy.delete()
+        self.assertFalse(CategoryStats.objects.filter(category_id=self.dairy.pk).exists())
+        self.assertNotIn('dairy', self.tree())
+
+
+@override_settings(FLASH_SALE_LEASE_SIZE=2)
+class FlashSaleAllowanceTestCase(TestCase):
+
+    def setUp(self):
+        flash_sales.clear()
+        self.addCleanup(flash_sales.clear)
+        category = Category.objects.create(name='Electronics')
+        product = Product.objects.create(name='Phone', description='-', price=10000, category=category)
+        now = timezone.now()
+        self.deal = DealOfTheDay.objects.create(
+            product=product, deal_price=7999, quantity_limit=5,
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1))
+
+    def claimed(self):
+        self.deal.refresh_from_db()
+        return self.deal.quantity_claimed
+
+    def test_leases_in_batches_and_refuses_in_memory(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flash_sales.claim(self.deal.pk, 1), 0)
+        self.assertEqual(self.claimed(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(flash_sales.claim(self.deal.pk, 1), 1)
+
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertIsNotNone(flash_sales.claim(self.deal.pk, 1))
+        self.assertEqual(self.claimed(), 5)
+        self.assertIsNone(flash_sales.claim(self.deal.pk, 1))
+        with self.assertNumQueries(0):
+            self.assertIsNone(flash_sales.claim(self.deal.pk, 1))
+
+        # Raising the limit lets the deal lease again
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deal.quantity_limit = 6
+            self.deal.save()
+        self.assertIsNotNone(flash_sales.claim(self.deal.pk, 1))
+
+    def test_rolled_back_lease_leaves_nothing_behind(self):
+        try:
+            with transaction.atomic():
+                flash_sales.claim(self.deal.pk, 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.claimed(), 0)
+        # Nothing reached the bucket, so the next claim leases again
+        with self.assertNumQueries(2):
+            flash_sales.claim(self.deal.pk, 1)
@@ -0,0 +1,174 @@
+import threading
+from collections import Counter, defaultdict
+
+from .models import Category, Product
+from .search import tokenize
+
+
+# Below this trigram similarity a vocabulary word is not considered a spelling of the query word
+MIN_SIMILARITY = 0.3
+
+# Vocabulary words kept per query word, best first
+MAX_TERM_MATCHES = 20
+
+
+def trigrams(word):
+    """Trigrams of a word padded like pg_trgm: "milk" -> "  m", " mi", "mil", "ilk", "lk " """
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Typo-tolerant lookup over the names of active products and their categories.
+
+    Every word of a product name and of its category name is indexed by its
+    trigrams. A query word is compared only with the vocabulary words
+    sharing at least one trigram with it, scored with the trigram Jaccard
+    similarity (as pg_trgm does), so "bananna" still finds "banana". Kept in
+    sync from the `products.signals` handlers like the search index.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        self._trigram_terms = defaultdict(set)   # trigram -> words
+        self._term_trigrams = {}                 # word -> its trigram count
+        self._term_products = defaultdict(set)   # word -> product ids whose name or category has it
+        self._product_terms = {}                 # product id -> words
+        self._product_categories = {}            # product id -> category id
+        self._category_names = {}                # category id -> name
+
+    def build(self):
+        with self._lock:
+            self._reset()
+            self._category_names = dict(Category.objects.values_list('id', 'name'))
+            products = Product.objects.filter(is_active=True).values_list('id', 'name', 'category_id')
+            for product_id, name, category_id in products.iterator(chunk_size=2000):
+                self._add(product_id, name, category_id)
+            self._built = True
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+            self._reset()
+
+    # Incremental maintenance
+
+    def _add(self, product_id, name, category_id):
+        terms = set(tokenize(name)) | set(tokenize(self._category_names.get(category_id, '')))
+        for term in terms:
+            if term not in self._term_trigrams:
+                grams = trigrams(term)
+                self._term_trigrams[term] = len(grams)
+                for gram in grams:
+                    self._trigram_terms[gram].add(term)
+            self._term_products[term].add(product_id)
+        self._product_terms[product_id] = terms
+        self._product_categories[product_id] = category_id
+
+    def _remove(self, product_id):
+        terms = self._product_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._product_categories.pop(product_id, None)
+        for term in terms:
+            products = self._term_products.get(term)
+            if products is None:
+                continue
+            products.discard(product_id)
+            if not products:
+                del self._term_products[term]
+                del self._term_trigrams[term]
+                for gram in trigrams(term):
+                    self._trigram_terms[gram].discard(term)
+                    if not self._trigram_terms[gram]:
+                        del self._trigram_terms[gram]
+
+    def update_product(self, product):
+        if not self._built:
+            return
+        with self._lock:
+            if product.category_id not in self._category_names:
+                self._category_names[product.category_id] = (
+                    Category.objects.filter(pk=product.category_id)
+                    .values_list('name', flat=True).first() or ''
+                )
+            self._remove(product.pk)
+            if product.is_active:
+                self._add(product.pk, product.name, product.category_id)
+
+    def remove_product(self, product_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(product_id)
+
+    def update_category(self, category):
+        if not self._built:
+            return
+        with self._lock:
+            if self._category_names.get(category.pk) == category.name:
+                return
+            self._category_names[category.pk] = category.name
+            products = Product.objects.filter(category_id=category.pk, is_active=True).values_list(
+                'id', 'name', 'category_id')
+            for product_id, name, category_id in products:
+                self._remove(product_id)
+                self._add(product_id, name, category_id)
+
+    def remove_category(self, category_id):
+        if not self._built:
+            return
+        with self._lock:
+            self._category_names.pop(category_id, None)
+
+    # Querying
+
+    def similar_terms(self, word):
+        """{vocabulary word: similarity} for the words spelled most like `word`"""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigram_terms.get(gram, ()))
+        matches = {}
+        for term, common in shared.items():
+            similarity = common / (len(grams) + self._term_trigrams[term] - common)
+            if similarity >= MIN_SIMILARITY:
+                matches[term] = similarity
+        best = sorted(matches, key=lambda term: (-matches[term], term))[:MAX_TERM_MATCHES]
+        return {term: matches[term] for term in best}
+
+    def search(self, query):
+        """
+        Product ids whose name or category name resembles `query`, best
+        first. A product scores the mean, over query words, of its best
+        matching word's similarity; it does not need to match every word.
+        """
+        self.ensure_built()
+        words = tokenize(query)
+        if not words:
+            return []
+        totals = defaultdict(float)
+        with self._lock:
+            for word in words:
+                best = {}
+                for term, similarity in self.similar_terms(word).items():
+                    for product_id in self._term_products.get(term, ()):
+                        if similarity > best.get(product_id, 0.0):
+                            best[product_id] = similarity
+                for product_id, similarity in best.items():
+                    totals[product_id] += similarity / len(words)
+        return sorted(totals, key=lambda product_id: (-totals[product_id], product_id))
+
+
+trigram_index = TrigramIndex()
@@ -10,6 +10,13 @@ urlpatterns = [
     path('products/', include([
         path('deal-of-the-day/', views.DealOfTheDayView.as_view(), name='deal-of-the-day'),
         path('search/', views.ProductSearchView.as_view(), name='product-search'),
+        path('suggest/', views.ProductSuggestView.as_view(), name='product-suggest'),
+        path('trending/', views.TrendingProductsView.as_view(), name='product-trending'),
+        path('bought-together/', views.BoughtTogetherView.as_view(), name='product-bought-together'),
+        path('batch/', views.ProductBatchView.as_view(), name='product-batch'),
+        path('snapshot/', views.CatalogSnapshotView.as_view(), name='catalog-snapshot'),
+        path('export/', views.CatalogExportView.as_view(), name='catalog-export'),
+        path('<int:pk>/similar/', views.SimilarProductsView.as_view(), name='product-similar'),
         path('<int:pk>/', views.ProductDetail.as_view(), name='product-detail'),
         path('', views.ProductList.as_view(), name='product-list'),
     ])),
@@ -17,7 +24,10 @@ urlpatterns = [
     # Category URLs
     path('categories/', include([
         path('', views.CategoryList.as_view(), name='category-list'),
+        path('tree/', views.CategoryTreeView.as_view(), name='category-tree'),
         path('<int:pk>/', views.CategoryDetail.as_view(), name='category-detail'),
-    ]))
+    ])),
+
+    path('cache-stats/', views.CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
 ]
 
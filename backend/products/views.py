@@ -1,73 +1,112 @@
-from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
 from rest_framework.views import APIView
-from rest_framework.response import Response
 from rest_framework import status
-from .models import Product, Category, DealOfTheDay
-from .serializers import ProductSerializer, CategorySerializer, DealOfTheDaySerializer
+from rest_framework.permissions import IsAdminUser
+from .models import Product, Category, DealOfTheDay, BoughtTogether
+from .cache import cache_catalog_response, get_cache_stats, is_not_modified
+from .serializers import ProductSerializer, CategorySerializer, CategoryTreeSerializer, DealOfTheDaySerializer
+from .deals import deal_scheduler
+from .export import FORMATS as EXPORT_FORMATS, iter_export
+from .facets import TAG_CHOICES, facet_index
+from .rankings import WINDOWS as RANKING_WINDOWS, ranking_tracker
+from .resolvers import category_slugs
+from .search_cache import schedule_prewarm, search_cache, search_log, search_page
+from .similarity import similarity_index
+from .snapshot import get_current_manifest, get_snapshot_dir, negotiate_encoding
+from .suggest import suggest_index
 from utils.response import generate_api_response
 from core.success_codes import SuccessCodes as SC
-from django.db import models
+from core.error_codes import ErrorCodes as EC
+from core.pagination import KeysetPaginationMixin
+
+
+class ProductList(KeysetPaginationMixin, APIView):
+    pagination_ordering = ('id',)
+
+    BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+    def _parse_filters(self, request):
+        """Validate the listing filters, returning (filters, errors)"""
+        params = request.query_params
+        filters, errors = {}, {}
+
+        tag = params.get('tag')
+        if tag:
+            if tag in TAG_CHOICES:
+                filters['tag'] = tag
+            else:
+                errors['tag'] = [f"Must be one of: {', '.join(TAG_CHOICES)}"]
 
+        is_active = params.get('is_active')
+        if is_active:
+            if is_active.lower() in self.BOOLEAN_VALUES:
+                filters['is_active'] = self.BOOLEAN_VALUES[is_active.lower()]
+            else:
+                errors['is_active'] = ["Must be true or false"]
 
-class ProductList(APIView):
+        for name in ('min_price', 'max_price'):
+            value = params.get(name)
+            if value:
+                try:
+                    filters[name] = Decimal(value)
+                except InvalidOperation:
+                    errors[name] = ["Must be a number"]
+                    continue
+                if not filters[name].is_finite() or filters[name] < 0:
+                    errors[name] = ["Must be a non-negative number"]
+
+        return filters, errors
+
+    @cache_catalog_response
     def get(self, request):
         # Get query parameters
         category_param = request.query_params.get('category')
-        
-        # Start with all products
-        products = Product.objects.all()
-        
-        # Apply category filter if provided
+        filters, errors = self._parse_filters(request)
+        fields, field_errors = ProductSerializer.get_requested_fields(request)
+        errors.update(field_errors)
+        if errors:
+            return generate_api_response(
+                success=False,
+                message="Invalid product filters",
+                code=EC.VAL_INVALID_FORMAT.value,
+                errors=errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Start with all products, with only the columns and relations the serializer reads
+        products = ProductSerializer.setup_eager_loading(Product.objects.all(), fields=fields)
+
+        # Apply category filter if provided, resolved in memory from the slug
         if category_param:
-            # Format from URL: Convert hyphens to spaces and capitalize words
-            category_words = category_param.replace('-', ' ').split()
-            category_display_name = ' '.join([word.capitalize() for word in category_words])
-            
-            try:
-                # First try exact match with display name
-                category = Category.objects.get(name__iexact=category_display_name)
-                products = products.filter(category=category)
-            except Category.DoesNotExist:
-                # If no exact match, try partial matches
-                if '-' in category_param:
-                    # For subcategories like "men-shoes", "women-clothing"
-                    main_category, sub_category = category_param.split('-', 1)
-                    
-                    # Try to find by main category + filtering by substring
-                    try:
-                        main_cat_words = main_category.replace('-', ' ').split()
-                        main_cat_display = ' '.join([word.capitalize() for word in main_cat_words])
-                        main_cat = Category.objects.get(name__iexact=main_cat_display)
-                        
-                        # Filter products in the main category where product name or description contains the sub-category
-                        products = products.filter(
-                            category=main_cat
-                        ).filter(
-                            models.Q(name__icontains=sub_category) | 
-                            models.Q(description__icontains=sub_category)
-                        )
-                    except Category.DoesNotExist:
-                        # If main category not found, try to find any category with matching name (partial)
-                        matching_categories = Category.objects.filter(
-                            models.Q(name__icontains=main_category.replace('-', ' ')) | 
-                            models.Q(name__icontains=sub_category.replace('-', ' '))
-                        )
-                        if matching_categories.exists():
-                            products = products.filter(category__in=matching_categories)
-                else:
-                    # For main categories that don't match exactly
-                    matching_categories = Category.objects.filter(
-                        name__icontains=category_param.replace('-', ' ')
-                    )
-                    if matching_categories.exists():
-                        products = products.filter(category__in=matching_categories)
-        
-        serializer = ProductSerializer(products, many=True)
+            category_id = category_slugs.resolve(category_param)
+            if category_id is None:
+                products = products.none()
+            else:
+                products = products.filter(category_id=category_id)
+            # An unknown slug matches nothing, so its facets are all zero
+            filters['category_id'] = category_id if category_id is not None else 0
+
+        if 'tag' in filters:
+            products = products.filter(tag=filters['tag'])
+        if 'is_active' in filters:
+            products = products.filter(is_active=filters['is_active'])
+        if 'min_price' in filters:
+            products = products.filter(price__gte=filters['min_price'])
+        if 'max_price' in filters:
+            products = products.filter(price__lte=filters['max_price'])
+
+        page, pagination = self.paginate(products)
+        serializer = ProductSerializer(page, many=True, fields=fields)
         return generate_api_response(
             success=True,
             message="",
             data=serializer.data,
             code=SC.REQ_DATA_RETRIEVED.value,
+            extra_context={**pagination, 'facets': facet_index.counts(**filters)},
             status_code=status.HTTP_200_OK
         )
 
@@ -75,12 +114,21 @@ class ProductList(APIView):
 class ProductDetail(APIView):
     def get_object(self, pk):
         try:
-            return Product.objects.get(pk=pk)
+            return ProductSerializer.setup_eager_loading(Product.objects.all()).get(pk=pk)
         except Product.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+            return None
 
+    @cache_catalog_response
     def get(self, request, pk):
         product = self.get_object(pk)
+        if product is None:
+            return generate_api_response(
+                success=False,
+                message="Product not found",
+                code=EC.RES_NOT_FOUND.value,
+                errors={'id': pk},
+                status_code=status.HTTP_404_NOT_FOUND
+            )
         serializer = ProductSerializer(product)
         return generate_api_response(
             success=True,
@@ -91,10 +139,127 @@ class ProductDetail(APIView):
         )
 
 
-class CategoryList(APIView):
+class SimilarProductsView(APIView):
+    """Products closest to `pk` by TF-IDF cosine over name, category and description, as card views"""
+
+    DEFAULT_LIMIT = 10
+    MAX_LIMIT = 50
+
+    def get(self, request, pk):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT))
+        except ValueError:
+            limit = self.DEFAULT_LIMIT
+
+        # Ask for extra candidates so inactive products can be dropped
+        ranked = similarity_index.similar(pk, limit=limit * 2)
+        fields = ProductSerializer.VIEWS['card']
+        products_by_id = ProductSerializer.setup_eager_loading(
+            Product.objects.filter(is_active=True), fields=fields).in_bulk([product_id for product_id, _ in ranked])
+        products = [products_by_id[product_id] for product_id, _ in ranked if product_id in products_by_id][:limit]
+        serializer = ProductSerializer(products, many=True, fields=fields)
+        return generate_api_response(
+            success=True,
+            message="",
+            data=serializer.data,
+            code=SC.REQ_DATA_RETRIEVED.value,
+            extra_context={'built_at': similarity_index.built_at},
+            status_code=status.HTTP_200_OK
+        )
+
+
+class ProductBatchView(APIView):
+    """
+    Fetch many products at once, e.g. to hydrate a cart. Takes ids as
+    `?ids=1,2,3` or, for large carts, a POST body `{"ids": [1, 2, 3]}`.
+    Products come back in the requested order with their effective
+    prices; ids that do not exist are listed under `missing`.
+    """
+
+    MAX_BATCH_SIZE = 200
+
+    def _parse_ids(self, raw_ids):
+        if isinstance(raw_ids, str):
+            raw_ids = [value for value in raw_ids.split(',') if value.strip()]
+        if not isinstance(raw_ids, (list, tuple)) or not raw_ids:
+            return None, "Provide a non-empty list of product ids"
+        if len(raw_ids) > self.MAX_BATCH_SIZE:
+            return None, f"At most {self.MAX_BATCH_SIZE} ids per request"
+        try:
+            ids = [int(value) for value in raw_ids]
+        except (TypeError, ValueError):
+            return None, "Product ids must be integers"
+        # Drop duplicates but keep the requested order
+        return list(dict.fromkeys(ids)), None
+
+    def _respond(self, request, raw_ids):
+        ids, error = self._parse_ids(raw_ids)
+        fields, field_errors = ProductSerializer.get_requested_fields(request)
+        if error or field_errors:
+            return generate_api_response(
+                success=False,
+                message=error or "Invalid fields",
+                code=EC.VAL_INVALID_FORMAT.value,
+                errors={'ids': [error]} if error else field_errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        products_by_id = ProductSerializer.setup_eager_loading(
+            Product.objects.all(), fields=fields).in_bulk(ids)
+        products = [products_by_id[pk] for pk in ids if pk in products_by_id]
+        serializer = ProductSerializer(products, many=True, fields=fields)
+        return generate_api_response(
+            success=True,
+            message="",
+            data={
+                'products': serializer.data,
+                'missing': [pk for pk in ids if pk not in products_by_id],
+            },
+            code=SC.REQ_DATA_RETRIEVED.value,
+            status_code=status.HTTP_200_OK
+        )
+
+    def get(self, request):
+        return self._respond(request, request.query_params.get('ids', ''))
+
+    def post(self, request):
+        # A bare JSON array (or any non-object body) carries no `ids` and gets the 400 below
+        raw_ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        return self._respond(request, raw_ids)
+
+
+class CategoryList(KeysetPaginationMixin, APIView):
+    pagination_ordering = ('id',)
+    # The navigation lists every category; one default page should hold them all
+    pagination_page_size = 100
+
+    @cache_catalog_response
     def get(self, request):
         categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
+        page, pagination = self.paginate(categories)
+        serializer = CategorySerializer(page, many=True)
+        return generate_api_response(
+            success=True,
+            message="",
+            data=serializer.data,
+            code=SC.REQ_DATA_RETRIEVED.value,
+            extra_context=pagination,
+            status_code=status.HTTP_200_OK
+        )
+
+
+class CategoryTreeView(APIView):
+    """
+    Active categories with their active-product count, price range and a
+    representative thumbnail, for the navigation sidebar. The numbers come
+    from the `CategoryStats` rows maintained on product writes, so this is a
+    single query, cached like the rest of the catalog.
+    """
+
+    @cache_catalog_response
+    def get(self, request):
+        categories = Category.objects.filter(is_active=True).select_related('stats').order_by('name', 'id')
+        serializer = CategoryTreeSerializer(categories, many=True)
         return generate_api_response(
             success=True,
             message="",
@@ -109,10 +274,18 @@ class CategoryDetail(APIView):
         try:
             return Category.objects.get(pk=pk)
         except Category.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+            return None
 
     def get(self, request, pk):
         category = self.get_object(pk)
+        if category is None:
+            return generate_api_response(
+                success=False,
+                message="Category not found",
+                code=EC.RES_NOT_FOUND.value,
+                errors={'id': pk},
+                status_code=status.HTTP_404_NOT_FOUND
+            )
         serializer = CategorySerializer(category)
         return generate_api_response(
             success=True,
@@ -124,13 +297,13 @@ class CategoryDetail(APIView):
 
 
 class DealOfTheDayView(APIView):
+    @cache_catalog_response
     def get(self, request):
-        today = timezone.now()
-        deals = DealOfTheDay.objects.filter(
-            is_active=True,
-            start_date__lte=today,
-            end_date__gte=today
-        )
+        # Running deals come from the in-memory scheduler, no date filtering here
+        deal_ids = [deal.id for deal in deal_scheduler.active_deals()]
+        deals = DealOfTheDaySerializer.setup_eager_loading(DealOfTheDay.objects.all()).filter(
+            id__in=deal_ids
+        ) if deal_ids else DealOfTheDay.objects.none()
         serializer = DealOfTheDaySerializer(deals, many=True)
         return generate_api_response(
             success=True,
@@ -143,32 +316,271 @@ class DealOfTheDayView(APIView):
 
 class ProductSearchView(APIView):
     """API view for searching products by name, description or category"""
-    
+
+    DEFAULT_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 50
+
+    def _get_int_param(self, request, name, default, minimum, maximum):
+        try:
+            value = int(request.query_params.get(name, default))
+        except (TypeError, ValueError):
+            value = default
+        return max(minimum, min(value, maximum))
+
     def get(self, request):
         query = request.query_params.get('q', '')
-        
+
         if not query or len(query) < 2:
             return generate_api_response(
                 success=False,
                 message="Search query must be at least 2 characters",
                 data=[],
+                errors={'q': ["Search query must be at least 2 characters"]},
                 code="SEARCH_QUERY_TOO_SHORT",
                 status_code=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Search in product name, description and category name
-        products = Product.objects.filter(
-            models.Q(name__icontains=query) | 
-            models.Q(description__icontains=query) |
-            models.Q(category__name__icontains=query)
-        ).distinct()[:10]  # Limit to 10 results for performance
-        
-        serializer = ProductSerializer(products, many=True)
-        
+
+        fields, errors = ProductSerializer.get_requested_fields(request)
+        if errors:
+            return generate_api_response(
+                success=False,
+                message="Invalid fields",
+                code=EC.VAL_INVALID_FORMAT.value,
+                errors=errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        page = self._get_int_param(request, 'page', 1, 1, 10 ** 6)
+        page_size = self._get_int_param(
+            request, 'page_size', self.DEFAULT_PAGE_SIZE, 1, self.MAX_PAGE_SIZE)
+
+        # Repeated searches are answered from memory without touching the database
+        search_log.record(query)
+        key = search_cache.make_key(query, page, page_size, fields)
+        payload = search_cache.get(key)
+        if payload is None:
+            payload = search_page(query, page, page_size, fields)
+            search_cache.set(key, payload)
+        schedule_prewarm()
+        data, extra_context = payload
+
         return generate_api_response(
             success=True,
-            message=f"Found {len(serializer.data)} products matching '{query}'",
+            message=f"Found {extra_context['total']} products matching '{query}'",
+            data=data,
+            code=SC.REQ_DATA_RETRIEVED.value,
+            extra_context=extra_context,
+            status_code=status.HTTP_200_OK
+        )
+
+
+class ProductSuggestView(APIView):
+    """Typeahead suggestions served from the in-memory prefix trie"""
+
+    DEFAULT_LIMIT = 8
+    MAX_LIMIT = 20
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            limit = self.DEFAULT_LIMIT
+        limit = max(1, min(limit, self.MAX_LIMIT))
+
+        return generate_api_response(
+            success=True,
+            message="",
+            data=suggest_index.suggest(query, limit=limit),
+            code=SC.REQ_DATA_RETRIEVED.value,
+            status_code=status.HTTP_200_OK
+        )
+
+
+class TrendingProductsView(APIView):
+    """
+    Products ranked by decayed order volume over `?window=1h|24h|7d`
+    (default 24h), as `[{"id", "score"}]`. Lists are precomputed in the
+    background; hydrate them through /products/batch/.
+    """
+
+    DEFAULT_WINDOW = '24h'
+    DEFAULT_LIMIT = 20
+
+    def get(self, request):
+        window = request.query_params.get('window', self.DEFAULT_WINDOW)
+        if window not in RANKING_WINDOWS:
+            return generate_api_response(
+                success=False,
+                message="Invalid ranking window",
+                code=EC.VAL_INVALID_FORMAT.value,
+                errors={'window': [f"Must be one of: {', '.join(RANKING_WINDOWS)}"]},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            limit = self.DEFAULT_LIMIT
+        limit = max(1, limit)
+
+        entries, computed_at = ranking_tracker.ranked(window)
+        return generate_api_response(
+            success=True,
+            message="",
+            data=[{'id': product_id, 'score': score} for product_id, score in entries[:limit]],
+            code=SC.REQ_DATA_RETRIEVED.value,
+            extra_context={
+                'window': window,
+                'computed_at': computed_at.isoformat() if computed_at else None,
+            },
+            status_code=status.HTTP_200_OK
+        )
+
+
+class BoughtTogetherView(APIView):
+    """
+    Add-on suggestions for a product page (`?ids=12`) or a cart
+    (`?ids=12,40,7`), read from the precomputed "frequently bought
+    together" table. Scores of related products are summed across the
+    given products, which are themselves left out. Returns card views.
+    """
+
+    MAX_IDS = 50
+    DEFAULT_LIMIT = 10
+
+    def get(self, request):
+        try:
+            ids = list(dict.fromkeys(
+                int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()))
+        except ValueError:
+            ids = None
+        if not ids or len(ids) > self.MAX_IDS:
+            error = f"Provide between 1 and {self.MAX_IDS} integer product ids"
+            return generate_api_response(
+                success=False,
+                message=error,
+                code=EC.VAL_INVALID_FORMAT.value,
+                errors={'ids': [error]},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), 50))
+        except ValueError:
+            limit = self.DEFAULT_LIMIT
+
+        scores = {}
+        pairs = BoughtTogether.objects.filter(product_id__in=ids, related__is_active=True).exclude(
+            related_id__in=ids).values_list('related_id', 'score')
+        for related_id, score in pairs:
+            scores[related_id] = scores.get(related_id, 0.0) + score
+        ranked = sorted(scores, key=lambda related_id: (-scores[related_id], related_id))[:limit]
+
+        fields = ProductSerializer.VIEWS['card']
+        products_by_id = ProductSerializer.setup_eager_loading(
+            Product.objects.all(), fields=fields).in_bulk(ranked) if ranked else {}
+        serializer = ProductSerializer(
+            [products_by_id[pk] for pk in ranked if pk in products_by_id], many=True, fields=fields)
+        return generate_api_response(
+            success=True,
+            message="",
             data=serializer.data,
             code=SC.REQ_DATA_RETRIEVED.value,
             status_code=status.HTTP_200_OK
         )
+
+
+class CatalogCacheStatsView(APIView):
+    """Hit/miss counters of the catalog response cache and of this process's search cache"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return generate_api_response(
+            success=True,
+            message="",
+            data={**get_cache_stats(), 'search': search_cache.stats()},
+            code=SC.REQ_DATA_RETRIEVED.value,
+            status_code=status.HTTP_200_OK
+        )
+
+
+class CatalogExportView(APIView):
+    """
+    Streams the whole catalog as NDJSON (default) or CSV for ops and partner
+    feeds. `?output=csv`, `?compress=gzip` for a .gz download, and
+    `?is_active=true|false` / `?category=<slug>` to narrow it down. Rows are
+    written while they are read, so memory stays flat.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        output = params.get('output', 'ndjson')
+        compress = params.get('compress')
+        is_active = params.get('is_active')
+        errors = {}
+        if output not in EXPORT_FORMATS:
+            errors['output'] = [f"Must be one of: {', '.join(EXPORT_FORMATS)}"]
+        if compress not in (None, '', 'gzip'):
+            errors['compress'] = ["Must be gzip"]
+        if is_active and is_active.lower() not in ProductList.BOOLEAN_VALUES:
+            errors['is_active'] = ["Must be true or false"]
+        if errors:
+            return generate_api_response(
+                success=False,
+                message="Invalid export options",
+                code=EC.VAL_INVALID_FORMAT.value,
+                errors=errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = Product.objects.all()
+        if is_active:
+            products = products.filter(is_active=ProductList.BOOLEAN_VALUES[is_active.lower()])
+        category_param = params.get('category')
+        if category_param:
+            category_id = category_slugs.resolve(category_param)
+            products = products.filter(category_id=category_id) if category_id else products.none()
+
+        content_type, extension = EXPORT_FORMATS[output]
+        filename = f'catalog.{extension}'
+        if compress:
+            content_type, filename = 'application/gzip', f'{filename}.gz'
+        response = StreamingHttpResponse(
+            iter_export(output, products, gzip=bool(compress)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class CatalogSnapshotView(APIView):
+    """
+    Serves the prebuilt catalog snapshot (active categories, products and
+    current deals) straight from disk, picking the precompressed variant
+    the client accepts so nothing is serialized or compressed per request.
+    """
+
+    def get(self, request):
+        for attempt in range(2):
+            manifest = get_current_manifest()
+            etag, last_modified = manifest['etag'], manifest['generated_at']
+            if is_not_modified(request, etag, last_modified):
+                response = HttpResponseNotModified()
+                break
+            encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), manifest['files'])
+            path = get_snapshot_dir() / manifest['files'][encoding]
+            try:
+                # FileResponse sizes the file it opened, even if it is removed meanwhile
+                response = FileResponse(open(path, 'rb'), content_type='application/json')
+            except FileNotFoundError:
+                # Two rebuilds finished since the manifest was read; read the new one
+                if attempt:
+                    raise
+                continue
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+            break
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'public, no-cache'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -17,6 +17,30 @@ export interface ApiErrorResponse {
 
 export type ApiResponse<T> = ApiSuccessResponse<T> | ApiErrorResponse;
 
+// Cursor links returned by keyset-paginated list endpoints
+export interface PaginationContext {
+  next: string | null;
+  previous: string | null;
+}
+
+// Fetch every page of a keyset-paginated list by following `extra_context.next`
+async function getAllPages<T>(url: string): Promise<ApiResponse<T[]>> {
+  const items: T[] = [];
+  let next: string | null = url;
+  let first: ApiSuccessResponse<T[]> | null = null;
+  while (next) {
+    const response = await apiClient.get<ApiResponse<T[]> & { extra_context?: PaginationContext }>(next);
+    const body = response.data;
+    if (!body.success) {
+      return body;
+    }
+    first = first ?? body;
+    items.push(...body.data);
+    next = body.extra_context?.next ?? null;
+  }
+  return { ...(first as ApiSuccessResponse<T[]>), data: items };
+}
+
 // Auth Types
 export interface TokenData {
   value: string;
@@ -190,24 +214,22 @@ export const authAPI = {
 
 // Products API
 export const productsAPI = {
-  getProducts: async (page?: number, search?: string, category?: string) => {
-    const params = new URLSearchParams();
-    if (page) params.append('page', page.toString());
-    if (search) params.append('search', search);
-    if (category) {
-      console.log("🔍 API call with category parameter:", category);
-      params.append('category', category);
+  // Fetch one page of products; pass the previous page's `extra_context.next` as `cursor` to load the next one
+  getProducts: async (cursor?: string | null, search?: string, category?: string, pageSize?: number) => {
+    let url = cursor;
+    if (!url) {
+      const params = new URLSearchParams();
+      if (search) params.append('search', search);
+      if (category) {
+        console.log("🔍 API call with category parameter:", category);
+        params.append('category', category);
+      }
+      if (pageSize) params.append('page_size', pageSize.toString());
+      url = `/products/products/?${params.toString()}`;
     }
-    
-    const url = `/products/products/?${params.toString()}`;
     console.log("📡 Making API request to:", url);
     
-    const response = await apiClient.get<ApiResponse<{
-      results: Product[];
-      count: number;
-      next: string | null;
-      previous: string | null;
-    }>>(url);
+    const response = await apiClient.get<ApiResponse<Product[]> & { extra_context?: PaginationContext }>(url);
     return response.data;
   },
 
@@ -230,13 +252,12 @@ export const productsAPI = {
   },
 
   getCategories: async () => {
-    const response = await apiClient.get<ApiResponse<{
+    return getAllPages<{
       id: number;
       name: string;
       description: string;
       thumbnail: string | null;
-    }[]>>('/products/categories/');
-    return response.data;
+    }>('/products/categories/');
   },
 
   getCategory: async (categoryId: number) => {
@@ -276,9 +297,12 @@ export const ordersAPI = {
     }
   },
   
-  getOrders: async () => {
+  // Fetch one page of orders, newest first; pass `extra_context.next` as `cursor` for older ones
+  getOrders: async (cursor?: string | null) => {
     try {
-      const response = await apiClient.get('/orders/my-orders/');
+      const response = await apiClient.get<ApiResponse<Order[]> & { extra_context?: PaginationContext }>(
+        cursor || '/orders/my-orders/'
+      );
       return response.data;
     } catch (error: any) {
       console.error('Error fetching orders:', error.response?.data || error.message);
@@ -40,19 +40,14 @@ export default function Index() {
           setCategoryProducts(initialCategoryProducts);
         }
 
-        // Fetch all products
-        const productsResponse = await productsAPI.getProducts();
+        // The home page only samples the catalog: one page at the largest size the API allows
+        // (100) feeds the shelves below, and the full listing lives at /products with "Load more"
+        const productsResponse = await productsAPI.getProducts(undefined, undefined, undefined, 100);
         console.log("API Response:", productsResponse);
         
         // Set featured products (first 6)
         if (productsResponse.success) {
-          let allProducts: Product[] = [];
-          
-          if (Array.isArray(productsResponse.data)) {
-            allProducts = productsResponse.data;
-          } else if (productsResponse.data.results) {
-            allProducts = productsResponse.data.results;
-          }
+          const allProducts: Product[] = Array.isArray(productsResponse.data) ? productsResponse.data : [];
           
           setFeaturedProducts(allProducts.slice(0, 6));
           
@@ -1,171 +1,202 @@
-import { useEffect, useState } from "react";
-import { Link, useNavigate } from "@remix-run/react";
-import { ordersAPI } from "~/lib/api";
-import { toast } from "react-fox-toast";
-import { Layout } from "~/components/layout";
-import type { Order } from "~/lib/api";
-
-export default function Orders() {
-  const [isLoading, setIsLoading] = useState(true);
-  const [error, setError] = useState<string | null>(null);
-  const [orders, setOrders] = useState<Order[]>([]);
-  const navigate = useNavigate();
-
-  useEffect(() => {
-    const fetchOrders = async () => {
-      try {
-        setIsLoading(true);
-        const response = await ordersAPI.getOrders();
-        
-        if (response.success) {
-          setOrders(response.data);
-        } else {
-          setError("Failed to load orders.");
-          toast.error("Failed to load orders.");
-        }
-      } catch (error: any) {
-        console.error("Error fetching orders:", error);
-        setError("Failed to load orders. Please try again later.");
-        toast.error("Failed to load orders. Please try again later.");
-        
-        // If unauthorized, redirect to signin
-        if (error.response?.status === 401) {
-          navigate("/signin");
-        }
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    fetchOrders();
-  }, [navigate]);
-
-  // Function to get status color class
-  const getStatusColorClass = (status: string) => {
-    switch (status.toLowerCase()) {
-      case 'pending':
-        return 'bg-yellow-100 text-yellow-800';
-      case 'processing':
-        return 'bg-blue-100 text-blue-800';
-      case 'shipped':
-        return 'bg-indigo-100 text-indigo-800';
-      case 'delivered':
-        return 'bg-green-100 text-green-800';
-      case 'cancelled':
-        return 'bg-red-100 text-red-800';
-      default:
-        return 'bg-gray-100 text-gray-800';
-    }
-  };
-
-  // Format price with Indian Rupee symbol
-  const formatPrice = (price: number) => {
-    return new Intl.NumberFormat('en-IN', {
-      style: 'currency',
-      currency: 'INR'
-    }).format(price);
-  };
-
-  return (
-    <Layout>
-      <div className="max-w-6xl mx-auto py-8 px-4 sm:px-6 lg:px-8">
-        <div className="mb-6">
-          <h1 className="text-3xl font-bold text-gray-900">Your Orders</h1>
-          <p className="mt-2 text-sm text-gray-600">
-            View and track all your orders
-          </p>
-        </div>
-
-        {isLoading ? (
-          <div className="flex justify-center py-12">
-            <div className="w-10 h-10 border-4 border-primary border-t-transparent rounded-full animate-spin"></div>
-          </div>
-        ) : error ? (
-          <div className="p-4 bg-red-50 border border-red-200 rounded-md text-red-700">
-            {error}
-          </div>
-        ) : orders.length === 0 ? (
-          <div className="bg-white shadow-md rounded-lg p-8 text-center">
-            <div className="mb-4">
-              <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-gray-400 mx-auto" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={1.5} d="M16 11V7a4 4 0 00-8 0v4M5 9h14l1 12H4L5 9z" />
-              </svg>
-            </div>
-            <h2 className="text-xl font-semibold mb-2 text-gray-900">No Orders Yet</h2>
-            <p className="text-gray-600 mb-6">
-              You haven't placed any orders yet. Start shopping to see your orders here.
-            </p>
-            <Link to="/" className="inline-flex items-center px-4 py-2 border border-transparent text-sm font-medium rounded-md shadow-sm text-white bg-primary hover:bg-primary-600 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary">
-              Browse Products
-            </Link>
-          </div>
-        ) : (
-          <div className="bg-white shadow-md rounded-lg overflow-hidden">
-            <div className="overflow-x-auto">
-              <table className="min-w-full divide-y divide-gray-200">
-                <thead className="bg-gray-50">
-                  <tr>
-                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-                      Order ID
-                    </th>
-                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-                      Items
-                    </th>
-                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-                      Total
-                    </th>
-                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
-                      Status
-                    </th>
-                    <th scope="col" className="px-6 py-3 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">
-                      Actions
-                    </th>
-                  </tr>
-                </thead>
-                <tbody className="divide-y divide-gray-200">
-                  {orders.map((order) => (
-                    <tr key={order.id} className="hover:bg-gray-50">
-                      <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
-                        #{order.id}
-                      </td>
-                      <td className="px-6 py-4 whitespace-nowrap">
-                        <div className="flex flex-col">
-                          {order.items.slice(0, 2).map((item, index) => (
-                            <span key={index} className="text-sm text-gray-700">
-                              {item.quantity}x {item.product_name}
-                            </span>
-                          ))}
-                          {order.items.length > 2 && (
-                            <span className="text-sm text-gray-500">
-                              +{order.items.length - 2} more items
-                            </span>
-                          )}
-                        </div>
-                      </td>
-                      <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-700">
-                        {formatPrice(order.total_price)}
-                      </td>
-                      <td className="px-6 py-4 whitespace-nowrap">
-                        <span className={`px-2 inline-flex text-xs leading-5 font-semibold rounded-full ${getStatusColorClass(order.status)}`}>
-                          {order.status}
-                        </span>
-                      </td>
-                      <td className="px-6 py-4 whitespace-nowrap text-right text-sm font-medium">
-                        <button
-                          onClick={() => navigate(`/orders/${order.id}`)}
-                          className="text-primary hover:text-primary-600"
-                        >
-                          View Details
-                        </button>
-                      </td>
-                    </tr>
-                  ))}
-                </tbody>
-              </table>
-            </div>
-          </div>
-        )}
-      </div>
-    </Layout>
-  );
+import { useEffect, useState } from "react";
+import { Link, useNavigate } from "@remix-run/react";
+import { ordersAPI } from "~/lib/api";
+import { toast } from "react-fox-toast";
+import { Layout } from "~/components/layout";
+import type { Order } from "~/lib/api";
+
+export default function Orders() {
+  const [isLoading, setIsLoading] = useState(true);
+  const [error, setError] = useState<string | null>(null);
+  const [orders, setOrders] = useState<Order[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const navigate = useNavigate();
+
+  useEffect(() => {
+    const fetchOrders = async () => {
+      try {
+        setIsLoading(true);
+        const response = await ordersAPI.getOrders();
+        
+        if (response.success) {
+          setOrders(response.data);
+          setNextCursor(response.extra_context?.next ?? null);
+        } else {
+          setError("Failed to load orders.");
+          toast.error("Failed to load orders.");
+        }
+      } catch (error: any) {
+        console.error("Error fetching orders:", error);
+        setError("Failed to load orders. Please try again later.");
+        toast.error("Failed to load orders. Please try again later.");
+        
+        // If unauthorized, redirect to signin
+        if (error.response?.status === 401) {
+          navigate("/signin");
+        }
+      } finally {
+        setIsLoading(false);
+      }
+    };
+
+    fetchOrders();
+  }, [navigate]);
+
+  // Append the next page of older orders
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const response = await ordersAPI.getOrders(nextCursor);
+      if (response.success) {
+        setOrders((current) => [...current, ...response.data]);
+        setNextCursor(response.extra_context?.next ?? null);
+      } else {
+        toast.error("Failed to load more orders.");
+      }
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  // Function to get status color class
+  const getStatusColorClass = (status: string) => {
+    switch (status.toLowerCase()) {
+      case 'pending':
+        return 'bg-yellow-100 text-yellow-800';
+      case 'processing':
+        return 'bg-blue-100 text-blue-800';
+      case 'shipped':
+        return 'bg-indigo-100 text-indigo-800';
+      case 'delivered':
+        return 'bg-green-100 text-green-800';
+      case 'cancelled':
+        return 'bg-red-100 text-red-800';
+      default:
+        return 'bg-gray-100 text-gray-800';
+    }
+  };
+
+  // Format price with Indian Rupee symbol
+  const formatPrice = (price: number) => {
+    return new Intl.NumberFormat('en-IN', {
+      style: 'currency',
+      currency: 'INR'
+    }).format(price);
+  };
+
+  return (
+    <Layout>
+      <div className="max-w-6xl mx-auto py-8 px-4 sm:px-6 lg:px-8">
+        <div className="mb-6">
+          <h1 className="text-3xl font-bold text-gray-900">Your Orders</h1>
+          <p className="mt-2 text-sm text-gray-600">
+            View and track all your orders
+          </p>
+        </div>
+
+        {isLoading ? (
+          <div className="flex justify-center py-12">
+            <div className="w-10 h-10 border-4 border-primary border-t-transparent rounded-full animate-spin"></div>
+          </div>
+        ) : error ? (
+          <div className="p-4 bg-red-50 border border-red-200 rounded-md text-red-700">
+            {error}
+          </div>
+        ) : orders.length === 0 ? (
+          <div className="bg-white shadow-md rounded-lg p-8 text-center">
+            <div className="mb-4">
+              <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-gray-400 mx-auto" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={1.5} d="M16 11V7a4 4 0 00-8 0v4M5 9h14l1 12H4L5 9z" />
+              </svg>
+            </div>
+            <h2 className="text-xl font-semibold mb-2 text-gray-900">No Orders Yet</h2>
+            <p className="text-gray-600 mb-6">
+              You haven't placed any orders yet. Start shopping to see your orders here.
+            </p>
+            <Link to="/" className="inline-flex items-center px-4 py-2 border border-transparent text-sm font-medium rounded-md shadow-sm text-white bg-primary hover:bg-primary-600 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary">
+              Browse Products
+            </Link>
+          </div>
+        ) : (
+          <div className="bg-white shadow-md rounded-lg overflow-hidden">
+            <div className="overflow-x-auto">
+              <table className="min-w-full divide-y divide-gray-200">
+                <thead className="bg-gray-50">
+                  <tr>
+                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                      Order ID
+                    </th>
+                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                      Items
+                    </th>
+                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                      Total
+                    </th>
+                    <th scope="col" className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
+                      Status
+                    </th>
+                    <th scope="col" className="px-6 py-3 text-right text-xs font-medium text-gray-500 uppercase tracking-wider">
+                      Actions
+                    </th>
+                  </tr>
+                </thead>
+                <tbody className="divide-y divide-gray-200">
+                  {orders.map((order) => (
+                    <tr key={order.id} className="hover:bg-gray-50">
+                      <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
+                        #{order.id}
+                      </td>
+                      <td className="px-6 py-4 whitespace-nowrap">
+                        <div className="flex flex-col">
+                          {order.items.slice(0, 2).map((item, index) => (
+                            <span key={index} className="text-sm text-gray-700">
+                              {item.quantity}x {item.product_name}
+                            </span>
+                          ))}
+                          {order.items.length > 2 && (
+                            <span className="text-sm text-gray-500">
+                              +{order.items.length - 2} more items
+                            </span>
+                          )}
+                        </div>
+                      </td>
+                      <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-700">
+                        {formatPrice(order.total_price)}
+                      </td>
+                      <td className="px-6 py-4 whitespace-nowrap">
+                        <span className={`px-2 inline-flex text-xs leading-5 font-semibold rounded-full ${getStatusColorClass(order.status)}`}>
+                          {order.status}
+                        </span>
+                      </td>
+                      <td className="px-6 py-4 whitespace-nowrap text-right text-sm font-medium">
+                        <button
+                          onClick={() => navigate(`/orders/${order.id}`)}
+                          className="text-primary hover:text-primary-600"
+                        >
+                          View Details
+                        </button>
+                      </td>
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+            </div>
+            {nextCursor && (
+              <div className="p-4 text-center border-t border-gray-200">
+                <button
+                  onClick={loadMore}
+                  disabled={isLoadingMore}
+                  className="text-sm font-medium text-primary hover:text-primary-600 disabled:opacity-50"
+                >
+                  {isLoadingMore ? "Loading..." : "Load more orders"}
+                </button>
+              </div>
+            )}
+          </div>
+        )}
+      </div>
+    </Layout>
+  );
 } 
\ No newline at end of file
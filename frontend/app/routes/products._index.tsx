@@ -5,12 +5,14 @@ import ProductCard from "~/components/product-card";
 import { productsAPI } from "~/lib/api";
 import type { Product, Category } from "~/lib/api";
 import { getImageUrl } from "~/utils/image";
-import { useEffect, useRef } from "react";
+import { useEffect, useRef, useState } from "react";
 import { Tag, Home, ShoppingBasket, ShoppingCart, Coffee, Apple, Utensils } from "lucide-react";
 
 // Define the loader data type for type safety
 type LoaderData = {
   products: Product[];
+  // Cursor for the next page of the listing, null when it is complete
+  next: string | null;
   categories: Category[];
   currentCategory: Category | null;
   searchQuery?: string | null;
@@ -33,6 +35,7 @@ export async function loader({ request }: LoaderFunctionArgs) {
     }
 
     let products: Product[] = [];
+    let next: string | null = null;
     let productsResponse;
 
     if (searchParam) {
@@ -44,17 +47,13 @@ export async function loader({ request }: LoaderFunctionArgs) {
     } else {
       // Otherwise, use getProducts for category filtering
       productsResponse = await productsAPI.getProducts(
-        undefined, // page
+        undefined, // cursor (first page)
         undefined, // search (not used here)
         categoryParam || undefined // category
       );
-      if (productsResponse.success) {
-        if (productsResponse.data && Array.isArray(productsResponse.data.results)) {
-          products = productsResponse.data.results;
-        } else if (Array.isArray(productsResponse.data)) {
-          // Fallback if the structure is flat
-          products = productsResponse.data;
-        }
+      if (productsResponse.success && Array.isArray(productsResponse.data)) {
+        products = productsResponse.data;
+        next = productsResponse.extra_context?.next ?? null;
       }
     }
 
@@ -67,6 +66,7 @@ export async function loader({ request }: LoaderFunctionArgs) {
 
     return json<LoaderData>({
       products,
+      next,
       categories,
       currentCategory,
       searchQuery: searchParam
@@ -75,6 +75,7 @@ export async function loader({ request }: LoaderFunctionArgs) {
     console.error("Error loading products:", error);
     return json<LoaderData>({
       products: [],
+      next: null,
       categories: [],
       currentCategory: null,
       searchQuery: searchParam,
@@ -103,7 +104,7 @@ const formatUrlToDisplayName = (urlName: string): string => {
 };
 
 export default function Products() {
-  const { products, categories, currentCategory, searchQuery, error } = useLoaderData<typeof loader>();
+  const { products, next, categories, currentCategory, searchQuery, error } = useLoaderData<typeof loader>();
   const [searchParams] = useSearchParams();
   const location = useLocation();
   const fetcher = useFetcher<typeof loader>();
@@ -124,7 +125,34 @@ export default function Products() {
   }, [location.search, fetcher]);
 
   // Use fetcher data if available, otherwise use initial loader data
-  const data = fetcher.data || { products, categories, currentCategory, searchQuery, error };
+  const data = fetcher.data || { products, next, categories, currentCategory, searchQuery, error };
+
+  // Pages appended with "Load more"; reset whenever the loader brings a new first page
+  const [morePages, setMorePages] = useState<{ products: Product[]; next: string | null }>({ products: [], next: null });
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  useEffect(() => {
+    setMorePages({ products: [], next: data.next });
+  }, [data.products, data.next]);
+
+  const shownProducts = [...(data.products ?? []), ...morePages.products];
+
+  const loadMore = async () => {
+    if (!morePages.next) return;
+    setIsLoadingMore(true);
+    try {
+      const response = await productsAPI.getProducts(morePages.next);
+      if (response.success && Array.isArray(response.data)) {
+        setMorePages((current) => ({
+          products: [...current.products, ...response.data],
+          next: response.extra_context?.next ?? null,
+        }));
+      }
+    } catch (error) {
+      console.error("Error loading more products:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
 
   // Get category name for display
   const categoryName = data.currentCategory?.name || 
@@ -242,9 +270,10 @@ export default function Products() {
           }
         `}} />
         
-        {data.products?.length > 0 ? (
+        {shownProducts.length > 0 ? (
+          <>
           <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 xl:grid-cols-6 gap-4">
-            {data.products.map((product: Product) => {
+            {shownProducts.map((product: Product) => {
               // Process the thumbnail URL
               const thumbnailUrl = product.thumbnail ? getImageUrl(product.thumbnail) : '';
               const imageUrl = product.images && product.images.length > 0 ? getImageUrl(product.images[0].image) : '';
@@ -267,6 +296,18 @@ export default function Products() {
               );
             })}
           </div>
+          {morePages.next && (
+            <div className="text-center">
+              <button
+                onClick={loadMore}
+                disabled={isLoadingMore}
+                className="px-6 py-2.5 rounded-full text-sm font-medium bg-white border border-gray-200 text-gray-700 hover:text-primary hover:border-primary/30 disabled:opacity-50"
+              >
+                {isLoadingMore ? "Loading..." : "Load more products"}
+              </button>
+            </div>
+          )}
+          </>
         ) : (
           <div className="text-center py-12">
             <p className="text-lg text-gray-600">